@@ -0,0 +1,82 @@
+"""Check that near-miss statements are rejected in time linear in their length
+
+Each case builds a statement that almost matches a template, e.g. a long
+comma separated list ending in garbage, at increasing sizes. The time per
+item should stay flat as the size grows; the script exits non-zero if it
+grows by more than --max-growth between the smallest and largest size.
+
+Usage:
+    python benchmarks/bench_adversarial.py [--output results.json]
+"""
+
+import argparse
+import sys
+from typing import Callable, Dict, List, Tuple
+
+from common import best_of, write_json
+
+from pgtonic.pg13 import create_trigger, grant
+from pgtonic.spec.template import Template
+
+
+def names(n: int) -> str:
+    return ", ".join(f"t{ix}" for ix in range(n))
+
+
+REPEAT_NONE = Template("A name [ ... ] B", where={"name": Template("{ NAME }")})
+
+GRANT = grant.TEMPLATES[0]
+TRIGGER = create_trigger.TEMPLATES[0]
+
+# Case name, template and a builder for a near-miss statement with n items
+CASES: List[Tuple[str, Template, Callable[[int], str]]] = [
+    ("grant table list", GRANT, lambda n: f"GRANT SELECT ON TABLE {names(n)} TO oliver !"),
+    ("grant role list", GRANT, lambda n: f"GRANT SELECT ON TABLE account TO {names(n)} WITH GRANT"),
+    ("grant privilege list", GRANT, lambda n: "GRANT " + ", ".join(["SELECT"] * n) + " ON account TO"),
+    ("grant long identifier", GRANT, lambda n: f"GRANT SELECT ON {'a' * n}. TO oliver"),
+    (
+        "trigger event list",
+        TRIGGER,
+        lambda n: "CREATE TRIGGER t AFTER " + " OR ".join(["INSERT"] * n) + " ON b EXECUTE",
+    ),
+    (
+        "trigger referencing list",
+        TRIGGER,
+        lambda n: "CREATE TRIGGER t AFTER INSERT ON b REFERENCING "
+        + " ".join(f"OLD TABLE t{ix}" for ix in range(n))
+        + " EXECUTE FUNCTION f() !",
+    ),
+    ("whitespace separated names", REPEAT_NONE, lambda n: "A " + " ".join(["abcdefgh"] * n) + " !"),
+]
+
+SIZES = [10, 100, 1000, 10000]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--max-growth", type=float, default=10.0, help="Allowed growth in time per item")
+    args = parser.parse_args()
+
+    results: List[Dict[str, object]] = []
+    failed = False
+    print(f"{'case':<28}" + "".join(f"{n:>12}" for n in SIZES) + f"{'growth':>9}")
+    for name, template, build in CASES:
+        per_item = []
+        for n in SIZES:
+            sql = build(n)
+            assert not template.is_match(sql)
+            per_item.append(best_of(lambda: template.is_match(sql), repeat=1) / n)
+
+        growth = per_item[-1] / per_item[0]
+        failed = failed or growth > args.max_growth
+        results.append({"case": name, "sizes": SIZES, "seconds_per_item": per_item, "growth": growth})
+        print(f"{name:<28}" + "".join(f"{x * 1e6:10.3f}us" for x in per_item) + f"{growth:8.2f}x")
+
+    if args.output:
+        write_json(args.output, results)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
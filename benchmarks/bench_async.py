@@ -0,0 +1,90 @@
+"""Load test the asyncio validator with many concurrent clients
+
+Each client validates statements one after another. Alongside, a ticker
+task sleeps 1ms at a time and records how late it wakes up: the event loop
+lag, which stays small while matching runs off the loop.
+
+Usage:
+    python benchmarks/bench_async.py [--clients 200] [--statements 50] [--workers 1] [--output results.json]
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Dict, List
+
+from common import write_json
+
+from pgtonic.aio import Validator
+
+STATEMENTS = [
+    "GRANT SELECT ON TABLE public.account, book, author TO oliver, anon",
+    "GRANT ALL ON ALL TABLES IN SCHEMA api, other TO oliver, anon WITH GRANT OPTION",
+    "CREATE TRIGGER my_trig BEFORE INSERT OR DELETE OR UPDATE ON public.book EXECUTE PROCEDURE somefunc( param1 )",
+    "CREATE TRIGGER my_trig AFTER INSERT ON api.account EXECUTE",
+    "ALTER TABLE account ADD COLUMN id int",
+]
+
+
+async def client(validator: Validator, ix: int, n: int) -> None:
+    for jx in range(n):
+        await validator.validate(STATEMENTS[(ix + jx) % len(STATEMENTS)])
+
+
+async def ticker(lags: List[float], stop: asyncio.Event) -> None:
+    loop = asyncio.get_event_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(0.001)
+        lags.append(loop.time() - start - 0.001)
+
+
+async def run(clients: int, statements: int, workers: int, batch_size: int) -> Dict[str, float]:
+    lags: List[float] = []
+    stop = asyncio.Event()
+    async with Validator(workers=workers, batch_size=batch_size, max_pending=clients) as validator:
+        # Warm the template cache outside the measurement
+        await validator.validate(STATEMENTS[0])
+        tick = asyncio.ensure_future(ticker(lags, stop))
+        start = time.perf_counter()
+        await asyncio.gather(*[client(validator, ix, statements) for ix in range(clients)])
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await tick
+        metrics = validator.metrics()
+
+    return {
+        "seconds": elapsed,
+        "statements_per_second": clients * statements / elapsed,
+        "batches": metrics.batches,
+        "latency_p50": metrics.latency_p50,
+        "latency_p99": metrics.latency_p99,
+        "loop_lag_max": max(lags) if lags else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--statements", type=int, default=50, help="Statements per client")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'batch':>6} {'stmt/s':>10} {'batches':>8} {'p50':>9} {'p99':>9} {'loop lag':>9}")
+    for batch_size in [1, 16, 64]:
+        result = {"batch_size": batch_size, **asyncio.run(run(args.clients, args.statements, args.workers, batch_size))}
+        results.append(result)
+        print(
+            f"{batch_size:>6} {result['statements_per_second']:>10.0f} {result['batches']:>8}"
+            f" {result['latency_p50'] * 1e3:>7.2f}ms {result['latency_p99'] * 1e3:>7.2f}ms"
+            f" {result['loop_lag_max'] * 1e3:>7.2f}ms"
+        )
+
+    if args.output:
+        write_json(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Measure per keystroke latency of re-validating an edited SQL document
+
+A synthetic file of --lines statements is loaded into a Document and edited
+the way an editor would: typing a word in the middle of a statement,
+typing a semicolon that splits one, and opening and closing a string
+literal, which re-splits everything up to the closing quote. Each is
+compared with re-validating the whole text from scratch.
+
+Usage:
+    python benchmarks/bench_document.py [--lines 5000] [--output results.json]
+"""
+
+import argparse
+import time
+from typing import Callable, Dict, List
+
+from common import write_json
+
+from pgtonic.document import Document
+from pgtonic.validate import validate
+
+STATEMENTS = [
+    "GRANT SELECT ON account TO oliver;",
+    "-- audit\nCREATE TRIGGER audit AFTER INSERT ON account EXECUTE FUNCTION audit();",
+    "DROP TABLE account;",
+    "SELECT 'a;b', $$c;d$$ FROM account;",
+    "/* grants */ GRANT ALL ON account TO public;",
+]
+
+
+def keystrokes(doc: Document, position: int, text: str) -> List[float]:
+    """Seconds taken by each one character insertion of *text* at *position*"""
+    timings = []
+    for ix, char in enumerate(text):
+        start = time.perf_counter()
+        doc.edit(position + ix, position + ix, char)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def scenarios(lines: int) -> Dict[str, Callable[[Document], List[float]]]:
+    middle = sum(len(STATEMENTS[ix % len(STATEMENTS)]) + 1 for ix in range(lines // 2))
+    return {
+        "type word": lambda doc: keystrokes(doc, middle + 6, "UPDATE, "),
+        "type semicolon": lambda doc: keystrokes(doc, middle + 12, ";"),
+        "open and close quote": lambda doc: keystrokes(doc, middle, "'") + keystrokes(doc, middle + 1, "'"),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=5000)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    text = "\n".join(STATEMENTS[ix % len(STATEMENTS)] for ix in range(args.lines))
+    start = time.perf_counter()
+    list(validate([text]))
+    full = time.perf_counter() - start
+
+    results = [{"scenario": "full re-validation", "mean": full, "max": full}]
+    for name, scenario in scenarios(args.lines).items():
+        timings = scenario(Document(text))
+        results.append({"scenario": name, "mean": sum(timings) / len(timings), "max": max(timings)})
+
+    print(f"{'scenario':<22} {'mean':>10} {'max':>10}")
+    for result in results:
+        print(f"{result['scenario']:<22} {result['mean'] * 1e3:>8.3f}ms {result['max'] * 1e3:>8.3f}ms")
+
+    if args.output:
+        write_json(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Measure the cost of the PostgreSQL identifier grammar in generated regexes
+
+The name regexes are timed on the cases of test_regex.py against the
+ASCII only regexes they replaced, including the reserved keyword marking
+pass the new ones rely on. Compiling and matching the pg13 templates shows
+the effect on whole statements, matching reuses the prepared statement
+across templates like a registry does.
+
+Usage:
+    python benchmarks/bench_identifiers.py [--output results.json]
+"""
+
+import argparse
+import re
+from typing import Any, Dict, List
+
+from common import best_of, write_json
+
+from pgtonic.pg13 import create_trigger, grant
+from pgtonic.spec import regex as r
+from pgtonic.spec.parse.ast_passes import Lowering
+from pgtonic.sql.identifiers import prepare, recognize
+
+# Name regexes before keywords were excluded and the full identifier grammar supported
+_LEGACY_UNQUOTED_NAME = "[A-z_][A-z0-9_]*"
+_LEGACY_QUOTED_NAME = '"[^"]+?"'
+_LEGACY_ENTITY_NAME = r.atomic(f"{_LEGACY_UNQUOTED_NAME}|{_LEGACY_QUOTED_NAME}")
+LEGACY_NAME = r.atomic(rf"(?:{_LEGACY_ENTITY_NAME}\.{_LEGACY_ENTITY_NAME})|{_LEGACY_ENTITY_NAME}")
+
+TEMPLATES = [*grant.TEMPLATES, *create_trigger.TEMPLATES]
+
+# The cases of test_regex.py
+NAMES = [
+    "public",
+    "oli_ver",
+    "_dkjle_adb",
+    "dkj8le_adb",
+    "aaAa",
+    "A_aaAa",
+    '"A_aaAa"',
+    '"A_$aaAa"',
+    '"%ab_$^&c"',
+    "8aaa",
+    "aa a",
+    "aa$a",
+    '"a"a"',
+    'a"a',
+    "public.account",
+    "public.ac_ount",
+    "api_v3._abcded1",
+    '"api$_v3"."_abc8dAed1"',
+    '"ap"3"."_abc8dAed1"',
+    'ap"3._abc8dAed1',
+]
+
+STATEMENTS = [
+    "GRANT SELECT ON account TO oliver",
+    "GRANT SELECT, INSERT ON TABLE api.account, api.tenant TO anon, authenticated WITH GRANT OPTION",
+    'GRANT SELECT ON "My Table" TO CURRENT_USER',
+    "CREATE TRIGGER audit AFTER INSERT OR UPDATE ON api.account FOR EACH ROW EXECUTE FUNCTION audit.log()",
+    "DROP TABLE account",
+]
+
+# Uncached, so every call pays for marking
+_prepare = prepare.__wrapped__  # type: ignore
+
+
+def name_results() -> List[Dict[str, Any]]:
+    legacy = re.compile("^" + LEGACY_NAME + "$")
+    current = re.compile("^" + r.NAME + "$")
+    return [
+        {"case": "legacy NAME", "seconds": best_of(lambda: [legacy.match(x) for x in NAMES])},
+        {"case": "NAME", "seconds": best_of(lambda: [current.match(x) for x in NAMES])},
+        {"case": "NAME with marking", "seconds": best_of(lambda: [current.match(_prepare(x)) for x in NAMES])},
+        {"case": "recognize", "seconds": best_of(lambda: [recognize(x) for x in NAMES])},
+    ]
+
+
+def template_results() -> List[Dict[str, Any]]:
+    results = [{"case": "prepare statements", "seconds": best_of(lambda: [_prepare(x) for x in STATEMENTS])}]
+    for lowering in (Lowering.OPTIONAL, Lowering.FACTORED):
+        compiled = [x.compile(lowering) for x in TEMPLATES]
+        results.append(
+            {
+                "case": f"compile {lowering}",
+                "seconds": best_of(
+                    lambda: [re.purge()] + [re.compile(x) for t in TEMPLATES for x in t.artifacts(lowering)[0]], 1
+                ),
+                "regex_chars": sum(len(x) for t in TEMPLATES for x in t.artifacts(lowering)[0]),
+            }
+        )
+        results.append(
+            {
+                "case": f"match {lowering}",
+                "seconds": best_of(lambda: [c.is_match(s) for s in STATEMENTS for c in compiled]),
+            }
+        )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = name_results() + template_results()
+    print(f"{'case':<20} {'time':>12} {'regex chars':>12}")
+    for result in results:
+        print(f"{result['case']:<20} {result['seconds'] * 1e6:>10.1f}us {result.get('regex_chars', ''):>12}")
+
+    if args.output:
+        write_json(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
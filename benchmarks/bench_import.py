@@ -0,0 +1,75 @@
+"""Measure the import time of pgtonic and the cost of loading the pg13 catalog
+
+Each module is imported in a fresh interpreter with ``python -X importtime``
+and the cumulative time reported for it is recorded. The catalog row times
+the first lookup through pgtonic.pg13.registry, which imports and parses
+only the statement kinds the lookup needs.
+
+Usage:
+    python benchmarks/bench_import.py [--output results.json] [--repeat 5]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List
+
+from common import write_json
+
+MODULES = ["pgtonic", "pgtonic.pg13", "pgtonic.pg13.registry", "pgtonic.validate"]
+
+FIRST_LOOKUP = (
+    "import time; t = time.perf_counter(); "
+    "from pgtonic.pg13.registry import REGISTRY; "
+    "REGISTRY.find('GRANT SELECT ON account TO oliver'); "
+    "print(time.perf_counter() - t)"
+)
+
+
+def env() -> Dict[str, str]:
+    src = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+    return {**os.environ, "PYTHONPATH": os.pathsep.join([src, os.environ.get("PYTHONPATH", "")])}
+
+
+def import_time(module: str) -> float:
+    """Cumulative microseconds reported by -X importtime for *module*"""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=env(),
+    ).stderr
+    for line in out.splitlines():
+        _, cumulative, name = line.split("|")
+        if name.strip() == module:
+            return float(cumulative) / 1e6
+    raise ValueError(f"{module} missing from importtime output")
+
+
+def first_lookup() -> float:
+    out = subprocess.run([sys.executable, "-c", FIRST_LOOKUP], capture_output=True, text=True, check=True, env=env())
+    return float(out.stdout)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--repeat", type=int, default=5, help="Interpreters started per measurement")
+    args = parser.parse_args()
+
+    results: List[Dict[str, object]] = []
+    rows = [(module, lambda module=module: import_time(module)) for module in MODULES]
+    rows.append(("first GRANT lookup", first_lookup))
+    for name, measure in rows:
+        seconds = min(measure() for _ in range(args.repeat))
+        results.append({"name": name, "seconds": seconds})
+        print(f"{name:<28}{seconds * 1e3:10.2f}ms")
+
+    if args.output:
+        write_json(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
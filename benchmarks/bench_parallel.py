@@ -0,0 +1,49 @@
+"""Compare match_many throughput for 1, 2, 4 and 8 workers against the serial path
+
+Usage:
+    python benchmarks/bench_parallel.py [--statements N] [--chunk-size N]
+"""
+
+import argparse
+import time
+
+from pgtonic.parallel import match_many
+from pgtonic.pg13.registry import REGISTRY
+
+STATEMENTS = [
+    "GRANT SELECT ON TABLE public.account, book, author TO oliver, anon",
+    "GRANT ALL ON ALL TABLES IN SCHEMA api, other TO oliver, anon WITH GRANT OPTION",
+    "GRANT UPDATE ON TABLE account TO",
+    "CREATE TRIGGER my_trig BEFORE INSERT OR DELETE OR UPDATE ON public.book EXECUTE PROCEDURE somefunc( param1 )",
+    "CREATE CONSTRAINT TRIGGER my_trig AFTER INSERT ON api.account EXECUTE FUNCTION oli.func( param1)",
+    "CREATE TRIGGER my_trig AFTER INSERT ON api.account EXECUTE",
+    "ALTER TABLE account ADD COLUMN id int",
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--statements", type=int, default=100_000)
+    parser.add_argument("--chunk-size", type=int, default=512)
+    args = parser.parse_args()
+
+    templates = list(REGISTRY)
+    statements = [STATEMENTS[ix % len(STATEMENTS)] for ix in range(args.statements)]
+
+    print(f"{'workers':>8} {'seconds':>9} {'stmt/s':>10} {'speedup':>8}")
+    serial = None
+    expected = None
+    for workers in [1, 2, 4, 8]:
+        start = time.perf_counter()
+        results = match_many(statements, templates, workers=workers, chunk_size=args.chunk_size)
+        elapsed = time.perf_counter() - start
+
+        if expected is None:
+            serial, expected = elapsed, results
+        assert results == expected
+        label = "serial" if workers == 1 else str(workers)
+        print(f"{label:>8} {elapsed:9.3f} {len(statements) / elapsed:10.0f} {serial / elapsed:7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
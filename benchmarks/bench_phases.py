@@ -0,0 +1,124 @@
+"""Time each phase of turning a pg13 template into a match
+
+Phases: lex, parse, maybe_to_choice, to_regexes and re.compile for each
+lowering strategy, then is_match against a matching and a non-matching
+statement, with both the regex and the token engine. Every template of the
+pg13 registry is timed, and the run fails when one has no sample statements. Regex length and
+variant counts are reported alongside.
+
+Usage:
+    python benchmarks/bench_phases.py [--output results.json]
+"""
+
+import argparse
+import re
+from typing import Any, Dict, List, Tuple
+
+from common import best_of, write_json
+
+from pgtonic.instrument import template_name
+from pgtonic.pg13.registry import REGISTRY
+from pgtonic.spec.engine import Engine
+from pgtonic.spec.lex.lex import lex
+from pgtonic.spec.parse.ast_passes import Lowering, lower, maybe_to_choice
+from pgtonic.spec.parse.parse import parse
+from pgtonic.spec.template import Template
+
+# A matching and a non-matching statement per pg13 template, by instrument.template_name
+SAMPLES = {
+    "GRANT { privilege [, ...] | ALL [ PRIVILEGES ] } ON { [ T...": (
+        "GRANT SELECT, UPDATE ON TABLE public.account, book TO oliver, anon WITH GRANT OPTION",
+        "GRANT SELECT, UPDATE ON TABLE public.account, book TO oliver, anon WITH",
+    ),
+    "CREATE [ CONSTRAINT ] TRIGGER name { BEFORE | AFTER | INS...": (
+        "CREATE TRIGGER my_trig BEFORE INSERT OR UPDATE ON public.book FOR EACH ROW EXECUTE PROCEDURE f( a )",
+        "CREATE TRIGGER my_trig BEFORE INSERT OR UPDATE ON public.book FOR EACH ROW EXECUTE PROCEDURE f( a",
+    ),
+}
+
+
+def samples() -> List[Tuple[str, Template, str, str]]:
+    """Name, template and sample statements of every pg13 template, failing when one has no samples"""
+    result = []
+    missing = []
+    for template in REGISTRY:
+        name = template_name(template)
+        if name not in SAMPLES:
+            missing.append(name)
+            continue
+        result.append((name, template, *SAMPLES[name]))
+    if missing:
+        raise SystemExit("No sample statements in SAMPLES for: " + ", ".join(repr(x) for x in missing))
+    return result
+
+
+def bench_template(template: Template, matching: str, non_matching: str, repeat: int) -> Dict[str, Any]:
+    spec = template.spec
+    where = template.where or {}
+    ast = parse(spec)
+
+    phases = {
+        "lex": best_of(lambda: lex(spec), repeat),
+        "parse": best_of(lambda: parse.__wrapped__(spec), repeat),  # type: ignore
+        # maybe_to_choice is memoized per node, clear it to time the expansion itself
+        "maybe_to_choice": best_of(lambda: (maybe_to_choice.cache_clear(), maybe_to_choice(ast)), repeat),
+    }
+    regex_length = {}
+    variants = {}
+
+    for lowering in Lowering:
+        lowered = lower(ast, lowering, where)
+        # The regexes compile builds patterns from, matching prepared statements
+        regexes, _ = template.artifacts(lowering)
+        phases[f"to_regex[{lowering}]"] = best_of(lambda: lowered.to_regex(where), repeat)
+        phases[f"to_regexes[{lowering}]"] = best_of(lambda: template.to_regexes(lowering), repeat)
+
+        def compile_all() -> None:
+            # Bypass the re module's own pattern cache
+            re.purge()
+            for regex in regexes:
+                re.compile("^" + regex + "$")
+
+        phases[f"re.compile[{lowering}]"] = best_of(compile_all, repeat)
+
+        compiled = template.compile(lowering)
+        assert compiled.is_match(matching) and not compiled.is_match(non_matching)
+        phases[f"is_match[{lowering},match]"] = best_of(lambda: compiled.is_match(matching), repeat)
+        phases[f"is_match[{lowering},no_match]"] = best_of(lambda: compiled.is_match(non_matching), repeat)
+
+        regex_length[str(lowering)] = sum(len(x) for x in regexes)
+        variants[str(lowering)] = len(regexes)
+
+    assert template.is_match(matching, Engine.TOKENS) and not template.is_match(non_matching, Engine.TOKENS)
+    phases["is_match[TOKENS,match]"] = best_of(lambda: template.is_match(matching, Engine.TOKENS), repeat)
+    phases["is_match[TOKENS,no_match]"] = best_of(lambda: template.is_match(non_matching, Engine.TOKENS), repeat)
+
+    return {"phases": phases, "regex_length": regex_length, "variants": variants}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    results: List[Dict[str, Any]] = []
+    for name, template, matching, non_matching in samples():
+        result = {"template": name, **bench_template(template, matching, non_matching, args.repeat)}
+        results.append(result)
+
+        print(name)
+        for phase, seconds in result["phases"].items():
+            print(f"  {phase:<36} {seconds * 1e6:12.1f} us")
+        for lowering in Lowering:
+            print(
+                f"  {'regex[' + str(lowering) + ']':<36} {result['regex_length'][str(lowering)]:9} chars"
+                f" {result['variants'][str(lowering)]:5} variants"
+            )
+
+    if args.output:
+        write_json(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
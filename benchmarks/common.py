@@ -0,0 +1,35 @@
+"""Helpers shared by the benchmark scripts"""
+
+import json
+import platform
+import subprocess
+import timeit
+from typing import Any, Callable, Dict
+
+import pgtonic
+
+
+def best_of(func: Callable[[], Any], repeat: int = 3) -> float:
+    """Seconds per call of *func*, the best of *repeat* runs"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def metadata() -> Dict[str, Any]:
+    """Context needed to compare results across commits and machines"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "pgtonic": pgtonic.__version__,
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+
+def write_json(path: str, results: Any) -> None:
+    with open(path, "w") as f:
+        json.dump({"meta": metadata(), "results": results}, f, indent=2)
@@ -88,6 +88,6 @@ setuptools.setup(
         "Programming Language :: Python :: 3.8",
         "Programming Language :: Python :: 3.9",
     ],
-    install_requires=["typing_extensions", "flupy"],
+    install_requires=["typing_extensions"],
     extras_require={"dev": DEV_REQUIRES},
 )
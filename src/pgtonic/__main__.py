@@ -0,0 +1,37 @@
+import argparse
+import sys
+from typing import List, Optional
+
+from pgtonic.validate import validate_file
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m pgtonic",
+        description="Check that each statement in a SQL file matches a pg13 template",
+    )
+    parser.add_argument("files", nargs="*", default=["-"], help="SQL files to check, '-' reads stdin")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only report statements that do not match")
+    args = parser.parse_args(argv)
+
+    n_failures = 0
+    for path in args.files:
+        stream = sys.stdin if path == "-" else open(path)
+        try:
+            for result in validate_file(stream):
+                if not result.is_match:
+                    n_failures += 1
+                elif args.quiet:
+                    continue
+                status = "ok" if result.is_match else "no match"
+                text = " ".join(result.statement.text.split())
+                print(f"{path}:{result.statement.line}: {status}: {text[:80]}")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+    return 1 if n_failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+"""asyncio front end for validating statements without blocking the event loop
+
+Statements submitted concurrently are collected into small batches and
+matched on a bounded executor, one batch per worker at a time. Batches share
+the registry across the executor's threads, which loads deferred templates
+under its lock.
+"""
+
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Deque,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from pgtonic.pg13.registry import REGISTRY
+from pgtonic.spec.registry import Registry
+from pgtonic.spec.template import Template
+from pgtonic.sql.split import Statement, StatementSplitter
+from pgtonic.validate import Result
+
+DEFAULT_BATCH_SIZE = 64
+
+# Seconds to wait for more statements once the first of a batch arrives
+DEFAULT_BATCH_DELAY = 0.001
+
+# Latencies kept for the percentiles reported by Validator.metrics
+LATENCY_WINDOW = 1024
+
+
+@dataclass(frozen=True)
+class Metrics:
+    submitted: int
+    completed: int
+    timed_out: int
+    batches: int
+    # Statements waiting to be batched
+    queue_depth: int
+    # Batches running on the executor
+    in_flight: int
+    # Seconds from submission to result over the last LATENCY_WINDOW statements
+    latency_p50: float
+    latency_p99: float
+    latency_max: float
+
+
+# A queued statement, the future receiving its result and when it was submitted
+_Pending = Tuple[str, "asyncio.Future[Optional[Template]]", float]
+
+
+def _match_batch(registry: Registry, statements: List[str]) -> List[Optional[Template]]:
+    return [registry.find(sql) for sql in statements]
+
+
+class Validator:
+    """Match statements on an executor, batching statements submitted close together
+
+    Args:
+        registry: templates to match against
+        workers: batches matched at the same time
+        executor: runs the batches, a thread pool of *workers* threads by default
+        batch_size: most statements matched per batch
+        batch_delay: seconds to wait for a batch to fill once its first statement arrives
+        timeout: seconds after which validate raises asyncio.TimeoutError, None to wait forever.
+            Only the caller stops waiting, the executor still matches the statement's batch
+        max_pending: statements queued before validate waits for room
+    """
+
+    def __init__(
+        self,
+        registry: Registry = REGISTRY,
+        workers: int = 1,
+        executor: Optional[Executor] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        batch_delay: float = DEFAULT_BATCH_DELAY,
+        timeout: Optional[float] = None,
+        max_pending: int = 1024,
+    ) -> None:
+        self.registry = registry
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self._executor = executor
+        self._owns_executor = executor is None
+
+        self._queue: Optional["asyncio.Queue[_Pending]"] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._dispatcher: Optional["asyncio.Task[None]"] = None
+        # Batch being collected or waiting for a worker
+        self._batch: List[_Pending] = []
+        # Running batches, referenced so they are not garbage collected
+        self._running: Set["asyncio.Task[None]"] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self._submitted = 0
+        self._completed = 0
+        self._timed_out = 0
+        self._batches = 0
+        self._in_flight = 0
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def _start(self) -> "asyncio.Queue[_Pending]":
+        if self._queue is None:
+            self._loop = asyncio.get_running_loop()
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._slots = asyncio.Semaphore(self.workers)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pgtonic")
+            self._dispatcher = self._loop.create_task(self._dispatch())
+        return self._queue
+
+    async def validate(self, sql: str) -> Optional[Template]:
+        """The first template matching *sql*, or None"""
+        queue = self._start()
+        assert self._loop is not None
+        future = self._loop.create_future()
+        submitted = time.perf_counter()
+        self._submitted += 1
+        await queue.put((sql, future, submitted))
+        if queue is not self._queue:
+            # Closed while waiting for room in the queue
+            future.cancel()
+        try:
+            # Shield the future so a timeout leaves the batch's other statements alone
+            template = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self._timed_out += 1
+            raise
+        self._latencies.append(time.perf_counter() - submitted)
+        return template
+
+    async def validate_stream(self, chunks: Union[Iterable[str], AsyncIterable[str]]) -> AsyncIterator[Result]:
+        """Split SQL text chunks into statements and yield their results in input order
+
+        Up to max_pending statements are validated concurrently
+        """
+        splitter = StatementSplitter()
+        pending: Deque[Tuple[Statement, "asyncio.Future[Optional[Template]]"]] = deque()
+
+        async def drain(limit: int) -> AsyncIterator[Result]:
+            while len(pending) > limit:
+                statement, task = pending.popleft()
+                yield Result(statement, await task)
+
+        try:
+            async for chunk in _aiter(chunks):
+                for statement in splitter.feed(chunk):
+                    pending.append((statement, asyncio.ensure_future(self.validate(statement.text))))
+                async for result in drain(self.max_pending):
+                    yield result
+
+            for statement in splitter.close():
+                pending.append((statement, asyncio.ensure_future(self.validate(statement.text))))
+            async for result in drain(0):
+                yield result
+        finally:
+            # e.g. the caller stopped iterating early or a statement timed out
+            for _, task in pending:
+                task.cancel()
+            await asyncio.gather(*[task for _, task in pending], return_exceptions=True)
+
+    async def _dispatch(self) -> None:
+        queue = self._queue
+        slots = self._slots
+        assert queue is not None and slots is not None and self._loop is not None
+        while True:
+            batch = self._batch = [await queue.get()]
+            if self.batch_delay > 0 and queue.empty():
+                await asyncio.sleep(self.batch_delay)
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            await slots.acquire()
+            self._batch = []
+            task = self._loop.create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[_Pending]) -> None:
+        assert self._loop is not None and self._slots is not None
+        self._batches += 1
+        self._in_flight += 1
+        try:
+            try:
+                templates = await self._loop.run_in_executor(
+                    self._executor, _match_batch, self.registry, [sql for sql, _, _ in batch]
+                )
+            except Exception as exc:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                return
+            for (_, future, _), template in zip(batch, templates):
+                if not future.done():
+                    future.set_result(template)
+            self._completed += len(batch)
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+
+    def metrics(self) -> Metrics:
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+        return Metrics(
+            submitted=self._submitted,
+            completed=self._completed,
+            timed_out=self._timed_out,
+            batches=self._batches,
+            queue_depth=self._queue.qsize() if self._queue is not None else 0,
+            in_flight=self._in_flight,
+            latency_p50=percentile(0.5),
+            latency_p99=percentile(0.99),
+            latency_max=latencies[-1] if latencies else 0.0,
+        )
+
+    async def close(self) -> None:
+        """Stop batching and shut down the executor if the validator created it
+
+        Running batches complete, statements not yet in one are cancelled
+        """
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        unbatched, self._batch = self._batch, []
+        if self._queue is not None:
+            while not self._queue.empty():
+                unbatched.append(self._queue.get_nowait())
+        for _, future, _ in unbatched:
+            future.cancel()
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._queue = None
+
+    async def __aenter__(self) -> "Validator":
+        return self
+
+    async def __aexit__(self, *args: object) -> None:
+        await self.close()
+
+
+async def _aiter(chunks: Union[Iterable[str], AsyncIterable[str]]) -> AsyncIterator[str]:
+    if hasattr(chunks, "__aiter__"):
+        async for chunk in chunks:  # type: ignore
+            yield chunk
+    else:
+        for chunk in chunks:  # type: ignore
+            yield chunk
+
+
+# Validator used by the module level functions, one per event loop
+_DEFAULT: Optional[Validator] = None
+
+
+def _default() -> Validator:
+    global _DEFAULT
+    if _DEFAULT is None or _DEFAULT._loop not in (None, asyncio.get_running_loop()):
+        if _DEFAULT is not None and _DEFAULT._executor is not None:
+            # The previous loop is gone, and with it the dispatcher
+            _DEFAULT._executor.shutdown(wait=False)
+        _DEFAULT = Validator()
+    return _DEFAULT
+
+
+async def validate(sql: str) -> Optional[Template]:
+    """The first pg13 template matching *sql*, matched off the event loop"""
+    return await _default().validate(sql)
+
+
+async def validate_stream(chunks: Union[Iterable[str], AsyncIterable[str]]) -> AsyncIterator[Result]:
+    """Results for the pg13 statements in a stream of SQL text chunks, in input order"""
+    async for result in _default().validate_stream(chunks):
+        yield result
@@ -0,0 +1,42 @@
+"""Build a binary catalog of the pg13 templates, see pgtonic.spec.catalog
+
+python -m pgtonic.catalog build pg13.catalog
+python -m pgtonic.catalog info pg13.catalog
+"""
+
+import argparse
+import os
+import sys
+from typing import List, Optional
+
+from pgtonic.spec.catalog import Catalog, write
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m pgtonic.catalog", description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command")
+    build = commands.add_parser("build", help="Write a catalog of every pg13 template")
+    build.add_argument("path")
+    build.add_argument("--no-automaton", action="store_true", help="Leave out the automaton used by find_all")
+    info = commands.add_parser("info", help="Summarize a catalog")
+    info.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        from pgtonic.pg13.registry import REGISTRY
+
+        write(args.path, list(REGISTRY), automaton=not args.no_automaton)
+        print(f"{args.path}: {len(REGISTRY)} templates, {os.path.getsize(args.path)} bytes")
+    elif args.command == "info":
+        with Catalog.open(args.path) as catalog:
+            print(f"{args.path}: pgtonic {catalog.version}, {len(catalog)} templates")
+            for template in catalog:
+                print("  " + " ".join(template.spec.split())[:76])
+    else:
+        parser.print_usage()
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+from typing import Dict, List, Optional
+
+from pgtonic.pg13.registry import REGISTRY
+from pgtonic.spec.registry import Registry
+from pgtonic.spec.template import Template
+from pgtonic.sql.split import Statement, StatementSplitter
+from pgtonic.validate import Result
+
+# Characters fed to the splitter at a time while looking for resynchronization
+_CHUNK_SIZE = 512
+
+
+class Document:
+    """SQL text with the match result of each statement, kept up to date across edits
+
+    An edit re-splits the text from the start of the statement it touches
+    until the statement boundaries agree with the previous ones again, and
+    only re-matches the statements in between. Statements after that point
+    are moved lazily, so an edit costs time proportional to the statements
+    between it and the previous edit rather than to the size of the document.
+    """
+
+    def __init__(self, text: str = "", registry: Registry = REGISTRY) -> None:
+        self.registry = registry
+        self.text = text
+        self._results: List[Result] = []
+        splitter = StatementSplitter()
+        for statement in splitter.feed(text) + splitter.close():
+            self._results.append(Result(statement, registry.find(statement.text)))
+        # Results from index _pending on have not been moved by _delta characters and _line_delta lines yet
+        self._pending = len(self._results)
+        self._delta = 0
+        self._line_delta = 0
+
+    @property
+    def results(self) -> List[Result]:
+        self._settle(len(self._results))
+        return list(self._results)
+
+    @property
+    def statements(self) -> List[Statement]:
+        return [x.statement for x in self.results]
+
+    def result_at(self, offset: int) -> Optional[Result]:
+        """Result of the statement whose source spans *offset*"""
+        ix = self._bisect(offset)
+        if ix < len(self._results) and self._statement(ix).start <= offset:
+            return self._result(ix)
+        return None
+
+    def edit(self, start: int, end: int, text: str) -> List[Result]:
+        """Replace text[start:end] with *text* and return the results of the re-split statements
+
+        Statements whose text did not change keep their previous result
+        without being matched again
+        """
+        if not 0 <= start <= end <= len(self.text):
+            raise ValueError("Invalid edit range {}:{}".format(start, end))
+
+        old_text = self.text
+        new_text = old_text[:start] + text + old_text[end:]
+        delta = len(text) - (end - start)
+        line_delta = text.count("\n") - old_text.count("\n", start, end)
+        edited_end = start + len(text)
+        self.text = new_text
+
+        # Resume splitting at the end of the last statement ending before the edit
+        first = self._bisect(start - 1) if start > 0 else 0
+        self._settle(first)
+        resume = self._results[first - 1].statement.end if first > 0 else 0
+        splitter = StatementSplitter(resume, new_text.count("\n", 0, resume) + 1)
+
+        reusable: Dict[str, Optional[Template]] = {}
+        replaced: List[Result] = []
+        resync = len(self._results)
+        ix = first
+        cursor = resume
+
+        def accept(statements: List[Statement]) -> bool:
+            """Add newly split statements, returning True once boundaries agree again"""
+            nonlocal ix, resync
+            for statement in statements:
+                # Old statements entirely before this one are gone
+                while ix < len(self._results) and self._statement(ix).start + delta < statement.start:
+                    reusable[self._statement(ix).text] = self._results[ix].template
+                    ix += 1
+                old = self._statement(ix) if ix < len(self._results) else None
+                if old is not None and old.start + delta == statement.start:
+                    if (
+                        statement.start >= edited_end
+                        and old.end + delta == statement.end
+                        and old.text == statement.text
+                    ):
+                        resync = ix
+                        return True
+                    reusable[old.text] = self._results[ix].template
+                    ix += 1
+                if statement.text in reusable:
+                    template = reusable[statement.text]
+                else:
+                    template = self.registry.find(statement.text)
+                replaced.append(Result(statement, template))
+            return False
+
+        done = False
+        while cursor < len(new_text) and not done:
+            chunk = new_text[cursor : cursor + _CHUNK_SIZE]
+            cursor += len(chunk)
+            done = accept(splitter.feed(chunk))
+        if not done:
+            accept(splitter.close())
+
+        if self._pending - resync > len(self._results) - self._pending:
+            # Cheaper to settle the pending results and defer this edit's shift for all kept results
+            self._settle(len(self._results))
+            self._pending = resync
+        # Kept results between the resynchronization point and the pending ones only need this edit's shift
+        for i in range(resync, self._pending):
+            self._results[i] = _shift(self._results[i], delta, line_delta)
+        pending = first + len(replaced) + max(0, self._pending - resync)
+        self._results[first:resync] = replaced
+        self._pending = pending
+        if pending == len(self._results):
+            self._delta = self._line_delta = 0
+        else:
+            self._delta += delta
+            self._line_delta += line_delta
+        return replaced
+
+    def _statement(self, ix: int) -> Statement:
+        return self._result(ix).statement
+
+    def _result(self, ix: int) -> Result:
+        result = self._results[ix]
+        if ix >= self._pending:
+            return _shift(result, self._delta, self._line_delta)
+        return result
+
+    def _settle(self, stop: int) -> None:
+        """Apply the pending shift to the results before *stop*"""
+        if stop <= self._pending:
+            return
+        for i in range(self._pending, stop):
+            self._results[i] = _shift(self._results[i], self._delta, self._line_delta)
+        self._pending = stop
+        if stop == len(self._results):
+            self._delta = self._line_delta = 0
+
+    def _bisect(self, offset: int) -> int:
+        """Index of the first statement ending after *offset*"""
+        lo, hi = 0, len(self._results)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            end = self._results[mid].statement.end
+            if mid >= self._pending:
+                end += self._delta
+            if end <= offset:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+def _shift(result: Result, delta: int, line_delta: int) -> Result:
+    statement = result.statement
+    return Result(
+        Statement(statement.text, statement.start + delta, statement.end + delta, statement.line + line_delta),
+        result.template,
+    )
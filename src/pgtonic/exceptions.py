@@ -1,10 +1,29 @@
+from typing import Optional
+
+
 class PGTonicException(Exception):
     pass
 
 
-class LexFailureException(PGTonicException):
+class SpecFailureException(PGTonicException):
+    """Failure at a known position in a spec"""
+
+    def __init__(self, message: str, line: Optional[int] = None, column: Optional[int] = None) -> None:
+        super().__init__(message)
+        # 1-based position in the spec
+        self.line = line
+        self.column = column
+
+    @classmethod
+    def at(cls, message: str, spec: str, offset: int) -> "SpecFailureException":
+        line = spec.count("\n", 0, offset) + 1
+        column = offset - spec.rfind("\n", 0, offset)
+        return cls("{} at line {}, column {}".format(message, line, column), line, column)
+
+
+class LexFailureException(SpecFailureException):
     pass
 
 
-class ParseFailureException(PGTonicException):
+class ParseFailureException(SpecFailureException):
     pass
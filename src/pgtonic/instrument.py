@@ -0,0 +1,187 @@
+"""Opt-in timings and counters for the lex, parse, lower, regex, compile and match phases
+
+    with instrument.recording() as recorder:
+        REGISTRY.find(sql)
+    print(recorder.to_prometheus())
+
+While no recorder is active, instrumented functions only pay for a global
+lookup and a None check.
+"""
+
+import re
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import wraps
+from time import perf_counter
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+if TYPE_CHECKING:
+    from pgtonic.spec.template import Template
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+LEX = "lex"
+PARSE = "parse"
+LOWER = "lower"
+REGEX = "regex"
+COMPILE = "compile"
+MATCH = "match"
+
+# The active Recorder, None when instrumentation is disabled
+ACTIVE: Optional["Recorder"] = None
+
+
+@dataclass
+class PhaseStats:
+    count: int = 0
+    # Seconds, including time spent in nested phases
+    total: float = 0.0
+    max: float = 0.0
+
+
+@dataclass
+class TemplateStats:
+    calls: int = 0
+    matches: int = 0
+    # Regex variants and their total length by lowering
+    variants: Dict[str, int] = field(default_factory=dict)
+    regex_size: Dict[str, int] = field(default_factory=dict)
+
+
+def template_name(template: "Template") -> str:
+    """Label for a template: its spec with whitespace collapsed, truncated"""
+    name = " ".join(template.spec.split())
+    return name if len(name) <= 60 else name[:57] + "..."
+
+
+class Recorder:
+    """Collects phase timings and per template counters
+
+    Subclass and override phase to forward timings elsewhere as they happen
+    """
+
+    def __init__(self) -> None:
+        self.phases: Dict[str, PhaseStats] = {}
+        self.templates: Dict[str, TemplateStats] = {}
+        self._lock = threading.Lock()
+
+    def phase(self, name: str, seconds: float) -> None:
+        with self._lock:
+            stats = self.phases.setdefault(name, PhaseStats())
+            stats.count += 1
+            stats.total += seconds
+            stats.max = max(stats.max, seconds)
+
+    def match(self, template: "Template", matched: bool) -> None:
+        with self._lock:
+            stats = self.templates.setdefault(template_name(template), TemplateStats())
+            stats.calls += 1
+            stats.matches += matched
+
+    def compiled(self, template: "Template", lowering: str, regexes: List[str]) -> None:
+        with self._lock:
+            stats = self.templates.setdefault(template_name(template), TemplateStats())
+            stats.variants[lowering] = len(regexes)
+            stats.regex_size[lowering] = sum(len(x) for x in regexes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "phases": {k: vars(v).copy() for k, v in self.phases.items()},
+            "templates": {
+                k: {
+                    "calls": v.calls,
+                    "matches": v.matches,
+                    "variants": dict(v.variants),
+                    "regex_size": dict(v.regex_size),
+                }
+                for k, v in self.templates.items()
+            },
+        }
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format"""
+        lines = [
+            "# TYPE pgtonic_phase_seconds summary",
+            *_samples("pgtonic_phase_seconds_sum", [({"phase": k}, v.total) for k, v in self.phases.items()]),
+            *_samples("pgtonic_phase_seconds_count", [({"phase": k}, v.count) for k, v in self.phases.items()]),
+            "# TYPE pgtonic_phase_seconds_max gauge",
+            *_samples("pgtonic_phase_seconds_max", [({"phase": k}, v.max) for k, v in self.phases.items()]),
+            "# TYPE pgtonic_match_calls_total counter",
+            *_samples("pgtonic_match_calls_total", [({"template": k}, v.calls) for k, v in self.templates.items()]),
+            "# TYPE pgtonic_matches_total counter",
+            *_samples("pgtonic_matches_total", [({"template": k}, v.matches) for k, v in self.templates.items()]),
+            "# TYPE pgtonic_template_variants gauge",
+            *_samples(
+                "pgtonic_template_variants",
+                [
+                    ({"template": k, "lowering": lowering}, n)
+                    for k, v in self.templates.items()
+                    for lowering, n in v.variants.items()
+                ],
+            ),
+            "# TYPE pgtonic_template_regex_bytes gauge",
+            *_samples(
+                "pgtonic_template_regex_bytes",
+                [
+                    ({"template": k, "lowering": lowering}, n)
+                    for k, v in self.templates.items()
+                    for lowering, n in v.regex_size.items()
+                ],
+            ),
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return re.sub(r'(["\\])', r"\\\1", value).replace("\n", "\\n")
+
+
+def _samples(metric: str, samples: List[Tuple[Dict[str, str], float]]) -> List[str]:
+    result = []
+    for labels, value in samples:
+        label_text = ",".join('{}="{}"'.format(k, _escape(v)) for k, v in labels.items())
+        result.append("{}{{{}}} {}".format(metric, label_text, value))
+    return result
+
+
+@contextmanager
+def recording(recorder: Optional[Recorder] = None) -> Iterator[Recorder]:
+    """Activate *recorder*, or a new Recorder, for the duration of the block"""
+    global ACTIVE
+    previous = ACTIVE
+    ACTIVE = recorder if recorder is not None else Recorder()
+    try:
+        yield ACTIVE
+    finally:
+        ACTIVE = previous
+
+
+def timed(phase: str) -> Callable[[F], F]:
+    """Record the duration of each call of the decorated function as *phase*"""
+
+    def decorator(func: F) -> F:
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            recorder = ACTIVE
+            if recorder is None:
+                return func(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                recorder.phase(phase, perf_counter() - start)
+
+        return wrapper  # type: ignore
+
+    return decorator
@@ -0,0 +1,113 @@
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from itertools import islice
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+from pgtonic.spec.catalog import Catalog
+from pgtonic.spec.template import CompiledTemplate, Template
+
+DEFAULT_CHUNK_SIZE = 512
+
+# Chunks in flight per worker, bounds memory on streamed input while keeping workers busy
+CHUNKS_PER_WORKER = 2
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Compiled templates, populated once per worker process by _init_worker
+_COMPILED: List[CompiledTemplate] = []
+
+
+def _init_worker(compiled: List[CompiledTemplate]) -> None:
+    global _COMPILED
+    _COMPILED = compiled
+
+
+def _init_catalog_worker(path: str, fingerprints: List[str]) -> None:
+    """Compile the templates with *fingerprints* from the catalog mapped at *path*"""
+    global _COMPILED
+    catalog = Catalog.open(path)
+    index = catalog.by_fingerprint()
+    _COMPILED = [catalog.template(index[x]).compile() for x in fingerprints]
+
+
+def _first_match(compiled: Sequence[CompiledTemplate], sql: str) -> Optional[int]:
+    for ix, template in enumerate(compiled):
+        if template.is_match(sql):
+            return ix
+    return None
+
+
+def _match_chunk(statements: List[str]) -> List[Optional[int]]:
+    return [_first_match(_COMPILED, sql) for sql in statements]
+
+
+def _chunked(statements: Iterable[str], size: int) -> Iterator[List[str]]:
+    iterator = iter(statements)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _bounded_map(pool: Executor, func: Callable[[T], R], items: Iterable[T], window: int) -> Iterator[R]:
+    """Like pool.map, but submits at most *window* items ahead of the result being yielded"""
+    pending: Deque["Future[R]"] = deque()
+    iterator = iter(items)
+    for item in iterator:
+        pending.append(pool.submit(func, item))
+        if len(pending) >= window:
+            break
+    while pending:
+        result = pending.popleft().result()
+        for item in islice(iterator, 1):
+            pending.append(pool.submit(func, item))
+        yield result
+
+
+def match_many(
+    statements: Iterable[str],
+    templates: Sequence[Template],
+    workers: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    catalog: Optional[str] = None,
+) -> List[Optional[int]]:
+    """Index of the first template in *templates* each statement matches, in input order
+
+    With more than one worker, statements are matched in batches of *chunk_size*
+    across a process pool. Compiled templates are sent to each worker once, when
+    the worker starts, rather than with every batch. When *catalog* is the path
+    of a catalog containing *templates*, workers instead map the catalog and
+    compile from it, sharing its pages, and only template fingerprints are sent.
+    Statements are read from *statements* as batches complete, so only a few
+    batches per worker are held in memory at a time.
+    """
+    if workers <= 1:
+        compiled = [template.compile() for template in templates]
+        return [_first_match(compiled, sql) for sql in statements]
+
+    if catalog is None:
+        initializer: Callable[..., None] = _init_worker
+        initargs: Tuple[Any, ...] = ([template.compile() for template in templates],)
+    else:
+        initializer = _init_catalog_worker
+        initargs = (catalog, [template.fingerprint for template in templates])
+
+    results: List[Optional[int]] = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as pool:
+        chunks = _chunked(statements, chunk_size)
+        for chunk_results in _bounded_map(pool, _match_chunk, chunks, workers * CHUNKS_PER_WORKER):
+            results.extend(chunk_results)
+    return results
@@ -0,0 +1,21 @@
+"""Templates for PostgreSQL 13 statements
+
+Submodules are imported on first access, e.g. pgtonic.pg13.grant, so only
+the statement kinds in use are parsed and compiled.
+"""
+
+from importlib import import_module
+from types import ModuleType
+from typing import Dict, List
+
+# Submodule by the keyword its statements start with
+CATALOG: Dict[str, List[str]] = {
+    "CREATE": ["create_trigger"],
+    "GRANT": ["grant"],
+}
+
+
+def __getattr__(name: str) -> ModuleType:
+    if any(name in modules for modules in CATALOG.values()):
+        return import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
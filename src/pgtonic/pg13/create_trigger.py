@@ -1,6 +1,6 @@
-from pgtonic.spec.template import Template
+from pgtonic.spec.template import Template, intern
 
-COLUMN_NAME_SPEC = Template("{ UNQUALIFIED_NAME }")
+COLUMN_NAME_SPEC = intern(Template("{ UNQUALIFIED_NAME }"))
 
 TEMPLATES = [
     Template(
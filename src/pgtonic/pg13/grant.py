@@ -1,17 +1,26 @@
-from pgtonic.spec.template import Template
+from pgtonic.spec.template import Template, intern
 
-ROLE_SPEC = Template("{ [ GROUP ] UNQUALIFIED_NAME | PUBLIC | CURRENT_USER | SESSION_USER }")
+ROLE_SPEC = intern(Template("{ [ GROUP ] UNQUALIFIED_NAME | PUBLIC | CURRENT_USER | SESSION_USER }"))
 
 TEMPLATES = [
     Template(
-        """
+        original="""
 GRANT { { SELECT | INSERT | UPDATE | DELETE | TRUNCATE | REFERENCES | TRIGGER }
 [, ...] | ALL [ PRIVILEGES ] }
+ON { [ TABLE ] table_name [, ...]
+     | ALL TABLES IN SCHEMA schema_name [, ...] }
+TO role_specification [, ...] [ WITH GRANT OPTION ]
+    """,
+        # The docs are not wrong here. The spec is only restated so the privilege
+        # list is an argument Template.match can extract, and matches the same statements
+        corrected="""
+GRANT { privilege [, ...] | ALL [ PRIVILEGES ] }
 ON { [ TABLE ] table_name [, ...]
      | ALL TABLES IN SCHEMA schema_name [, ...] }
 TO role_specification [, ...] [ WITH GRANT OPTION ]
     """,
         where={
+            "privilege": Template("{ SELECT | INSERT | UPDATE | DELETE | TRUNCATE | REFERENCES | TRIGGER }"),
             "table_name": Template("{ NAME }"),
             "schema_name": Template("{ UNQUALIFIED_NAME }"),
             "role_specification": ROLE_SPEC,
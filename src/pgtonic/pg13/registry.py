@@ -0,0 +1,19 @@
+from importlib import import_module
+from typing import Callable, List
+
+from pgtonic.pg13 import CATALOG
+from pgtonic.spec.registry import Registry
+from pgtonic.spec.template import Template
+
+
+def _loader(module: str) -> Callable[[], List[Template]]:
+    def load() -> List[Template]:
+        return import_module(f"pgtonic.pg13.{module}").TEMPLATES
+
+    return load
+
+
+REGISTRY = Registry()
+for keyword, modules in CATALOG.items():
+    for module in modules:
+        REGISTRY.defer(keyword, _loader(module))
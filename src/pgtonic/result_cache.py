@@ -0,0 +1,179 @@
+"""Bounded cache of match results for statements that are validated repeatedly
+
+Statements are looked up by a normalized form, so the same statement
+formatted differently is only matched once. Keywords are not case folded,
+templates match them case sensitively.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, Optional, Set
+
+from pgtonic.pg13.registry import REGISTRY
+from pgtonic.spec.parse.types import Base, Literal
+from pgtonic.spec.registry import Registry
+from pgtonic.spec.template import Template
+from pgtonic.sql import identifiers
+
+DEFAULT_MAXSIZE = 4096
+
+# Quoted identifiers and string literals are kept verbatim with their prefix, unterminated ones to the end
+_QUOTED = r'(?:[Uu]&)?"(?:[^"]|"")*(?:"|\Z)|' + r"(?:[EeBbXxNn]|[Uu]&)?'(?:[^']|'')*(?:'|\Z)"
+_WORD = identifiers.WORD
+# Whole unquoted words, not adjacent to characters the name regexes would take as part of them
+_BOUNDED_WORD = r"(?P<word>(?<!{char}){word}(?!{char}))".format(char=identifiers.IDENTIFIER_CHAR, word=_WORD)
+_TOKEN = re.compile(r"(?P<quoted>{})|(?P<space>{}+)|{}".format(_QUOTED, identifiers.SPACE, _BOUNDED_WORD))
+_WORD_TOKEN = re.compile(_BOUNDED_WORD)
+
+# Distinguishes a missing entry from a cached None
+_MISSING = object()
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    maxsize: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def literal_words(templates: Iterable[Template]) -> FrozenSet[str]:
+    """Words appearing as literals in *templates* or their where templates"""
+    words: Set[str] = set()
+    seen: Set[int] = set()
+
+    def visit(node: Base) -> None:
+        if id(node) in seen:
+            return
+        seen.add(id(node))
+        if isinstance(node, Literal) and re.fullmatch(_WORD, node.content):
+            words.add(node.content)
+        for child in node.children():
+            visit(child)
+
+    pending = list(templates)
+    while pending:
+        template = pending.pop()
+        visit(template.ast)
+        pending.extend((template.where or {}).values())
+    return frozenset(words)
+
+
+class ResultCache:
+    """LRU of the template each statement matched, in front of a registry
+
+    Whitespace outside quotes is collapsed, which no template can tell apart.
+    With *abstract_identifiers*, unquoted words that are neither a literal of
+    any template nor a reserved keyword, i.e. can only ever match a name, are
+    replaced by a placeholder, so e.g. the same GRANT for each tenant schema is
+    matched once. The cache assumes the registry does not change, call clear
+    after registering templates.
+
+    Has the find and is_match methods of a Registry, and can be used where
+    validate expects one.
+    """
+
+    def __init__(
+        self, registry: Registry = REGISTRY, maxsize: int = DEFAULT_MAXSIZE, abstract_identifiers: bool = False
+    ) -> None:
+        self.registry = registry
+        self.maxsize = maxsize
+        self.abstract_identifiers = abstract_identifiers
+        self._entries: "OrderedDict[str, Optional[Template]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._literals: Optional[FrozenSet[str]] = None
+        self._placeholder = "_"
+        # Abstracted form of each whitespace separated chunk seen, bounded by maxsize
+        self._chunks: Dict[str, str] = {}
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def key(self, sql: str) -> str:
+        """Normalized form of *sql*, statements with the same key match the same template"""
+        if self.abstract_identifiers and self._literals is None:
+            # Loads every deferred template of the registry
+            self._literals = literal_words(self.registry)
+            while self._placeholder in self._literals:
+                self._placeholder += "_"
+
+        if '"' in sql or "'" in sql or identifiers.is_space(sql[:1]) or identifiers.is_space(sql[-1:]):
+            return _TOKEN.sub(self._abstract if self.abstract_identifiers else self._collapse, sql)
+
+        # Common case, splits on the same whitespace as the regexes
+        chunks = identifiers.split(sql)
+        if not self.abstract_identifiers:
+            return " ".join(chunks)
+        abstracted = self._chunks
+        return " ".join([abstracted.get(x) or self._abstract_chunk(x) for x in chunks])
+
+    def _abstract_chunk(self, chunk: str) -> str:
+        """Abstract the words of a run of non whitespace characters, remembering the result"""
+        result = _WORD_TOKEN.sub(self._abstract, chunk)
+        if len(self._chunks) >= self.maxsize:
+            self._chunks.clear()
+        self._chunks[chunk] = result
+        return result
+
+    def _collapse(self, match: "re.Match[str]") -> str:
+        if match.lastgroup == "space":
+            return " "
+        return match.group()
+
+    def _abstract(self, match: "re.Match[str]") -> str:
+        kind = match.lastgroup
+        if kind == "space":
+            return " "
+        text = match.group()
+        if kind == "word" and text not in self._literals and not identifiers.is_reserved(text):  # type: ignore
+            return self._placeholder
+        return text
+
+    def find(self, sql: str) -> Optional[Template]:
+        """The first template matching *sql*, matching only on a cache miss"""
+        key = self.key(sql)
+        with self._lock:
+            template = self._entries.get(key, _MISSING)
+            if template is not _MISSING:
+                self._hits += 1
+                self._entries.move_to_end(key)
+                return template  # type: ignore
+            self._misses += 1
+
+        template = self.registry.find(sql)
+
+        with self._lock:
+            self._entries[key] = template
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+        return template
+
+    def is_match(self, sql: str) -> bool:
+        return self.find(sql) is not None
+
+    def stats(self) -> CacheStats:
+        return CacheStats(self._hits, self._misses, self._evictions, len(self._entries), self.maxsize)
+
+    def clear(self) -> None:
+        """Drop every entry and reset the statistics"""
+        with self._lock:
+            self._entries.clear()
+            self._literals = None
+            self._placeholder = "_"
+            self._chunks.clear()
+            self._hits = self._misses = self._evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, sql: str) -> bool:
+        return self.key(sql) in self._entries
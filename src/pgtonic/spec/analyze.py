@@ -0,0 +1,125 @@
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, FrozenSet, Iterator, List, Set, Tuple
+
+from pgtonic.spec.parse.types import (
+    Argument,
+    Base,
+    Choice,
+    Group,
+    InParens,
+    Leaf,
+    Literal,
+    Maybe,
+    Nothing,
+    Repeat,
+    nullable,
+)
+
+if TYPE_CHECKING:
+    from pgtonic.spec.template import Template
+
+# Terminal standing for any identifier supplied by the user
+IDENT = "IDENT"
+
+NULLABLE_REPEAT = "NULLABLE_REPEAT"
+NESTED_REPEAT = "NESTED_REPEAT"
+OPTIONAL_OVERLAP = "OPTIONAL_OVERLAP"
+
+
+@dataclass(frozen=True)
+class Ambiguity:
+    """A repetition the regex engine can match in many ways, backtracking exponentially on near misses"""
+
+    code: str
+    message: str
+    template: "Template"
+    node: Base
+
+
+def first_set(node: Base, where: Dict[str, "Template"]) -> FrozenSet[str]:
+    """Terminals a match of *node* can start with: literals, IDENT or an opening paren"""
+    if isinstance(node, Literal):
+        return frozenset([node.content])
+    if isinstance(node, Nothing):
+        return frozenset()
+    if isinstance(node, (Maybe, Repeat)):
+        return first_set(node.wraps, where)
+    if isinstance(node, InParens):
+        return frozenset(["("])
+    if isinstance(node, Choice):
+        return frozenset().union(*(first_set(x, where) for x in node.members))
+    if isinstance(node, Group):
+        result: Set[str] = set()
+        for member in node.members:
+            result |= first_set(member, where)
+            if not nullable(member, where):
+                break
+        return frozenset(result)
+    if isinstance(node, Argument):
+        template = where[node.content]
+        return first_set(template.ast, template.where or {})
+    # Names
+    return frozenset([IDENT])
+
+
+def edges(node: Base, where: Dict[str, "Template"], last: bool) -> Iterator[Base]:
+    """Nodes that can begin, or end when *last*, a match of *node*"""
+    yield node
+    if isinstance(node, (Maybe, Repeat)):
+        yield from edges(node.wraps, where, last)
+    elif isinstance(node, Choice):
+        for member in node.members:
+            yield from edges(member, where, last)
+    elif isinstance(node, Group) and not isinstance(node, InParens) and node.members:
+        yield from edges(node.members[-1 if last else 0], where, last)
+    elif isinstance(node, Argument):
+        template = where[node.content]
+        yield from edges(template.ast, template.where or {}, last)
+
+
+def _walk(
+    node: Base, where: Dict[str, "Template"], in_repeat: bool
+) -> Iterator[Tuple[Base, Dict[str, "Template"], bool]]:
+    """Yield (node, where, in_repeat) for every node, descending into argument templates"""
+    yield node, where, in_repeat
+    if isinstance(node, Repeat):
+        yield from _walk(node.wraps, where, True)
+    elif isinstance(node, Maybe):
+        yield from _walk(node.wraps, where, in_repeat)
+    elif isinstance(node, Group):
+        for member in node.members:
+            yield from _walk(member, where, in_repeat)
+    elif isinstance(node, Argument):
+        template = where[node.content]
+        yield from _walk(template.ast, template.where or {}, in_repeat)
+    else:
+        assert isinstance(node, Leaf)
+
+
+def find_ambiguities(template: "Template") -> List[Ambiguity]:
+    """Find nested quantifiers that make the generated regex backtrack exponentially"""
+    found: List[Ambiguity] = []
+
+    for node, where, in_repeat in _walk(template.ast, template.where or {}, False):
+        if isinstance(node, Repeat):
+            if nullable(node.wraps, where):
+                found.append(Ambiguity(NULLABLE_REPEAT, "Repeated item can be empty", template, node))
+
+            for last in (False, True):
+                nested = [x for x in edges(node.wraps, where, last) if isinstance(x, node.__class__)]
+                if nested:
+                    message = "Repeated item {} with the same separator".format("ends" if last else "starts")
+                    found.append(Ambiguity(NESTED_REPEAT, message, template, node))
+                    break
+
+        elif in_repeat and isinstance(node, Group) and not isinstance(node, Choice):
+            # An optional member that shares a first terminal with its successor can
+            # be read either way, once per repeated item
+            for member, successor in zip(node.members, node.members[1:]):
+                if isinstance(member, (Maybe, Repeat)):
+                    overlap = first_set(member, where) & first_set(successor, where)
+                    if overlap:
+                        message = "Optional member overlaps its successor on {}".format(", ".join(sorted(overlap)))
+                        found.append(Ambiguity(OPTIONAL_OVERLAP, message, template, node))
+
+    return found
@@ -0,0 +1,373 @@
+from dataclasses import dataclass, field
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from pgtonic.spec.parse.types import (
+    Argument,
+    Base,
+    Choice,
+    Group,
+    InParens,
+    Literal,
+    Maybe,
+    Name,
+    Nothing,
+    QualifiedName,
+    Repeat,
+    RepeatComma,
+    RepeatOr,
+    UnqualifiedName,
+    non_empty,
+    nullable,
+)
+from pgtonic.sql.identifiers import is_reserved, is_space
+from pgtonic.sql.lex import Kind, tokenize
+
+if TYPE_CHECKING:
+    from pgtonic.spec.template import Template
+
+# Input symbols besides literal words and punctuation
+IDENT = "<IDENT>"
+QUOTED = "<QUOTED>"
+GAP = "<GAP>"
+
+# Version of the serialized format, see Dfa.to_dict
+FORMAT_VERSION = 1
+
+
+def symbols(sql: str) -> Optional[List[Tuple[Kind, str]]]:
+    """Tokens of *sql* with whitespace between tokens represented by GAP
+
+    Returns None when the statement has leading or trailing whitespace, which
+    no template matches. A single trailing newline is allowed, like the regex.
+    """
+    body = sql[:-1] if sql.endswith("\n") else sql
+    if is_space(sql[:1]) or is_space(body[-1:]):
+        return None
+
+    result: List[Tuple[Kind, str]] = []
+    previous_end = None
+    for token in tokenize(body):
+        if previous_end is not None and token.start > previous_end:
+            result.append((Kind.WHITESPACE, GAP))
+        result.append((token.kind, token.text))
+        previous_end = token.end
+    return result
+
+
+class Nfa:
+    """Thompson style NFA over SQL tokens built from template ASTs
+
+    Edge labels are literal words, punctuation, IDENT (any identifier) or GAP
+    (whitespace between tokens); None is an epsilon edge.
+    """
+
+    def __init__(self) -> None:
+        self.edges: List[List[Tuple[Optional[str], int]]] = []
+        # Literal words used as labels
+        self.words: Set[str] = set()
+        self.punctuation: Set[str] = set()
+        # Accepting NFA state to template index
+        self.accepts: Dict[int, int] = {}
+
+    def state(self) -> int:
+        self.edges.append([])
+        return len(self.edges) - 1
+
+    def edge(self, source: int, label: Optional[str], target: int) -> None:
+        self.edges[source].append((label, target))
+
+    def add_template(self, template: "Template", index: int, start: int) -> None:
+        end = self.state()
+        self.build(template.ast, template.where or {}, start, end)
+        self.accepts[end] = index
+
+    def gap(self, source: int, target: int, optional: bool) -> None:
+        self.edge(source, GAP, target)
+        if optional:
+            self.edge(source, None, target)
+
+    def build(self, node: Base, where: Dict[str, "Template"], start: int, end: int) -> None:
+        """Add paths from *start* to *end* accepting the symbols matched by *node*"""
+        if isinstance(node, Literal):
+            if node.content[:1].isalpha() or node.content[:1] == "_":
+                self.words.add(node.content)
+            else:
+                self.punctuation.add(node.content)
+            self.edge(start, node.content, end)
+
+        elif isinstance(node, UnqualifiedName):
+            self.edge(start, IDENT, end)
+
+        elif isinstance(node, QualifiedName):
+            self._qualified(start, end)
+
+        elif isinstance(node, Name):
+            self.edge(start, IDENT, end)
+            self._qualified(start, end)
+
+        elif isinstance(node, Nothing):
+            self.edge(start, None, end)
+
+        elif isinstance(node, Argument):
+            template = where[node.content]
+            self.build(template.ast, template.where or {}, start, end)
+
+        elif isinstance(node, Maybe):
+            self.edge(start, None, end)
+            self.build(node.wraps, where, start, end)
+
+        elif isinstance(node, Repeat):
+            item_start, item_end = self.state(), self.state()
+            self.edge(start, None, item_start)
+            self.build(node.wraps, where, item_start, item_end)
+            self.edge(item_end, None, end)
+            self._separator(node, item_end, item_start)
+
+        elif isinstance(node, InParens):
+            self.punctuation.update("()")
+            inner_start, inner_end = self.state(), self.state()
+            after_open, before_close = self.state(), self.state()
+            self.edge(start, "(", after_open)
+            self.gap(after_open, inner_start, optional=True)
+            self._sequence(node.members, where, inner_start, inner_end, always_gap=True)
+            self.gap(inner_end, before_close, optional=True)
+            self.edge(before_close, ")", end)
+
+        elif isinstance(node, Choice):
+            for member in node.members:
+                self.build(member, where, start, end)
+
+        elif isinstance(node, Group):
+            self._sequence(node.members, where, start, end, always_gap=False)
+
+        else:
+            raise NotImplementedError(node.__class__.__name__)
+
+    def _qualified(self, start: int, end: int) -> None:
+        self.punctuation.add(".")
+        schema, dot = self.state(), self.state()
+        self.edge(start, IDENT, schema)
+        self.edge(schema, ".", dot)
+        self.edge(dot, IDENT, end)
+
+    def _sequence(
+        self, members: Sequence[Base], where: Dict[str, "Template"], start: int, end: int, always_gap: bool
+    ) -> None:
+        # Whitespace separates members only once something has matched, so
+        # track the states reached with nothing matched and with something matched
+        empty: Optional[int] = start
+        some: Optional[int] = None
+        for member in members:
+            # Like join_members, a member matching the empty string is optional
+            optional = nullable(member, where)
+            node = non_empty(member, where) if optional else member
+            if node is None:
+                continue
+            member_start, member_end = self.state(), self.state()
+            self.build(node, where, member_start, member_end)
+            if empty is not None:
+                self.edge(empty, None, member_start)
+            if some is not None:
+                self.gap(some, member_start, optional=not always_gap and isinstance(node, InParens))
+
+            following = self.state()
+            self.edge(member_end, None, following)
+            if optional:
+                if some is not None:
+                    self.edge(some, None, following)
+            else:
+                empty = None
+            some = following
+
+        for state in (empty, some):
+            if state is not None:
+                self.edge(state, None, end)
+
+    def _separator(self, node: Repeat, source: int, target: int) -> None:
+        if isinstance(node, RepeatComma):
+            self.punctuation.add(",")
+            before, after = self.state(), self.state()
+            self.gap(source, before, optional=True)
+            self.edge(before, ",", after)
+            self.gap(after, target, optional=True)
+        elif isinstance(node, RepeatOr):
+            self.words.add("OR")
+            before, after = self.state(), self.state()
+            self.gap(source, before, optional=False)
+            self.edge(before, "OR", after)
+            self.gap(after, target, optional=False)
+        else:
+            self.gap(source, target, optional=False)
+
+    def closure(self, states: Iterable[int]) -> FrozenSet[int]:
+        stack = list(states)
+        seen = set(stack)
+        while stack:
+            for label, target in self.edges[stack.pop()]:
+                if label is None and target not in seen:
+                    seen.add(target)
+                    stack.append(target)
+        return frozenset(seen)
+
+
+@dataclass
+class Dfa:
+    """Deterministic automaton over SQL tokens accepting statements of one or more templates"""
+
+    # Input classes, indexed by transitions
+    classes: List[str]
+    start: int
+    # Per state, input class index to next state
+    transitions: List[Dict[int, int]]
+    # Per state, indexes of the templates accepted there
+    accepts: List[Tuple[int, ...]]
+    _class_index: Dict[str, int] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._class_index = {x: ix for ix, x in enumerate(self.classes)}
+
+    def classify(self, kind: Kind, text: str) -> Optional[int]:
+        index = self._class_index
+        if kind == Kind.WORD:
+            cls = index.get(text)
+            if cls is None and not is_reserved(text):
+                return index.get(IDENT)
+            return cls
+        if kind == Kind.QUOTED:
+            return index.get(QUOTED)
+        return index.get(text)
+
+    def match(self, sql: str) -> Tuple[int, ...]:
+        """Indexes of the templates matching *sql*, in one pass over its tokens"""
+        tokens = symbols(sql)
+        if tokens is None:
+            return ()
+        state = self.start
+        transitions = self.transitions
+        for kind, text in tokens:
+            cls = self.classify(kind, text)
+            if cls is None:
+                return ()
+            following = transitions[state].get(cls)
+            if following is None:
+                return ()
+            state = following
+        return self.accepts[state]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON serializable form, see from_dict"""
+        return {
+            "version": FORMAT_VERSION,
+            "classes": self.classes,
+            "start": self.start,
+            "transitions": [sorted(x.items()) for x in self.transitions],
+            "accepts": [list(x) for x in self.accepts],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Dfa":
+        if data["version"] != FORMAT_VERSION:
+            raise ValueError("Unsupported automaton format version {}".format(data["version"]))
+        return cls(
+            classes=data["classes"],
+            start=data["start"],
+            transitions=[{int(k): int(v) for k, v in x} for x in data["transitions"]],
+            accepts=[tuple(x) for x in data["accepts"]],
+        )
+
+
+def _matches(label: str, cls: str, words: Set[str]) -> bool:
+    """Can an edge labelled *label* consume a token of input class *cls*"""
+    if label == cls:
+        return True
+    return label == IDENT and (cls in (IDENT, QUOTED) or (cls in words and not is_reserved(cls)))
+
+
+def build_nfa(templates: Sequence["Template"]) -> Tuple[Nfa, int]:
+    nfa = Nfa()
+    start = nfa.state()
+    for index, template in enumerate(templates):
+        template_start = nfa.state()
+        nfa.edge(start, None, template_start)
+        nfa.add_template(template, index, template_start)
+    return nfa, start
+
+
+def build_dfa(templates: Sequence["Template"]) -> Dfa:
+    """Subset construct and minimize a single DFA matching every template in *templates*"""
+    nfa, nfa_start = build_nfa(templates)
+    classes = sorted(nfa.words) + sorted(nfa.punctuation) + [IDENT, QUOTED, GAP]
+
+    # Labelled edges of each NFA state grouped by the input classes they consume
+    moves: List[Dict[int, List[int]]] = []
+    for edges in nfa.edges:
+        by_class: Dict[int, List[int]] = {}
+        for label, target in edges:
+            if label is None:
+                continue
+            for ix, name in enumerate(classes):
+                if _matches(label, name, nfa.words):
+                    by_class.setdefault(ix, []).append(target)
+        moves.append(by_class)
+
+    start = nfa.closure([nfa_start])
+    subsets: Dict[FrozenSet[int], int] = {start: 0}
+    pending = [start]
+    transitions: List[Dict[int, int]] = [{}]
+    while pending:
+        subset = pending.pop()
+        source = subsets[subset]
+        targets: Dict[int, Set[int]] = {}
+        for state in subset:
+            for cls, nexts in moves[state].items():
+                targets.setdefault(cls, set()).update(nexts)
+        for cls, reached in targets.items():
+            closed = nfa.closure(reached)
+            if closed not in subsets:
+                subsets[closed] = len(transitions)
+                transitions.append({})
+                pending.append(closed)
+            transitions[source][cls] = subsets[closed]
+
+    accepts = [tuple(sorted({nfa.accepts[x] for x in subset if x in nfa.accepts})) for subset in subsets]
+    return minimize(Dfa(classes, 0, transitions, accepts))
+
+
+def minimize(dfa: Dfa) -> Dfa:
+    """Merge equivalent states by partition refinement"""
+    # States start out grouped by what they accept
+    block_of = _renumber(dfa.accepts)
+    while True:
+        signatures = [
+            (block_of[state], tuple(sorted((cls, block_of[t]) for cls, t in dfa.transitions[state].items())))
+            for state in range(len(dfa.transitions))
+        ]
+        refined = _renumber(signatures)
+        if max(refined) == max(block_of):
+            break
+        block_of = refined
+
+    n_blocks = max(block_of) + 1
+    transitions: List[Dict[int, int]] = [{} for _ in range(n_blocks)]
+    accepts: List[Tuple[int, ...]] = [() for _ in range(n_blocks)]
+    for state, block in enumerate(block_of):
+        transitions[block] = {cls: block_of[t] for cls, t in dfa.transitions[state].items()}
+        accepts[block] = dfa.accepts[state]
+    return Dfa(dfa.classes, block_of[dfa.start], transitions, accepts)
+
+
+def _renumber(keys: Sequence[Any]) -> List[int]:
+    """Number distinct keys in order of first appearance"""
+    numbers: Dict[Any, int] = {}
+    return [numbers.setdefault(key, len(numbers)) for key in keys]
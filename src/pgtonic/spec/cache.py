@@ -0,0 +1,65 @@
+"""Opt-in on-disk cache of compiled template artifacts
+
+Set PGTONIC_CACHE_DIR to a writable directory to enable it. Entries are keyed
+on a template's fingerprint, which covers its spec text, its where templates
+and the pgtonic version, so changing a template never reads a stale entry.
+Entries are kept per regex generator, see regex.GENERATOR, so Python versions
+generating different regexes, or edited generator sources, do not share them.
+"""
+
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Optional
+
+from pgtonic import __version__
+from pgtonic.spec import regex as r
+
+CACHE_DIR_ENV = "PGTONIC_CACHE_DIR"
+
+# Bump when the layout of cached values, or how the regexes and automata in them match, changes
+FORMAT_VERSION = 4
+
+
+def cache_dir() -> Optional[Path]:
+    """Directory holding cache entries, None when caching is disabled"""
+    path = os.environ.get(CACHE_DIR_ENV)
+    if not path:
+        return None
+    return Path(path) / "{}-{}-{}".format(__version__, FORMAT_VERSION, r.GENERATOR)
+
+
+def _path(namespace: str, key: str) -> Optional[Path]:
+    directory = cache_dir()
+    if directory is None:
+        return None
+    return directory / namespace / "{}.json".format(key)
+
+
+def load(namespace: str, key: str) -> Optional[Any]:
+    """Return the cached value for *key*, None on a miss or an unreadable entry"""
+    path = _path(namespace, key)
+    if path is None:
+        return None
+    try:
+        with path.open() as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def store(namespace: str, key: str, value: Any) -> None:
+    """Write *value* for *key*, silently skipping when the cache is not writable"""
+    path = _path(namespace, key)
+    if path is None:
+        return
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so concurrent readers never see a partial entry
+        fd, tmp = tempfile.mkstemp(dir=str(path.parent), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp, str(path))
+    except OSError:
+        pass
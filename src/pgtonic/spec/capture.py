@@ -0,0 +1,93 @@
+import re
+from dataclasses import dataclass
+from itertools import count
+from typing import TYPE_CHECKING, Dict, Iterator, List, Match, Optional, Pattern, Tuple
+
+from pgtonic.sql import identifiers
+
+if TYPE_CHECKING:
+    from pgtonic.spec.template import Template
+
+
+@dataclass(frozen=True)
+class RepeatCapture:
+    """A repeated node containing arguments
+
+    Python's re only keeps the last value of a repeated group, so the span of
+    the whole repetition is captured and its items are recovered afterwards
+    """
+
+    group: str
+    item: "Captures"
+    item_pattern: Pattern[str]
+    separator_pattern: Pattern[str]
+
+    def extract(self, m: Match[str], values: List[Tuple[int, str, str]]) -> None:
+        pos, end = m.span(self.group)
+        while True:
+            item = self.item_pattern.match(m.string, pos, end)
+            if item is None:
+                return
+            self.item.extract(item, values)
+            separator = self.separator_pattern.match(m.string, item.end(), end)
+            if separator is None or item.end() == pos:
+                return
+            pos = separator.end()
+
+
+class Captures:
+    """Named groups emitted while generating a capturing regex"""
+
+    def __init__(self, names: Optional[Iterator[int]] = None) -> None:
+        # Shared with nested Captures so group names are unique within a pattern
+        self._names = names if names is not None else count()
+        # Group name and the argument it captures
+        self.arguments: List[Tuple[str, str]] = []
+        self.repeats: List[RepeatCapture] = []
+
+    def scope(self) -> "Captures":
+        """Captures for a separately compiled pattern, sharing group names with this one"""
+        return Captures(self._names)
+
+    def argument(self, name: str) -> str:
+        """Register a group capturing argument *name* and return the group name"""
+        group = "a{}".format(next(self._names))
+        self.arguments.append((group, name))
+        return group
+
+    def repeat(self, item: "Captures", item_regex: str, separator_regex: str) -> str:
+        """Register a group capturing a repetition of *item_regex* and return the group name"""
+        group = "r{}".format(next(self._names))
+        self.repeats.append(RepeatCapture(group, item, re.compile(item_regex), re.compile(separator_regex)))
+        return group
+
+    def extract(self, m: Match[str], values: List[Tuple[int, str, str]]) -> None:
+        """Append the (position, argument, value) of each group that participated in *m*"""
+        for group, name in self.arguments:
+            value = m.group(group)
+            if value is not None:
+                values.append((m.start(group), name, value))
+
+        for repeat in self.repeats:
+            if m.group(repeat.group) is not None:
+                repeat.extract(m, values)
+
+    def to_dict(self, m: Match[str]) -> Dict[str, List[str]]:
+        """Captured values of each argument in *m*, in the order they appear"""
+        values: List[Tuple[int, str, str]] = []
+        self.extract(m, values)
+        result: Dict[str, List[str]] = {}
+        for _, name, value in sorted(values, key=lambda x: x[0]):
+            result.setdefault(name, []).append(identifiers.unmark(value))
+        return result
+
+
+@dataclass(frozen=True)
+class TemplateMatch:
+    template: "Template"
+    sql: str
+    # Argument name to the values it captured, repeated arguments capture several
+    groups: Dict[str, List[str]]
+
+    def __getitem__(self, name: str) -> List[str]:
+        return self.groups.get(name, [])
@@ -0,0 +1,434 @@
+"""Binary template catalog that can be memory mapped and shared between processes
+
+A catalog holds templates with their parsed ASTs, the regexes and prefilter
+compile would build for them, and optionally the automaton over all of them,
+so loading it needs neither the spec parser nor lowering. Every section is an
+array of little endian 32 bit integers or UTF-8 bytes read in place from the
+mapped file. Templates and AST nodes are only decoded when first used, and
+the file's pages are shared by every process mapping it.
+
+Layout, each section 4 byte aligned:
+
+    header     magic, format version, pgtonic version string, regex
+               generator string and the offset and length of each section below
+    offsets    string table: start of each string in strings, plus the end
+    strings    string table: UTF-8 bytes of every distinct string
+    nodes      (kind, value, count) per AST node. value is a string for
+               leaves, otherwise the start of count child nodes in lists
+    templates  per template, see _TEMPLATE_FIELDS
+    lists      node children, where entries and string lists referenced above
+    roots      indexes of the templates passed to dump, in order
+    automaton  JSON of the Dfa over the root templates, possibly empty
+"""
+
+import json
+import mmap
+import struct
+import sys
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Type, Union
+
+from pgtonic import __version__
+from pgtonic.spec import regex as r
+from pgtonic.spec.automaton import Dfa, build_dfa
+from pgtonic.spec.parse.ast_passes import Lowering
+from pgtonic.spec.parse.types import (
+    Argument,
+    Base,
+    Choice,
+    Group,
+    InParens,
+    Leaf,
+    Literal,
+    Maybe,
+    Modifier,
+    Name,
+    Nothing,
+    Pipe,
+    QualifiedName,
+    RepeatComma,
+    RepeatNone,
+    RepeatOr,
+    UnqualifiedName,
+)
+from pgtonic.spec.prefilter import Prefilter
+from pgtonic.spec.registry import Registry
+from pgtonic.spec.template import Template
+
+MAGIC = b"PGTONIC\x00"
+
+# Bump when the layout, or how the stored regexes and automaton match, changes
+FORMAT_VERSION = 4
+
+# Node kinds by their code in the nodes section, append only
+KINDS: Tuple[Type[Base], ...] = (
+    Literal,
+    Argument,
+    Pipe,
+    Nothing,
+    UnqualifiedName,
+    QualifiedName,
+    Name,
+    Group,
+    Choice,
+    InParens,
+    RepeatComma,
+    RepeatOr,
+    RepeatNone,
+    Maybe,
+)
+_KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+SECTIONS = ("offsets", "strings", "nodes", "templates", "lists", "roots", "automaton")
+
+# Header: magic, format version, pgtonic version string, regex generator string, then offset and length per section
+_HEADER = struct.Struct("<8sIII" + "II" * len(SECTIONS))
+
+_NODE_FIELDS = 3
+
+# Per template, string indexes unless noted. Lists are (start, count) in the lists section
+_TEMPLATE_FIELDS = (
+    "original",
+    "corrected",
+    "fingerprint",
+    # Node index
+    "ast",
+    # Pairs of name string and template index
+    "where_start",
+    "where_count",
+    # Regexes for Lowering.OPTIONAL
+    "regexes_start",
+    "regexes_count",
+    "leading_start",
+    "leading_count",
+    "literals_start",
+    "literals_count",
+    # Plain integer
+    "min_length",
+)
+_FIELD = {name: ix for ix, name in enumerate(_TEMPLATE_FIELDS)}
+
+# Absent optional string, e.g. a template without a corrected spec
+NONE = 0xFFFFFFFF
+
+
+class _Writer:
+    def __init__(self) -> None:
+        self.strings: List[str] = []
+        self.string_index: Dict[str, int] = {}
+        self.nodes = array("I")
+        self.node_index: Dict[int, int] = {}
+        self.templates = array("I")
+        self.template_index: Dict[str, int] = {}
+        self.lists = array("I")
+
+    def string(self, value: Optional[str]) -> int:
+        if value is None:
+            return NONE
+        ix = self.string_index.get(value)
+        if ix is None:
+            ix = self.string_index[value] = len(self.strings)
+            self.strings.append(value)
+        return ix
+
+    def list(self, values: Sequence[int]) -> Tuple[int, int]:
+        start = len(self.lists)
+        self.lists.extend(values)
+        return start, len(values)
+
+    def node(self, node: Base) -> int:
+        # Nodes are hash-consed, shared subtrees are written once
+        ix = self.node_index.get(id(node))
+        if ix is not None:
+            return ix
+        if isinstance(node, Leaf):
+            value, count = self.string(node.content), 0
+        else:
+            value, count = self.list([self.node(x) for x in node.children()])
+        ix = self.node_index[id(node)] = len(self.nodes) // _NODE_FIELDS
+        self.nodes.extend([_KIND_CODES[type(node)], value, count])
+        return ix
+
+    def template(self, template: Template) -> int:
+        ix = self.template_index.get(template.fingerprint)
+        if ix is not None:
+            return ix
+        where = [(self.string(name), self.template(x)) for name, x in (template.where or {}).items()]
+        regexes, prefilter = template.artifacts(Lowering.OPTIONAL)
+        record = {
+            "original": self.string(template.original),
+            "corrected": self.string(template.corrected),
+            "fingerprint": self.string(template.fingerprint),
+            "ast": self.node(template.ast),
+        }
+        record["where_start"], _ = self.list([x for pair in where for x in pair])
+        record["where_count"] = len(where)
+        record["regexes_start"], record["regexes_count"] = self.list([self.string(x) for x in regexes])
+        record["leading_start"], record["leading_count"] = self.list([self.string(x) for x in prefilter.leading])
+        record["literals_start"], record["literals_count"] = self.list([self.string(x) for x in prefilter.literals])
+        record["min_length"] = prefilter.min_length
+        # Where templates are written first, so ix is taken after them
+        ix = self.template_index[template.fingerprint] = len(self.templates) // len(_TEMPLATE_FIELDS)
+        self.templates.extend(record[x] for x in _TEMPLATE_FIELDS)
+        return ix
+
+
+def _little_endian(values: "array[int]") -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _pad(data: bytes) -> bytes:
+    return data + b"\x00" * (-len(data) % 4)
+
+
+def dump(templates: Sequence[Template], automaton: bool = True) -> bytes:
+    """Serialize *templates*, with their where templates, to catalog bytes
+
+    With *automaton*, the Dfa over *templates* is built and included too
+    """
+    writer = _Writer()
+    version = writer.string(__version__)
+    generator = writer.string(r.GENERATOR)
+    roots = array("I", [writer.template(x) for x in templates])
+
+    offsets = array("I", [0])
+    encoded = []
+    for value in writer.strings:
+        encoded.append(value.encode("utf-8"))
+        offsets.append(offsets[-1] + len(encoded[-1]))
+
+    sections = [
+        _little_endian(offsets),
+        b"".join(encoded),
+        _little_endian(writer.nodes),
+        _little_endian(writer.templates),
+        _little_endian(writer.lists),
+        _little_endian(roots),
+        json.dumps(build_dfa(templates).to_dict()).encode() if automaton else b"",
+    ]
+
+    position = _HEADER.size
+    table: List[int] = []
+    for section in sections:
+        table.extend([position, len(section)])
+        position += len(_pad(section))
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, version, generator, *table)
+    return header + b"".join(_pad(x) for x in sections)
+
+
+def write(path: str, templates: Sequence[Template], automaton: bool = True) -> None:
+    with open(path, "wb") as f:
+        f.write(dump(templates, automaton))
+
+
+class CatalogTemplate(Template):
+    """Template decoded from a Catalog
+
+    Its AST is decoded from the catalog's node arrays rather than parsed, and
+    compile uses the catalog's regexes and prefilter for the default lowering
+    """
+
+    # Set by Catalog.template after construction
+    _catalog: "Catalog"
+    _index: int
+
+    @property
+    def ast(self) -> Base:
+        return self._catalog._node(self._catalog._field(self._index, "ast"))
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # Pickled, e.g. for a process pool, as a plain template without the catalog
+        return (Template, (self.original, self.corrected, self.where))
+
+    def artifacts(self, lowering: Lowering = Lowering.OPTIONAL) -> Tuple[List[str], Prefilter]:
+        if lowering != Lowering.OPTIONAL:
+            return super().artifacts(lowering)
+        return self._catalog._artifacts(self._index)
+
+    def __eq__(self, other: object) -> bool:
+        # Equal to the plain template it was built from, like the dataclass equality of Template
+        if not isinstance(other, Template):
+            return NotImplemented
+        return (self.original, self.corrected, self.where) == (other.original, other.corrected, other.where)
+
+    __hash__ = Template.__hash__
+
+
+class Catalog:
+    """Templates read in place from catalog bytes, see dump
+
+    Open a file with Catalog.open to map it rather than read it
+    """
+
+    def __init__(self, buffer: Union[bytes, mmap.mmap]) -> None:
+        if len(buffer) < _HEADER.size:
+            raise ValueError("Not a pgtonic catalog")
+        magic, format_version, version, generator, *table = _HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError("Not a pgtonic catalog")
+        if format_version != FORMAT_VERSION:
+            raise ValueError("Unsupported catalog format version {}".format(format_version))
+
+        self._buffer = buffer
+        self._closed = False
+        view = memoryview(buffer)
+        # Every view of the buffer, released by close
+        self._views = [view]
+        self._sections = {
+            name: view[table[2 * ix] : table[2 * ix] + table[2 * ix + 1]] for ix, name in enumerate(SECTIONS)
+        }
+        self._views.extend(self._sections.values())
+        self._offsets = self._integers("offsets")
+        self._nodes = self._integers("nodes")
+        self._records = self._integers("templates")
+        self._lists = self._integers("lists")
+        self._roots = self._integers("roots")
+
+        self._strings: Dict[int, str] = {}
+        self._decoded_nodes: Dict[int, Base] = {}
+        self._decoded_templates: Dict[int, CatalogTemplate] = {}
+
+        self.version = self._string(version)
+        if self.version != __version__:
+            # Regexes and fingerprints depend on the version that built them
+            raise ValueError("Catalog built by pgtonic {}, this is {}".format(self.version, __version__))
+        self.generator = self._string(generator)
+        if self.generator != r.GENERATOR:
+            # e.g. built with a Python version emitting different regexes, or a modified pgtonic
+            raise ValueError("Catalog regexes were generated by another regex generator, rebuild it")
+
+    @classmethod
+    def open(cls, path: str) -> "Catalog":
+        """Map the catalog file at *path* read only"""
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def _integers(self, section: str) -> Sequence[int]:
+        data = self._sections[section]
+        if sys.byteorder == "big":
+            values = array("I", data.tobytes())
+            values.byteswap()
+            return values
+        # Zero copy view of the mapped integers
+        integers = data.cast("I")
+        self._views.append(integers)
+        return integers
+
+    def _check_open(self) -> None:
+        # Raised instead of the error of a released view, e.g. decoding an AST after close
+        if self._closed:
+            raise ValueError("catalog is closed")
+
+    def _string(self, ix: int) -> str:
+        value = self._strings.get(ix)
+        if value is None:
+            self._check_open()
+            value = self._strings[ix] = str(
+                self._sections["strings"][self._offsets[ix] : self._offsets[ix + 1]], "utf-8"
+            )
+        return value
+
+    def _string_list(self, start: int, count: int) -> Tuple[str, ...]:
+        return tuple(self._string(x) for x in self._lists[start : start + count])
+
+    def _field(self, ix: int, name: str) -> int:
+        self._check_open()
+        return self._records[ix * len(_TEMPLATE_FIELDS) + _FIELD[name]]
+
+    def _node(self, ix: int) -> Base:
+        node = self._decoded_nodes.get(ix)
+        if node is None:
+            self._check_open()
+            code, value, count = self._nodes[ix * _NODE_FIELDS : (ix + 1) * _NODE_FIELDS]
+            kind = KINDS[code]
+            if issubclass(kind, Leaf):
+                node = kind(self._string(value))
+            else:
+                children = tuple(self._node(x) for x in self._lists[value : value + count])
+                node = kind(children[0]) if issubclass(kind, Modifier) else kind(children)  # type: ignore
+            self._decoded_nodes[ix] = node
+        return node
+
+    def _artifacts(self, ix: int) -> Tuple[List[str], Prefilter]:
+        field = lambda name: self._field(ix, name)  # noqa: E731
+        regexes = list(self._string_list(field("regexes_start"), field("regexes_count")))
+        prefilter = Prefilter(
+            self._string_list(field("leading_start"), field("leading_count")),
+            self._string_list(field("literals_start"), field("literals_count")),
+            field("min_length"),
+        )
+        return regexes, prefilter
+
+    def template(self, ix: int) -> CatalogTemplate:
+        """Template at index *ix* of the templates section, decoded on first access"""
+        template = self._decoded_templates.get(ix)
+        if template is None:
+            where_start, where_count = self._field(ix, "where_start"), self._field(ix, "where_count")
+            pairs = self._lists[where_start : where_start + 2 * where_count]
+            where: Dict[str, Template] = {
+                self._string(pairs[jx]): self.template(pairs[jx + 1]) for jx in range(0, len(pairs), 2)
+            }
+            corrected = self._field(ix, "corrected")
+            template = CatalogTemplate(
+                self._string(self._field(ix, "original")),
+                self._string(corrected) if corrected != NONE else None,
+                where or None,
+            )
+            object.__setattr__(template, "_catalog", self)
+            object.__setattr__(template, "_index", ix)
+            object.__setattr__(template, "_fingerprint", self._string(self._field(ix, "fingerprint")))
+            self._decoded_templates[ix] = template
+        return template
+
+    @property
+    def templates(self) -> List[CatalogTemplate]:
+        """The templates the catalog was built from, in order"""
+        self._check_open()
+        return [self.template(x) for x in self._roots]
+
+    def by_fingerprint(self) -> Dict[str, int]:
+        """Index of every template in the templates section by fingerprint"""
+        self._check_open()
+        count = len(self._records) // len(_TEMPLATE_FIELDS)
+        return {self._string(self._field(ix, "fingerprint")): ix for ix in range(count)}
+
+    def automaton(self) -> Optional[Dfa]:
+        self._check_open()
+        data = self._sections["automaton"]
+        if not len(data):
+            return None
+        return Dfa.from_dict(json.loads(str(data, "utf-8")))
+
+    def registry(self, depth: int = 4) -> Registry:
+        """Registry of the catalog's templates using its prebuilt automaton"""
+        return Registry(self.templates, depth, automaton=self.automaton())
+
+    def close(self) -> None:
+        """Release the catalog's views of its buffer, and unmap it when mapped
+
+        Templates already decoded remain usable once compiled, decoding
+        anything else raises ValueError
+        """
+        if self._closed:
+            return
+        self._closed = True
+        for view in reversed(self._views):
+            view.release()
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+    def __enter__(self) -> "Catalog":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[CatalogTemplate]:
+        return iter(self.templates)
+
+    def __len__(self) -> int:
+        self._check_open()
+        return len(self._roots)
@@ -0,0 +1,292 @@
+from dataclasses import dataclass
+from enum import Enum
+from typing import TYPE_CHECKING, Dict, FrozenSet, Optional, Sequence, Set, Tuple
+
+from pgtonic.spec.analyze import IDENT, first_set
+from pgtonic.spec.parse.types import (
+    Argument,
+    Base,
+    Choice,
+    Group,
+    InParens,
+    Literal,
+    Maybe,
+    Name,
+    Nothing,
+    QualifiedName,
+    Repeat,
+    RepeatComma,
+    RepeatOr,
+    UnqualifiedName,
+    non_empty,
+    nullable,
+)
+from pgtonic.sql import identifiers
+from pgtonic.sql.lex import Kind, SqlToken, has_gap, is_identifier, tokenize
+
+if TYPE_CHECKING:
+    from pgtonic.spec.template import Template
+
+
+class Engine(str, Enum):
+    """How a statement is matched against a template"""
+
+    # Generated regular expressions, see Template.compile
+    REGEX = "REGEX"
+    # Walk the AST over the statement's tokens, see TokenMatcher
+    TOKENS = "TOKENS"
+
+    def __str__(self) -> str:
+        return str.__str__(self)
+
+    def __repr__(self) -> str:
+        return str.__str__(self)
+
+
+Where = Dict[str, "Template"]
+
+# Terminals reported by Explanation.expected besides literals and punctuation
+IDENTIFIER = "identifier"
+QUALIFIED_IDENTIFIER = "qualified identifier"
+WHITESPACE = "whitespace"
+END_OF_STATEMENT = "end of statement"
+
+
+@dataclass(frozen=True)
+class Explanation:
+    """Why a statement does or does not match a template"""
+
+    # None when no template of a registry starts with the statement's first word
+    template: Optional["Template"]
+    sql: str
+    is_match: bool
+    # Offset in sql of the furthest point the match reached
+    position: int
+    # Terminals that would have let the match continue there
+    expected: Tuple[str, ...]
+    # Token found there, None at the end of the statement
+    found: Optional[str]
+
+    def __str__(self) -> str:
+        if self.is_match:
+            return "Matches"
+        line = self.sql.count("\n", 0, self.position) + 1
+        column = self.position - (self.sql.rfind("\n", 0, self.position) + 1) + 1
+        found = "end of statement" if self.found is None else repr(self.found)
+        return "Expected {} at line {}, column {}, found {}".format(" or ".join(self.expected), line, column, found)
+
+
+class TokenMatcher:
+    """Match a tokenized statement against template ASTs
+
+    Every node is evaluated at most once per token position: ends() returns
+    the set of positions a node can finish at and is memoized (packrat
+    style). Maybe nodes are matched directly, so no expansion is needed and
+    the cost is independent of the number of optional clauses.
+
+    Whitespace is checked where the generated regex requires it, between
+    sequence members and around OR separators, and forbidden around the dot
+    of a qualified name.
+    """
+
+    def __init__(self, sql: str) -> None:
+        self.sql = sql
+        self.tokens = tokenize(sql)
+        self._memo: Dict[Tuple[int, int, int], FrozenSet[int]] = {}
+        # Furthest token position a terminal failed to match at, and the terminals tried there
+        self.furthest = 0
+        self.expected: Set[str] = set()
+
+    def _anchored(self) -> bool:
+        sql = self.sql
+        # Same anchoring as the regex, which allows only a single trailing newline
+        body = sql[:-1] if sql.endswith("\n") else sql
+        return not identifiers.is_space(sql[:1]) and not identifiers.is_space(body[-1:])
+
+    def is_match(self, template: "Template") -> bool:
+        if not self._anchored():
+            return False
+        return len(self.tokens) in self.ends(template.ast, template.where or {}, 0)
+
+    def explain(self, template: "Template") -> Explanation:
+        """Like is_match, also reporting the furthest position reached and what was expected there"""
+        n_tokens = len(self.tokens)
+        ends = self.ends(template.ast, template.where or {}, 0)
+        for end in ends:
+            if end < n_tokens:
+                self._expect(end, END_OF_STATEMENT)
+
+        if n_tokens in ends:
+            if self._anchored():
+                return Explanation(template, self.sql, True, len(self.sql), (), None)
+            # Only surrounding whitespace is in the way
+            if identifiers.is_space(self.sql[:1]):
+                leading = self.sql[: len(self.sql) - len(self.sql.lstrip(identifiers.SPACE_CHARS))]
+                first = first_set(template.ast, template.where or {})
+                expected = tuple(sorted(IDENTIFIER if x == IDENT else x for x in first))
+                return Explanation(template, self.sql, False, 0, expected, leading)
+            position = len(self.sql.rstrip(identifiers.SPACE_CHARS))
+            return Explanation(template, self.sql, False, position, (END_OF_STATEMENT,), self.sql[position:])
+
+        token = self._token(self.furthest)
+        position = token.start if token is not _END else len(self.sql)
+        found = token.text if token is not _END else None
+        return Explanation(template, self.sql, False, position, tuple(sorted(self.expected)), found)
+
+    def _expect(self, pos: int, terminal: str) -> None:
+        if pos > self.furthest:
+            self.furthest = pos
+            self.expected = {terminal}
+        elif pos == self.furthest:
+            self.expected.add(terminal)
+
+    def ends(self, node: Base, where: Where, pos: int) -> FrozenSet[int]:
+        """Positions at which a match of *node* starting at token *pos* can end"""
+        key = (id(node), id(where), pos)
+        result = self._memo.get(key)
+        if result is None:
+            result = frozenset(self._ends(node, where, pos))
+            self._memo[key] = result
+        return result
+
+    def _token(self, pos: int) -> SqlToken:
+        return self.tokens[pos] if pos < len(self.tokens) else _END
+
+    def _ends(self, node: Base, where: Where, pos: int) -> Set[int]:
+        token = self._token(pos)
+
+        if isinstance(node, Literal):
+            kind = Kind.WORD if node.content[:1].isalpha() or node.content[:1] == "_" else Kind.PUNCTUATION
+            if token.kind == kind and token.text == node.content:
+                return {pos + 1}
+            self._expect(pos, node.content)
+            return set()
+
+        if isinstance(node, UnqualifiedName):
+            return self._identifier(pos)
+
+        if isinstance(node, QualifiedName):
+            return self._qualified(pos)
+
+        if isinstance(node, Name):
+            return self._qualified(pos) | self._identifier(pos)
+
+        if isinstance(node, Nothing):
+            return {pos}
+
+        if isinstance(node, Argument):
+            template = where[node.content]
+            return set(self.ends(template.ast, template.where or {}, pos))
+
+        if isinstance(node, Maybe):
+            return {pos} | self.ends(node.wraps, where, pos)
+
+        if isinstance(node, Repeat):
+            return self._repeat(node, where, pos)
+
+        if isinstance(node, InParens):
+            if token.text != "(":
+                self._expect(pos, "(")
+                return set()
+            result = set()
+            for end in self._sequence(node.members, where, pos + 1, always_gap=True):
+                if self._token(end).text == ")":
+                    result.add(end + 1)
+                else:
+                    self._expect(end, ")")
+            return result
+
+        if isinstance(node, Choice):
+            return {end for member in node.members for end in self.ends(member, where, pos)}
+
+        if isinstance(node, Group):
+            return self._sequence(node.members, where, pos, always_gap=False)
+
+        raise NotImplementedError(node.__class__.__name__)
+
+    def _identifier(self, pos: int) -> Set[int]:
+        if is_identifier(self._token(pos)):
+            return {pos + 1}
+        self._expect(pos, IDENTIFIER)
+        return set()
+
+    def _qualified(self, pos: int) -> Set[int]:
+        tokens = self.tokens
+        if not is_identifier(self._token(pos)):
+            self._expect(pos, QUALIFIED_IDENTIFIER)
+        elif self._token(pos + 1).text != "." or has_gap(tokens, pos + 1):
+            self._expect(pos + 1, ".")
+        elif not is_identifier(self._token(pos + 2)) or has_gap(tokens, pos + 2):
+            self._expect(pos + 2, IDENTIFIER)
+        else:
+            return {pos + 3}
+        return set()
+
+    def _sequence(self, members: Sequence[Base], where: Where, pos: int, always_gap: bool) -> Set[int]:
+        current = {pos}
+        for member in members:
+            # Matches the separators emitted by join_members, where a member
+            # matching the empty string is optional
+            optional = nullable(member, where)
+            node = non_empty(member, where) if optional else member
+            if node is None:
+                continue
+            needs_gap = always_gap or not isinstance(node, InParens)
+            following: Set[int] = set()
+            for start in current:
+                if optional:
+                    following.add(start)
+                if start > pos and needs_gap and not has_gap(self.tokens, start):
+                    if start == len(self.tokens):
+                        # Report what the member expected rather than the missing whitespace
+                        self.ends(node, where, start)
+                    else:
+                        self._expect(start, WHITESPACE)
+                    continue
+                following |= self.ends(node, where, start)
+            current = following
+        return current
+
+    def _repeat(self, node: Repeat, where: Where, pos: int) -> Set[int]:
+        result = set(self.ends(node.wraps, where, pos))
+        frontier = set(result)
+        while frontier:
+            following: Set[int] = set()
+            for end in frontier:
+                for start in self._separator(node, end):
+                    following |= self.ends(node.wraps, where, start) - result
+            result |= following
+            frontier = following
+        return result
+
+    def _separator(self, node: Repeat, pos: int) -> Set[int]:
+        """Positions following a separator starting at *pos*"""
+        tokens = self.tokens
+        if isinstance(node, RepeatComma):
+            if self._token(pos).text == ",":
+                return {pos + 1}
+            self._expect(pos, ",")
+            return set()
+        if isinstance(node, RepeatOr):
+            token = self._token(pos)
+            if token.kind == Kind.WORD and token.text == "OR" and has_gap(tokens, pos) and has_gap(tokens, pos + 1):
+                return {pos + 1}
+            self._expect(pos, "OR")
+            return set()
+        # Whitespace separated
+        if has_gap(tokens, pos):
+            return {pos}
+        self._expect(pos, WHITESPACE)
+        return set()
+
+
+# Stands in for the token past the end of the statement
+_END = SqlToken(Kind.WHITESPACE, "", -1, -1)
+
+
+def is_match(template: "Template", sql: str) -> bool:
+    return TokenMatcher(sql).is_match(template)
+
+
+def explain(template: "Template", sql: str) -> Explanation:
+    return TokenMatcher(sql).explain(template)
@@ -1,17 +1,25 @@
-from typing import List
+import re
+from typing import Dict, List
 
+from pgtonic import instrument
 from pgtonic.exceptions import LexFailureException
 from pgtonic.spec.lex.types import Part, Token
-from pgtonic.spec.lex.utils import build_consumer
 
-TOKEN_MAP = {
+
+def repeated(options: List[str]) -> str:
+    """Regex consuming one or more of *options*, back to back"""
+    return "(?:" + "|".join(re.escape(x) for x in options) + ")+"
+
+
+# Tokens are tried in order, the first to match wins
+TOKEN_MAP: Dict[Token, str] = {
     # Intermediate tokens
-    Token.UNQUALIFIED_NAME: build_consumer(["UNQUALIFIED_NAME"]),
-    Token.QUALIFIED_NAME: build_consumer(["QUALIFIED_NAME"]),
-    Token.NAME: build_consumer(["NAME"]),
-    Token.PIPE: build_consumer(["|"]),
+    Token.UNQUALIFIED_NAME: repeated(["UNQUALIFIED_NAME"]),
+    Token.QUALIFIED_NAME: repeated(["QUALIFIED_NAME"]),
+    Token.NAME: repeated(["NAME"]),
+    Token.PIPE: repeated(["|"]),
     # Final tokens
-    Token.DELIMITED_COMMA: build_consumer(
+    Token.DELIMITED_COMMA: repeated(
         [
             "[ , ... ]",
             "[, ... ]",
@@ -19,40 +27,43 @@ TOKEN_MAP = {
             "[ , ...]",
             "[,... ]",
             "[, ...]",
-            "[,... ]",
             "[,...]",
         ]
     ),
-    Token.DELIMITED_OR: build_consumer(["[ OR ... ]"]),
-    Token.DELIMITED_NONE: build_consumer(["[ ... ]"]),
-    Token.WHITESPACE: build_consumer([" ", "\n", "\t"]),
-    Token.LITERAL: build_consumer(list("_ABCDEFGHIJKLMNOPQRSTUVWXYZ")),
-    Token.STAR: build_consumer(list("*")),
-    Token.ARG: build_consumer(list("_abcdefghijklmnopqrstuvwxyz")),
-    Token.L_PAREN: build_consumer(["("]),
-    Token.R_PAREN: build_consumer([")"]),
-    Token.L_BRACKET: build_consumer(["["]),
-    Token.R_BRACKET: build_consumer(["]"]),
-    Token.L_BRACE: build_consumer(["{"]),
-    Token.R_BRACE: build_consumer(["}"]),
-    Token.COMMA: build_consumer([","]),
+    Token.DELIMITED_OR: repeated(["[ OR ... ]"]),
+    Token.DELIMITED_NONE: repeated(["[ ... ]"]),
+    Token.WHITESPACE: "[ \n\t]+",
+    Token.LITERAL: "[_A-Z]+",
+    Token.STAR: repeated(["*"]),
+    Token.ARG: "[_a-z]+",
+    Token.L_PAREN: repeated(["("]),
+    Token.R_PAREN: repeated([")"]),
+    Token.L_BRACKET: repeated(["["]),
+    Token.R_BRACKET: repeated(["]"]),
+    Token.L_BRACE: repeated(["{"]),
+    Token.R_BRACE: repeated(["}"]),
+    Token.COMMA: repeated([","]),
 }
 
+# Single scanner over all tokens, the matching group's name is the token
+SCANNER = re.compile("|".join(f"(?P<{token.value}>{pattern})" for token, pattern in TOKEN_MAP.items()))
 
+_TOKENS = {token.value: token for token in TOKEN_MAP}
+
+
+@instrument.timed(instrument.LEX)
 def lex(text: str) -> List[Part]:
-    """Parse input text according to the mapping of token to callable"""
+    """Split input text into tokens according to TOKEN_MAP"""
     token_stream: List[Part] = []
-    remaining_text = text
-
-    while remaining_text != "":
-        for token, consumer in TOKEN_MAP.items():
-            parsed, remaining = consumer(remaining_text)
-            if parsed != "":
-                remaining_text = remaining
-                instance = Part(token, parsed.strip())
-                token_stream.append(instance)
-                break
-        else:
-            raise LexFailureException("Could not match {}".format(remaining_text))
+    match = SCANNER.match
+    pos = 0
+    end = len(text)
+
+    while pos < end:
+        m = match(text, pos)
+        if m is None:
+            raise LexFailureException.at("Could not match {}".format(text[pos:]), text, pos)
+        token_stream.append(Part(_TOKENS[m.lastgroup], m.group().strip(), pos, m.end()))  # type: ignore
+        pos = m.end()
 
     return token_stream
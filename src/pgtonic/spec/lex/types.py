@@ -1,5 +1,5 @@
-from dataclasses import dataclass
 from enum import Enum
+from typing import NamedTuple
 
 
 class Token(str, Enum):
@@ -32,7 +32,9 @@ class Token(str, Enum):
         return str.__str__(self)
 
 
-@dataclass
-class Part:
+class Part(NamedTuple):
     token: Token
     text: str
+    # Offsets of the token in the spec
+    start: int = 0
+    end: int = 0
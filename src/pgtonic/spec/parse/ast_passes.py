@@ -1,25 +1,69 @@
-from typing import List
+from enum import Enum
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
 
 from pgtonic.spec.parse.types import *
 
+if TYPE_CHECKING:
+    from pgtonic.spec.template import Template
 
-def maybe_to_choice(node: Base):
+
+class Lowering(str, Enum):
+    """Strategy for removing Maybe nodes before regex generation"""
+
+    # Maybe nodes become optional regex groups, size is linear in the number of Maybes
+    OPTIONAL = "OPTIONAL"
+    # Every Group is expanded into a Choice of 2^n variants, one per subset of its Maybes
+    EXPAND = "EXPAND"
+    # EXPAND, then variants sharing leading or trailing members are merged into a trie
+    FACTORED = "FACTORED"
+
+    def __str__(self) -> str:
+        return str.__str__(self)
+
+    def __repr__(self) -> str:
+        return str.__str__(self)
+
+
+# Results memoized per pass. Bounded, as the memo keeps nodes alive that the
+# intern table of Base would otherwise drop once no template uses them
+PASS_CACHE_SIZE = 4096
+
+
+def lower(node: Base, lowering: Lowering = Lowering.OPTIONAL, where: Optional[Dict[str, "Template"]] = None) -> Base:
+    """Prepare an AST for regex generation, *where* holding the templates of its arguments"""
+    if lowering == Lowering.EXPAND:
+        return maybe_to_choice(node)
+    if lowering == Lowering.FACTORED:
+        return factor_choices(maybe_to_choice(node), where or {})
+    return factor_choices(node, where or {})
+
+
+@lru_cache(maxsize=PASS_CACHE_SIZE)
+def maybe_to_choice(node: Base) -> Base:
+    # Nodes are hash-consed, so each distinct subtree is expanded once
 
     if isinstance(node, Maybe):
         raise Exception("reached maybe in pass")
 
     if isinstance(node, Modifier):
-        class_ = node.__class__
-        return class_(maybe_to_choice(node.wraps))
+        return node.__class__(maybe_to_choice(node.wraps))
+
+    if isinstance(node, Choice):
+        # An optional alternative is the alternative or nothing
+        alternatives = [maybe_to_choice(x.wraps if isinstance(x, Maybe) else x) for x in node.members]
+        if any(isinstance(x, Maybe) for x in node.members):
+            alternatives.append(Nothing(""))
+        return Choice(tuple(alternatives))
 
     if isinstance(node, Group):
-        class_ = node.__class__
+        group_class = node.__class__
 
         n_maybes = len([x for x in node.members if isinstance(x, Maybe)])
         if n_maybes == 0:
-            return class_([maybe_to_choice(sn) for sn in node.members])
+            return group_class(tuple(maybe_to_choice(sn) for sn in node.members))
 
-        n_variants = 2 ** n_maybes
+        n_variants = 2**n_maybes
         t = f"0:0{n_maybes}b"
 
         variants: List[Base] = []
@@ -32,8 +76,6 @@ def maybe_to_choice(node: Base):
             for subnode in node.members:
 
                 if isinstance(subnode, Maybe):
-                    # if isinstance(subnode.wraps, Literal) and subnode.wraps.content=='AS':
-                    #    import pdb; pdb.set_trace()
                     if mask[mask_ix]:
                         variant.append(maybe_to_choice(subnode.wraps))
                     mask_ix += 1
@@ -44,10 +86,157 @@ def maybe_to_choice(node: Base):
             if len(variant) == 0:
                 variants.append(Nothing(""))
             else:
-                variants.append(class_(variant))
+                variants.append(group_class(tuple(variant)))
 
-        return Choice(variants)
+        return Choice(tuple(variants))
 
     if not isinstance(node, Leaf):
         raise Exception(node)
     return node
+
+
+def factor_choices(node: Base, where: Dict[str, "Template"]) -> Base:
+    """Factor members shared by the start or end of Choice alternatives out of the Choice
+
+    e.g. { A B C | A B D | E } becomes { A B { C | D } | E }, so a regex
+    matches the shared members once instead of once per alternative
+    """
+    if node.closed:
+        return _factor_closed_choices(node)
+    return _factor_choices(node, where)
+
+
+@lru_cache(maxsize=PASS_CACHE_SIZE)
+def _factor_closed_choices(node: Base) -> Base:
+    # Without arguments the result does not depend on where, so it is memoized per subtree
+    return _factor_choices(node, {})
+
+
+def _factor_choices(node: Base, where: Dict[str, "Template"]) -> Base:
+    if isinstance(node, Modifier):
+        return node.__class__(factor_choices(node.wraps, where))
+
+    if isinstance(node, Choice):
+        sequences = [_members(factor_choices(x, where)) for x in node.members]
+        alternatives, empty = _factor(sequences, where, reverse=False)
+        # Then factor shared suffixes out of what remains
+        alternatives, empty_suffix = _factor([_members(x) for x in alternatives], where, reverse=True)
+        return _optional(_alternation(alternatives), empty or empty_suffix)
+
+    if isinstance(node, Group):
+        return node.__class__(tuple(factor_choices(x, where) for x in node.members))
+
+    return node
+
+
+def _members(node: Base) -> Tuple[Base, ...]:
+    """Node as the sequence of members it matches"""
+    if isinstance(node, Nothing):
+        return ()
+    if isinstance(node, Group) and not isinstance(node, (Choice, InParens)):
+        return node.members
+    return (node,)
+
+
+def _sequence(members: Tuple[Base, ...]) -> Base:
+    if not members:
+        return Nothing("")
+    if len(members) == 1:
+        return members[0]
+    return Group(members)
+
+
+def _alternation(alternatives: List[Base]) -> Base:
+    return alternatives[0] if len(alternatives) == 1 else Choice(tuple(alternatives))
+
+
+def _optional(node: Base, optional: bool) -> Base:
+    return Maybe(node) if optional else node
+
+
+def _unfactorable(members: Tuple[Base, ...], where: Dict[str, "Template"], reverse: bool) -> bool:
+    """Whether *members* can not be moved into a Choice next to a factored end"""
+    if not members:
+        return False
+    # The Choice is separated from the shared end by whitespace, which must not
+    # remain when the members match nothing
+    if all(nullable(x, where) for x in members):
+        return True
+    # Whitespace before parentheses is optional, but always taken before a Choice
+    first = members[0].wraps if isinstance(members[0], Maybe) else members[0]
+    return not reverse and isinstance(first, InParens)
+
+
+def _factor(sequences: List[Tuple[Base, ...]], where: Dict[str, "Template"], reverse: bool) -> Tuple[List[Base], bool]:
+    """Alternatives matching the same member sequences, with shared ends matched once
+
+    Returns the alternatives and whether an empty sequence was among *sequences*
+    """
+    empty = False
+    by_end: Dict[Base, List[Tuple[Base, ...]]] = {}
+    for members in sequences:
+        if not members:
+            empty = True
+            continue
+        # Nodes are hash-consed, equal members are the same object
+        end = members[-1] if reverse else members[0]
+        by_end.setdefault(end, []).append(members[:-1] if reverse else members[1:])
+
+    alternatives: List[Base] = []
+    for end, rests in by_end.items():
+        if len(rests) == 1 or any(_unfactorable(x, where, reverse) for x in rests):
+            alternatives.extend(_sequence(x + (end,) if reverse else (end,) + x) for x in rests)
+            continue
+        inner, inner_empty = _factor(rests, where, reverse)
+        rest = _members(_optional(_alternation(inner), inner_empty))
+        alternatives.append(Group(rest + (end,) if reverse else (end,) + rest))
+    return alternatives, empty
+
+
+def leading_literals(node: Base, depth: int = 4) -> Set[Tuple[str, ...]]:
+    """Sequences of up to *depth* literals that a statement matching *node* may start with
+
+    An empty sequence means a match may start with user input, e.g. a name
+    """
+    return {prefix for prefix, _ in _prefixes(node, depth)}
+
+
+def _prefixes(node: Base, depth: int) -> Set[Tuple[Tuple[str, ...], bool]]:
+    """Leading literal sequences paired with whether the sequence spans all of *node*
+
+    When it does, a following sibling may extend the sequence
+    """
+    if isinstance(node, Literal):
+        return {((node.content,), True)}
+
+    if isinstance(node, Nothing):
+        return {((), True)}
+
+    if isinstance(node, Maybe):
+        return _prefixes(node.wraps, depth) | {((), True)}
+
+    if isinstance(node, Repeat):
+        return {(prefix, False) for prefix, _ in _prefixes(node.wraps, depth)}
+
+    if isinstance(node, InParens):
+        return {((), False)}
+
+    if isinstance(node, Choice):
+        return {x for member in node.members for x in _prefixes(member, depth)}
+
+    if isinstance(node, Group):
+        result: Set[Tuple[Tuple[str, ...], bool]] = {((), True)}
+        for member in node.members:
+            extended = set()
+            for prefix, is_open in result:
+                if not is_open:
+                    extended.add((prefix, False))
+                    continue
+                for member_prefix, member_open in _prefixes(member, depth):
+                    combined = prefix + member_prefix
+                    extended.add((combined[:depth], member_open and len(combined) < depth))
+            result = extended
+        return result
+
+    # Arguments and names consume user input
+    return {((), False)}
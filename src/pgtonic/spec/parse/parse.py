@@ -1,8 +1,8 @@
 from functools import lru_cache
-from typing import Iterable, List, Union
-
-from flupy import flu
+from typing import List, Optional, Tuple
 
+from pgtonic import instrument
+from pgtonic.exceptions import ParseFailureException
 from pgtonic.spec.lex.lex import lex
 from pgtonic.spec.lex.types import Part, Token
 from pgtonic.spec.parse.stream_passes import filter_whitespace
@@ -23,85 +23,102 @@ from pgtonic.spec.parse.types import (
     UnqualifiedName,
 )
 
+BRACKETS = {
+    Token.L_BRACKET: Token.R_BRACKET,
+    Token.L_BRACE: Token.R_BRACE,
+    Token.L_PAREN: Token.R_PAREN,
+}
+
+REPEATS = {
+    Token.DELIMITED_COMMA: RepeatComma,
+    Token.DELIMITED_OR: RepeatOr,
+    Token.DELIMITED_NONE: RepeatNone,
+}
+
+LEAVES = {
+    Token.ARG: Argument,
+    Token.LITERAL: Literal,
+    Token.STAR: Literal,
+    Token.PIPE: Pipe,
+    Token.NAME: Name,
+    Token.QUALIFIED_NAME: QualifiedName,
+    Token.UNQUALIFIED_NAME: UnqualifiedName,
+}
+
 
 @lru_cache()
+@instrument.timed(instrument.PARSE)
 def parse(sql: str) -> Base:
-    tstream0 = lex(sql)
-    tstream1 = filter_whitespace(tstream0)
-    nodes = _parse(tstream1)  # type: ignore
-
-    if isinstance(nodes, list):
-        return Group(nodes)
-    return nodes
-
-
-def handle_pipes(x):
-    grouped = (
-        flu(x)
-        .group_by(lambda x: isinstance(x, Pipe), sort=False)
-        .filter(lambda x: not x[0])
-        .map(lambda x: x[1].collect())
-        .map(lambda x: Group(x) if len(x) > 1 else x[0])
-        .collect()
-    )
-    if len(grouped) == 1:
-        return grouped[0]
-    return Choice(grouped)
-
+    stream = filter_whitespace(lex(sql))
+    nodes, _ = _parse(sql, stream, 0, None)
+    return Group(tuple(nodes))
 
-def _parse(stream: Iterable[Part]) -> Union[List, Base]:  # type: ignore
-    out: List = []  # type: ignore
 
-    stream_once = flu(stream)
+def handle_pipes(nodes: List[Base]) -> Base:
+    """Split nodes on Pipes into the members of a Choice"""
+    options: List[Base] = []
+    current: List[Base] = []
+    for node in nodes + [Pipe("|")]:
+        if not isinstance(node, Pipe):
+            current.append(node)
+        elif current:
+            options.append(Group(tuple(current)) if len(current) > 1 else current[0])
+            current = []
 
-    for p in stream_once:
+    if len(options) == 1:
+        return options[0]
+    return Choice(tuple(options))
 
-        if p.token == Token.R_BRACKET:
-            if len(out) > 1:
-                maybe_choice = handle_pipes(out)
-                if isinstance(maybe_choice, Choice):
-                    return Maybe(maybe_choice)
-                return Maybe(Group(out))
-            return Maybe(out[0])
 
-        elif p.token == Token.R_PAREN:
-            return InParens(out)
+def _parse(spec: str, stream: List[Part], ix: int, opener: Optional[Part]) -> Tuple[List[Base], int]:
+    """Parse nodes from stream[ix] up to the token closing *opener*
 
-        elif p.token == Token.R_BRACE:
-            # Braces always contain pipes
-            return handle_pipes(out)
+    Returns the nodes and the index following the closing token
+    """
+    out: List[Base] = []
+    closer = BRACKETS[opener.token] if opener is not None else None
 
-        elif p.token in (Token.L_BRACE, Token.L_BRACKET, Token.L_PAREN):
-            out.append(_parse(stream_once))
+    while ix < len(stream):
+        p = stream[ix]
+        ix += 1
 
-        elif p.token == Token.ARG:
-            out.append(Argument(p.text))
+        if p.token in LEAVES:
+            out.append(LEAVES[p.token](p.text))
 
-        elif p.token == Token.DELIMITED_COMMA:
-            out[-1] = RepeatComma(out[-1])
+        elif p.token in BRACKETS:
+            members, ix = _parse(spec, stream, ix, p)
+            out.append(_close(spec, p, members))
 
-        elif p.token == Token.DELIMITED_OR:
-            out[-1] = RepeatOr(out[-1])
+        elif p.token == closer:
+            return out, ix
 
-        elif p.token == Token.DELIMITED_NONE:
-            out[-1] = RepeatNone(out[-1])
-
-        elif p.token in (Token.LITERAL, Token.STAR):
-            out.append(Literal(p.text))
-
-        elif p.token == Token.PIPE:
-            out.append(Pipe(p.text))
-
-        elif p.token == Token.NAME:
-            out.append(Name(p.text))
-
-        elif p.token == Token.QUALIFIED_NAME:
-            out.append(QualifiedName(p.text))
-
-        elif p.token == Token.UNQUALIFIED_NAME:
-            out.append(UnqualifiedName(p.text))
+        elif p.token in REPEATS:
+            if not out:
+                raise ParseFailureException.at("Nothing to repeat", spec, p.start)
+            out[-1] = REPEATS[p.token](out[-1])
 
         else:
-            assert "Unhandled Token: {}".format(p.token)
-
-    return out
+            raise ParseFailureException.at("Unexpected {}".format(p.token), spec, p.start)
+
+    if opener is not None:
+        raise ParseFailureException.at("Unclosed {}".format(opener.token), spec, opener.start)
+    return out, ix
+
+
+def _close(spec: str, opener: Part, members: List[Base]) -> Base:
+    """Build the node for a bracketed sequence of *members*"""
+    if opener.token == Token.L_PAREN:
+        return InParens(tuple(members))
+
+    if opener.token == Token.L_BRACE:
+        # Braces always contain pipes
+        return handle_pipes(members)
+
+    if not members:
+        raise ParseFailureException.at("Empty optional", spec, opener.start)
+    if len(members) > 1:
+        maybe_choice = handle_pipes(members)
+        if isinstance(maybe_choice, Choice):
+            return Maybe(maybe_choice)
+        return Maybe(Group(tuple(members)))
+    return Maybe(members[0])
@@ -1,20 +1,96 @@
-from dataclasses import dataclass
-from typing import TYPE_CHECKING, ClassVar, Dict, List
+import threading
+from dataclasses import dataclass, fields
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    ClassVar,
+    Dict,
+    Optional,
+    Sequence,
+    Tuple,
+)
+from weakref import WeakValueDictionary
 
 from pgtonic.spec import regex as r
+from pgtonic.spec.capture import Captures
 
 if TYPE_CHECKING:
     from pgtonic.spec.template import Template
 
 
 class ToRegexMixin:
-    def to_regex(self, where: Dict[str, "Template"]) -> str:
+    def to_regex(self, where: Dict[str, "Template"], captures: Optional[Captures] = None) -> str:
+        """Regex matching the node, with arguments in named groups registered on *captures*"""
         raise NotImplementedError()
 
 
-@dataclass
-class Base(ToRegexMixin):
-    pass
+# Live nodes by class and fields, see _Interning.__call__
+_INTERNED: "WeakValueDictionary[Tuple[Any, ...], Base]" = WeakValueDictionary()
+_INTERNED_LOCK = threading.Lock()
+
+
+class _Interning(type):
+    """Metaclass returning the live node equal to the one being constructed
+
+    The key is built from the arguments, so a live node is returned as is and
+    its fields are never reassigned by __init__ while other threads read it.
+    """
+
+    def __call__(cls, *args: Any, **kwargs: Any) -> Any:
+        values = args + tuple(kwargs[x.name] for x in fields(cls)[len(args) :]) if kwargs else args  # type: ignore
+        # Lists of members are stored as tuples, so nodes stay hashable and immutable
+        values = tuple(tuple(x) if isinstance(x, list) else x for x in values)
+        key = (cls,) + values
+        node = _INTERNED.get(key)
+        if node is None:
+            with _INTERNED_LOCK:
+                # Checked again, so threads constructing equal nodes get the same one
+                node = _INTERNED.get(key)
+                if node is None:
+                    # Fully initialized before other threads can see it
+                    node = super().__call__(*values)
+                    object.__setattr__(node, "_regex", None)
+                    object.__setattr__(node, "_closed", None)
+                    _INTERNED[key] = node
+        return node
+
+
+@dataclass(frozen=True, eq=False)
+class Base(ToRegexMixin, metaclass=_Interning):
+    """Immutable, hash-consed AST node
+
+    Constructing a node equal to a live one returns the live one, so equal
+    subtrees are shared and compare and hash by identity. The regex of a
+    subtree without arguments does not depend on *where* and is cached.
+    """
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return (self.__class__, tuple(getattr(self, x.name) for x in fields(self)))
+
+    def children(self) -> Tuple["Base", ...]:
+        return ()
+
+    @property
+    def closed(self) -> bool:
+        """True when no Argument appears in the subtree"""
+        closed = self._closed  # type: ignore
+        if closed is None:
+            closed = all(x.closed for x in self.children())
+            object.__setattr__(self, "_closed", closed)
+        return closed
+
+    def to_regex(self, where: Dict[str, "Template"], captures: Optional[Captures] = None) -> str:
+        if captures is not None or not self.closed:
+            return self._to_regex(where, captures)
+        regex = self._regex  # type: ignore
+        if regex is None:
+            regex = self._to_regex(where)
+            object.__setattr__(self, "_regex", regex)
+        return regex
+
+    def _to_regex(self, where: Dict[str, "Template"], captures: Optional[Captures] = None) -> str:
+        raise NotImplementedError(self.__class__.__name__)
 
 
 ##############
@@ -26,58 +102,63 @@ def w(add_whitespace: bool) -> str:
     return r.WHITESPACE if add_whitespace else ""
 
 
-@dataclass
+@dataclass(frozen=True, eq=False)
 class Leaf(Base):
     content: str
 
-    def to_regex(self, where: Dict[str, "Template"]) -> str:
+    def _to_regex(self, where: Dict[str, "Template"], captures: Optional[Captures] = None) -> str:
         # Is abstract, should never be in AST
         raise NotImplementedError(self.__class__.__name__)
 
 
-@dataclass
+@dataclass(frozen=True, eq=False)
 class Literal(Leaf):
-    def to_regex(self, where: Dict[str, "Template"]) -> str:
-        return str(self.content)
+    def _to_regex(self, where: Dict[str, "Template"], captures: Optional[Captures] = None) -> str:
+        return r.literal(self.content)
 
 
-@dataclass
+@dataclass(frozen=True, eq=False)
 class Argument(Leaf):
     """User input"""
 
-    def to_regex(self, where: Dict[str, "Template"]) -> str:
+    @property
+    def closed(self) -> bool:
+        return False
+
+    def _to_regex(self, where: Dict[str, "Template"], captures: Optional[Captures] = None) -> str:
         template = where[self.content]
-        # TODO: Add a named capture group
-        #return f'(?:<{self.content}>' + template.to_regex() + ')'
-        return template.to_regex()
+        if captures is None:
+            return template._marked_regex()
+        group = captures.argument(self.content)
+        return "(?P<" + group + ">" + template._marked_regex(captures=captures) + ")"
 
 
-@dataclass
+@dataclass(frozen=True, eq=False)
 class Pipe(Leaf):
     pass
 
 
-@dataclass
+@dataclass(frozen=True, eq=False)
 class Nothing(Leaf):
-    def to_regex(self, where: Dict[str, "Template"]) -> str:
-        return "()"
+    def _to_regex(self, where: Dict[str, "Template"], captures: Optional[Captures] = None) -> str:
+        return "(?:)"
 
 
-@dataclass
+@dataclass(frozen=True, eq=False)
 class UnqualifiedName(Leaf):
-    def to_regex(self, where: Dict[str, "Template"]) -> str:
+    def _to_regex(self, where: Dict[str, "Template"], captures: Optional[Captures] = None) -> str:
         return r.UNQUALIFIED_NAME
 
 
-@dataclass
+@dataclass(frozen=True, eq=False)
 class QualifiedName(Leaf):
-    def to_regex(self, where: Dict[str, "Template"]) -> str:
+    def _to_regex(self, where: Dict[str, "Template"], captures: Optional[Captures] = None) -> str:
         return r.QUALIFIED_NAME
 
 
-@dataclass
+@dataclass(frozen=True, eq=False)
 class Name(Leaf):
-    def to_regex(self, where: Dict[str, "Template"]) -> str:
+    def _to_regex(self, where: Dict[str, "Template"], captures: Optional[Captures] = None) -> str:
         return r.NAME
 
 
@@ -86,39 +167,144 @@ class Name(Leaf):
 ###################
 
 
-@dataclass
-class Group(Base):
-    members: List[Base]
-
-    def to_regex(self, where: Dict[str, "Template"]) -> str:
-        result = "("
-        # TODO: Optional whitespace befoer InParens
-        for ix, x in enumerate(self.members):
-            if ix == 0:
-                result += x.to_regex(where)
-            elif isinstance(x, InParens):
-                result += r.OPTIONAL_WHITESPACE + x.to_regex(where)
+def separator(node: "Base") -> str:
+    """Whitespace expected before *node* when it follows a sibling"""
+    return r.OPTIONAL_WHITESPACE if isinstance(node, InParens) else r.WHITESPACE
+
+
+def nullable(node: "Base", where: Dict[str, "Template"]) -> bool:
+    """Can *node* match the empty string"""
+    if isinstance(node, (Maybe, Nothing)):
+        return True
+    if isinstance(node, Repeat):
+        return nullable(node.wraps, where)
+    if isinstance(node, InParens):
+        return False
+    if isinstance(node, Choice):
+        return any(nullable(x, where) for x in node.members)
+    if isinstance(node, Group):
+        return all(nullable(x, where) for x in node.members)
+    if isinstance(node, Argument):
+        template = where[node.content]
+        return nullable(template.ast, template.where or {})
+    return False
+
+
+def non_empty(node: "Base", where: Dict[str, "Template"]) -> Optional["Base"]:
+    """Node matching what *node* matches except the empty string, None if that is all it matches
+
+    Repetitions of nullable items and nullable arguments are returned as they are
+    """
+    if not nullable(node, where):
+        return node
+    if isinstance(node, Nothing):
+        return None
+    if isinstance(node, Maybe):
+        return non_empty(node.wraps, where)
+    if isinstance(node, Choice):
+        alternatives = [x for x in (non_empty(x, where) for x in node.members) if x is not None]
+    elif isinstance(node, Group) and not isinstance(node, InParens):
+        # Every member is nullable, so one of them is the first to match something
+        alternatives = []
+        for ix, member in enumerate(node.members):
+            first = non_empty(member, where)
+            if first is not None:
+                rest = node.members[ix + 1 :]
+                alternatives.append(Group((first,) + rest) if rest else first)
+    else:
+        return node
+    if not alternatives:
+        return None
+    return alternatives[0] if len(alternatives) == 1 else Choice(tuple(alternatives))
+
+
+def join_members(
+    members: Sequence["Base"],
+    where: Dict[str, "Template"],
+    sep: Callable[["Base"], str],
+    captures: Optional[Captures] = None,
+) -> str:
+    """Join members with whitespace, lowering nullable members to optional groups
+
+    An optional member carries its leading separator inside the optional group
+    so absent members leave no stray whitespace. When the group starts with
+    optional members, they carry the separator that follows them instead, or
+    when that is ambiguous the regex alternates over which member is present
+    first, matching the rest of the group once after the alternation. Any
+    member matching the empty string is optional, not only Maybe, e.g.
+    { A | [ C ] }, and is matched by its non empty form.
+    """
+    optional = [nullable(x, where) for x in members]
+    # Members only matching the empty string leave nothing to match
+    unwrapped = [non_empty(x, where) if is_optional else x for x, is_optional in zip(members, optional)]
+    present = [ix for ix, x in enumerate(unwrapped) if x is not None]
+    members = [unwrapped[ix] for ix in present]  # type: ignore
+    optional = [optional[ix] for ix in present]
+    if not members:
+        return ""
+
+    def tail(start: int, stop: Optional[int] = None) -> str:
+        result = ""
+        for x, is_optional in zip(members[start:stop], optional[start:stop]):
+            if is_optional:
+                result += "(?:" + sep(x) + x.to_regex(where, captures) + ")?"
             else:
-                result += r.WHITESPACE + x.to_regex(where)
-
-        result += ")"
+                result += sep(x) + x.to_regex(where, captures)
         return result
 
+    first_required = next((ix for ix, x in enumerate(optional) if not x), len(members))
+    if first_required == 0:
+        return members[0].to_regex(where, captures) + tail(1)
+
+    if first_required < len(members):
+        required = members[first_required]
+        seps = {sep(x) for x in members[1 : first_required + 1]}
+        if len(seps) == 1:
+            # Leading optional members are always followed by the same separator
+            (trailing,) = seps
+            result = ""
+            for x in members[:first_required]:
+                result += "(?:" + x.to_regex(where, captures) + trailing + ")?"
+            return result + required.to_regex(where, captures) + tail(first_required + 1)
+
+        # Alternate over the first optional member present, the required member
+        # and what follows it are matched once after the alternation
+        heads = [
+            x.to_regex(where, captures) + tail(ix + 1, first_required) for ix, x in enumerate(members[:first_required])
+        ]
+        result = "(?:(?:" + "|".join(heads) + ")" + sep(required) + ")?"
+        return result + required.to_regex(where, captures) + tail(first_required + 1)
+
+    # Every member is optional
+    heads = [x.to_regex(where, captures) + tail(ix + 1) for ix, x in enumerate(members)]
+    return "(?:" + "|".join(heads) + ")?"
+
+
+@dataclass(frozen=True, eq=False)
+class Group(Base):
+    members: Tuple[Base, ...]
+
+    def children(self) -> Tuple[Base, ...]:
+        return self.members
 
-@dataclass
+    def _to_regex(self, where: Dict[str, "Template"], captures: Optional[Captures] = None) -> str:
+        return "(?:" + join_members(self.members, where, separator, captures) + ")"
+
+
+@dataclass(frozen=True, eq=False)
 class Choice(Group):
-    def to_regex(self, where: Dict[str, "Template"]) -> str:
-        result = "("
-        result += "|".join([x.to_regex(where) for x in self.members])
+    def _to_regex(self, where: Dict[str, "Template"], captures: Optional[Captures] = None) -> str:
+        result = "(?:"
+        result += "|".join([x.to_regex(where, captures) for x in self.members])
         result += ")"
         return result
 
 
-@dataclass
+@dataclass(frozen=True, eq=False)
 class InParens(Group):
-    def to_regex(self, where: Dict[str, "Template"]) -> str:
+    def _to_regex(self, where: Dict[str, "Template"], captures: Optional[Captures] = None) -> str:
         result = r"\(" + r.OPTIONAL_WHITESPACE
-        result += r.WHITESPACE.join([x.to_regex(where) for x in self.members])
+        result += join_members(self.members, where, lambda _: r.WHITESPACE, captures)
         result += r.OPTIONAL_WHITESPACE + r"\)"
         return result
 
@@ -128,44 +314,58 @@ class InParens(Group):
 ##################
 
 
-@dataclass
+@dataclass(frozen=True, eq=False)
 class Modifier(Base):
     wraps: Base
 
+    def children(self) -> Tuple[Base, ...]:
+        return (self.wraps,)
 
-@dataclass
+
+@dataclass(frozen=True, eq=False)
 class Repeat(Modifier):
     wraps: Base
 
-    delimiter_regex: ClassVar[str]
+    # Regex between consecutive items
+    separator_regex: ClassVar[str]
 
-    def to_regex(self, where: Dict[str, "Template"]) -> str:
+    def _to_regex(self, where: Dict[str, "Template"], captures: Optional[Captures] = None) -> str:
         self_reg = self.wraps.to_regex(where)
-        result = "(" + self_reg + ")"
-        result += "(" + r.OPTIONAL_WHITESPACE + self.delimiter_regex + r.OPTIONAL_WHITESPACE + self_reg + ")*"
-        return result
-
-
-@dataclass
+        result = "(?:" + self_reg + ")"
+        result += "(?:" + self.separator_regex + self_reg + ")*"
+        if captures is None:
+            return result
+        # Items are matched again from the repetition's span to recover every value
+        item = captures.scope()
+        item_regex = self.wraps.to_regex(where, item)
+        if not item.arguments and not item.repeats:
+            return result
+        group = captures.repeat(item, item_regex, self.separator_regex)
+        return "(?P<" + group + ">" + result + ")"
+
+
+@dataclass(frozen=True, eq=False)
 class RepeatComma(Repeat):
     """Comma separated"""
 
-    delimiter_regex = ","
+    separator_regex = r.OPTIONAL_WHITESPACE + "," + r.OPTIONAL_WHITESPACE
 
 
+@dataclass(frozen=True, eq=False)
 class RepeatOr(Repeat):
     """OR separated"""
 
-    delimiter_regex = "OR"
+    separator_regex = r.WHITESPACE + r.literal("OR") + r.WHITESPACE
 
 
+@dataclass(frozen=True, eq=False)
 class RepeatNone(Repeat):
     """Whitespace separated"""
 
-    delimiter_regex = r"\w+"
+    separator_regex = r.WHITESPACE
 
 
-@dataclass
+@dataclass(frozen=True, eq=False)
 class Maybe(Modifier):
-    def to_regex(self, where: Dict[str, "Template"]) -> str:
-        raise NotImplementedError()
+    def _to_regex(self, where: Dict[str, "Template"], captures: Optional[Captures] = None) -> str:
+        return "(?:" + self.wraps.to_regex(where, captures) + ")?"
@@ -0,0 +1,119 @@
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, FrozenSet, Tuple
+
+from pgtonic.spec.analyze import IDENT, first_set
+from pgtonic.spec.parse.types import (
+    Argument,
+    Base,
+    Choice,
+    Group,
+    InParens,
+    Literal,
+    Maybe,
+    Nothing,
+    QualifiedName,
+    Repeat,
+    nullable,
+)
+from pgtonic.sql import identifiers
+
+if TYPE_CHECKING:
+    from pgtonic.spec.template import Template
+
+
+@dataclass(frozen=True)
+class Prefilter:
+    """Necessary conditions for a statement to match a template, checked with string operations
+
+    Statements failing the check are rejected without running the regex, so
+    it may only reject statements the regex rejects too
+    """
+
+    # A match starts with one of these, empty when it may start with user input
+    leading: Tuple[str, ...]
+    # Literals present in every match, longest first
+    literals: Tuple[str, ...]
+    min_length: int
+
+    def may_match(self, sql: str) -> bool:
+        if len(sql) < self.min_length:
+            return False
+        if self.leading and not sql.startswith(self.leading):
+            # An empty nullable argument leads the regex with the whitespace it is followed by
+            if not identifiers.is_space(sql[:1]) or not sql.lstrip(identifiers.SPACE_CHARS).startswith(self.leading):
+                return False
+        for literal in self.literals:
+            if literal not in sql:
+                return False
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"leading": list(self.leading), "literals": list(self.literals), "min_length": self.min_length}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Prefilter":
+        return cls(tuple(data["leading"]), tuple(data["literals"]), data["min_length"])
+
+
+def build_prefilter(template: "Template") -> Prefilter:
+    where = template.where or {}
+    ast = template.ast
+
+    leading: Tuple[str, ...] = ()
+    first = first_set(ast, where)
+    if not nullable(ast, where) and IDENT not in first:
+        leading = tuple(sorted(first))
+
+    # A single leading literal is already checked by startswith
+    required = required_literals(ast, where) - set(leading[:1] if len(leading) == 1 else ())
+    literals = tuple(sorted(required, key=lambda x: (-len(x), x)))
+    return Prefilter(leading, literals, min_length(ast, where))
+
+
+def required_literals(node: Base, where: Dict[str, "Template"]) -> FrozenSet[str]:
+    """Literals that appear in every match of *node*"""
+    if isinstance(node, Literal):
+        return frozenset([node.content])
+    if isinstance(node, (Maybe, Nothing)):
+        return frozenset()
+    if isinstance(node, Repeat):
+        return required_literals(node.wraps, where)
+    if isinstance(node, Choice):
+        return frozenset.intersection(*(required_literals(x, where) for x in node.members))
+    if isinstance(node, InParens):
+        return frozenset("()").union(*(required_literals(x, where) for x in node.members))
+    if isinstance(node, Group):
+        return frozenset().union(*(required_literals(x, where) for x in node.members))
+    if isinstance(node, Argument):
+        template = where[node.content]
+        return required_literals(template.ast, template.where or {})
+    # Names
+    return frozenset()
+
+
+def min_length(node: Base, where: Dict[str, "Template"]) -> int:
+    """Fewest characters a match of *node* can have"""
+    if isinstance(node, Literal):
+        return len(node.content)
+    if isinstance(node, (Maybe, Nothing)):
+        return 0
+    if isinstance(node, Repeat):
+        return min_length(node.wraps, where)
+    if isinstance(node, Choice):
+        return min(min_length(x, where) for x in node.members)
+    if isinstance(node, Group):
+        lengths = [min_length(x, where) for x in node.members]
+        # Whitespace is only certain between members that are present, and
+        # may be omitted before parentheses
+        gaps = sum(1 for x in node.members if not nullable(x, where) and not isinstance(x, InParens)) - 1
+        result = sum(lengths) + max(gaps, 0)
+        if isinstance(node, InParens):
+            result += 2
+        return result
+    if isinstance(node, Argument):
+        template = where[node.content]
+        return min_length(template.ast, template.where or {})
+    if isinstance(node, QualifiedName):
+        return 3
+    # Other names
+    return 1
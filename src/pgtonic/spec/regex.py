@@ -1,13 +1,40 @@
+import hashlib
+import re
+import sys
+from pathlib import Path
+
+from pgtonic.sql import identifiers
+
 ############
 # Concepts #
 ############
 
+# Atomic groups are supported from Python 3.11. On earlier versions atomic()
+# falls back to a plain non-capturing group, which matches the same strings
+ATOMIC_GROUPS = sys.version_info >= (3, 11)
+
+
+def atomic(regex: str) -> str:
+    """Group *regex* so that once it has matched the engine never backtracks into it
+
+    Only safe where the match should be the longest possible, e.g. identifiers
+    which SQL also tokenizes by maximal munch
+    """
+    return f"(?>{regex})" if ATOMIC_GROUPS else f"(?:{regex})"
+
+
+def literal(content: str) -> str:
+    """Regex for *content* verbatim, reserved keywords expect the mark identifiers.prepare puts before them"""
+    if identifiers.is_reserved(content):
+        return identifiers.MARK_REGEX + re.escape(content)
+    return re.escape(content)
 
-# TODO: Exclude SQL keywords when unquoted. e.g. "TABLE"
-# public, perms, api_sch
-_UNQUOTED_NAME = "([A-z_][A-z0-9_]*)"
-# "api_V2", "sOmEaC"
-_QUOTED_NAME = '("[^"]+?")'
+
+# public, perms, api_sch, ñandú
+# Reserved keywords e.g. TABLE are excluded by marking them, see identifiers.prepare
+_UNQUOTED_NAME = identifiers.WORD
+# "api_V2", "sOmEaC", "say ""hi"""
+_QUOTED_NAME = identifiers.QUOTED_IDENTIFIER
 
 # For making regex more readable while debugging
 # _UNQUOTED_NAME = r"\w+"
@@ -17,18 +44,41 @@ _QUOTED_NAME = '("[^"]+?")'
 # Externally Used #
 ###################
 
-SCHEMA_NAME = f"({_UNQUOTED_NAME}|{_QUOTED_NAME})"
-ENTITY_NAME = f"({_UNQUOTED_NAME}|{_QUOTED_NAME})"
+# Quoted first, so the U of U&"..." is not taken for a whole name
+SCHEMA_NAME = atomic(f"{_QUOTED_NAME}|{_UNQUOTED_NAME}")
+ENTITY_NAME = atomic(f"{_QUOTED_NAME}|{_UNQUOTED_NAME}")
 
-QUALIFIED_NAME = rf"({SCHEMA_NAME}\.{ENTITY_NAME})"
-UNQUALIFIED_NAME = rf"({ENTITY_NAME})"
-NAME = rf"({QUALIFIED_NAME}|{UNQUALIFIED_NAME})"
+QUALIFIED_NAME = rf"(?:{SCHEMA_NAME}\.{ENTITY_NAME})"
+UNQUALIFIED_NAME = ENTITY_NAME
+# Same as QUALIFIED_NAME|UNQUALIFIED_NAME, spelling the identifier regexes out twice instead of three times
+NAME = atomic(rf"{SCHEMA_NAME}(?:\.{ENTITY_NAME})?")
 
-WHITESPACE = r"(\s+)"
-OPTIONAL_WHITESPACE = r"(\s*)"
+WHITESPACE = identifiers.SPACE + "+"
+OPTIONAL_WHITESPACE = identifiers.SPACE + "*"
 
 SEMICOLON = ";"
 OPTIONAL_SEMICOLON = ";?"
 
 START_OF_LINE = "^"
 END_OF_LINE = "$"
+
+# Modules whose code generates or matches the regexes and automata that are cached
+# or stored in a catalog, so editing any of them invalidates those artifacts
+_PACKAGE = Path(__file__).parent.parent
+_GENERATOR_SOURCES = sorted(path for package in ("spec", "sql") for path in (_PACKAGE / package).rglob("*.py"))
+
+
+def _digest() -> str:
+    digest = hashlib.sha256()
+    digest.update("\n".join(["{}.{}".format(*sys.version_info[:2]), atomic("x"), literal("TABLE"), NAME]).encode())
+    for path in _GENERATOR_SOURCES:
+        digest.update(path.relative_to(_PACKAGE).as_posix().encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+# Digest of the Python version, of regexes generated from the concepts above,
+# which differ between versions, e.g. atomic groups, and of the generator sources.
+# Generated regexes are only reused from the cache or a catalog when they were
+# generated under the same digest
+GENERATOR = _digest()
@@ -0,0 +1,158 @@
+import hashlib
+import re
+import threading
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from pgtonic.spec import cache
+from pgtonic.spec.automaton import Dfa, build_dfa
+from pgtonic.spec.engine import Explanation
+from pgtonic.spec.parse.ast_passes import leading_literals
+from pgtonic.spec.template import Template
+from pgtonic.sql import identifiers
+
+# Words and single punctuation characters at the start of a statement
+WORD = re.compile(identifiers.WORD + "|" + identifiers.NON_SPACE)
+
+
+@dataclass
+class _Node:
+    children: Dict[str, "_Node"] = field(default_factory=dict)
+    templates: List[Template] = field(default_factory=list)
+
+
+class Registry:
+    """Index of templates by the literal keywords their statements start with
+
+    A statement is only tested against templates whose leading literals,
+    e.g. CREATE CONSTRAINT TRIGGER, are a prefix of the statement's words
+
+    Templates may also be registered lazily with a loader for the keyword
+    their statements start with, see defer. Registering and loading are
+    thread safe, so threads may share a registry.
+    """
+
+    def __init__(self, templates: Iterable[Template] = (), depth: int = 4, automaton: Optional[Dfa] = None) -> None:
+        """*automaton*, when given, is a prebuilt automaton over *templates* in order"""
+        self.depth = depth
+        self._root = _Node()
+        self._templates: List[Template] = []
+        self._automaton: Optional[Dfa] = None
+        self._deferred: Dict[str, List[Callable[[], Iterable[Template]]]] = {}
+        # Reentrant, as loaders register templates while a load holds it
+        self._lock = threading.RLock()
+        for template in templates:
+            self.register(template)
+        self._automaton = automaton
+
+    def register(self, template: Template) -> None:
+        with self._lock:
+            for prefix in leading_literals(template.ast, self.depth):
+                node = self._root
+                for word in prefix:
+                    node = node.children.setdefault(word, _Node())
+                node.templates.append(template)
+            self._templates.append(template)
+            self._automaton = None
+
+    def defer(self, keyword: str, loader: Callable[[], Iterable[Template]]) -> None:
+        """Register the templates returned by *loader* once a statement starting with *keyword* is seen"""
+        with self._lock:
+            self._deferred.setdefault(keyword.upper(), []).append(loader)
+
+    def _load(self, keyword: str) -> None:
+        with self._lock:
+            loaders = self._deferred.get(keyword)
+            if loaders is None:
+                # Loaded by another thread while this one waited
+                return
+            for loader in loaders:
+                for template in loader():
+                    self.register(template)
+            # Only removed once registered, so a thread not seeing the entry sees its templates
+            del self._deferred[keyword]
+
+    def _load_all(self) -> None:
+        with self._lock:
+            for keyword in list(self._deferred):
+                self._load(keyword)
+
+    def candidates(self, sql: str) -> List[Template]:
+        """Templates that may match *sql*, least specific prefix first"""
+        node = self._root
+        found = list(node.templates)
+        for depth, word in enumerate(islice(WORD.finditer(sql), self.depth)):
+            keyword = word.group().upper()
+            if depth == 0 and keyword in self._deferred:
+                self._load(keyword)
+            child = node.children.get(keyword)
+            if child is None:
+                break
+            node = child
+            found.extend(node.templates)
+
+        # A template registered under several prefixes may be found more than once
+        return list({id(x): x for x in found}.values())
+
+    def find(self, sql: str) -> Optional[Template]:
+        """Return the first template matching *sql*"""
+        for template in self.candidates(sql):
+            if template.is_match(sql):
+                return template
+        return None
+
+    def is_match(self, sql: str) -> bool:
+        return self.find(sql) is not None
+
+    def explain(self, sql: str) -> Optional[Explanation]:
+        """Explanation for the template matching *sql*, or else the one whose match got furthest
+
+        Only templates for the statement's leading keywords are tried. When
+        there are none, the explanation has no template and expects the
+        keywords templates start with, without loading deferred templates.
+        None when the registry is empty.
+        """
+        best: Optional[Explanation] = None
+        for template in self.candidates(sql):
+            explanation = template.explain(sql)
+            if explanation.is_match:
+                return explanation
+            if best is None or explanation.position > best.position:
+                best = explanation
+        if best is not None:
+            return best
+
+        with self._lock:
+            keywords = tuple(sorted(set(self._root.children) | set(self._deferred)))
+        if not keywords:
+            return None
+        word = WORD.search(sql)
+        if word is None:
+            return Explanation(None, sql, False, len(sql), keywords, None)
+        return Explanation(None, sql, False, word.start(), keywords, word.group())
+
+    def automaton(self) -> Dfa:
+        """Single DFA over every registered template, accept states tagged by registration order"""
+        self._load_all()
+        if self._automaton is None:
+            key = hashlib.sha256("".join(x.fingerprint for x in self._templates).encode()).hexdigest()
+            data = cache.load("automata", key)
+            if data is None:
+                self._automaton = build_dfa(self._templates)
+                cache.store("automata", key, self._automaton.to_dict())
+            else:
+                self._automaton = Dfa.from_dict(data)
+        return self._automaton
+
+    def find_all(self, sql: str) -> List[Template]:
+        """Every template matching *sql*, found in one pass of the automaton"""
+        return [self._templates[ix] for ix in self.automaton().match(sql)]
+
+    def __iter__(self) -> Iterator[Template]:
+        self._load_all()
+        return iter(self._templates)
+
+    def __len__(self) -> int:
+        self._load_all()
+        return len(self._templates)
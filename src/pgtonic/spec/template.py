@@ -1,28 +1,94 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import re
-from dataclasses import dataclass
-from typing import TYPE_CHECKING, Dict, List, Optional
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import TYPE_CHECKING, Dict, List, Optional, Pattern, Tuple
 
-from pgtonic.spec.parse.ast_passes import maybe_to_choice
+from pgtonic import __version__, instrument
+from pgtonic.spec import cache
+from pgtonic.spec import engine as e
+from pgtonic.spec import regex as r
+from pgtonic.spec.capture import Captures, TemplateMatch
+from pgtonic.spec.parse.ast_passes import Lowering, lower, maybe_to_choice
 from pgtonic.spec.parse.parse import parse
 from pgtonic.spec.parse.types import Base, Choice
+from pgtonic.spec.prefilter import Prefilter, build_prefilter
+from pgtonic.sql import identifiers
 
 if TYPE_CHECKING:
     from pgtonic.spec.parse.types import Base
 
 
+# Regex source of each lowered template by (fingerprint, lowering), shared by
+# every template with the same spec and where templates. Least recently used
+# entries are evicted past LOWERING_MEMO_SIZE
+LOWERING_MEMO_SIZE = 1024
+_REGEXES: "OrderedDict[Tuple[str, Lowering], str]" = OrderedDict()
+_REGEXES_LOCK = threading.Lock()
+_STATS = {"hits": 0, "misses": 0}
+
+# Canonical instance of each template by fingerprint, see intern
+_INTERNED: Dict[str, "Template"] = {}
+
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    """A Template lowered to one precompiled pattern per top level variant"""
+
+    template: "Template"
+    lowering: Lowering
+    patterns: Tuple[Pattern[str], ...]
+    prefilter: Prefilter
+
+    def is_match(self, sql: str) -> bool:
+        recorder = instrument.ACTIVE
+        if recorder is None:
+            return self.prefilter.may_match(sql) and self._match(sql)
+
+        start = perf_counter()
+        matched = self.prefilter.may_match(sql) and self._match(sql)
+        recorder.phase(instrument.MATCH, perf_counter() - start)
+        recorder.match(self.template, matched)
+        return matched
+
+    def _match(self, sql: str) -> bool:
+        # Reserved keyword literals only match marked keywords, see identifiers.prepare
+        prepared = identifiers.prepare(sql)
+        return any(pattern.match(prepared) is not None for pattern in self.patterns)
+
+
 @dataclass(eq=True, frozen=True)
 class Template:
     original: str
     corrected: Optional[str] = None
     where: Optional[Dict[str, "Template"]] = None
+    _compiled: Dict[Lowering, CompiledTemplate] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _capturing: Dict[Lowering, Tuple[Pattern[str], Captures]] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    _fingerprint: Optional[str] = field(default=None, init=False, repr=False, compare=False)
 
     @property
     def spec(self) -> str:
         """Return the corrected spec if it exists, otherwise the original"""
         return self.corrected or self.original
 
+    @property
+    def fingerprint(self) -> str:
+        """Digest of the spec, where templates and pgtonic version identifying compiled artifacts"""
+        fingerprint = self._fingerprint
+        if fingerprint is None:
+            where = {k: v.fingerprint for k, v in (self.where or {}).items()}
+            content = json.dumps([__version__, self.spec, where], sort_keys=True)
+            fingerprint = hashlib.sha256(content.encode()).hexdigest()
+            object.__setattr__(self, "_fingerprint", fingerprint)
+        return fingerprint
+
     @property
     def ast(self) -> "Base":
         return parse(self.spec)
@@ -32,18 +98,132 @@ class Template:
         ast = self.ast
         return maybe_to_choice(ast)
 
-    def to_regex(self) -> str:
-        ast_simple = self.ast_simple
-        return ast_simple.to_regex(self.where or {})
+    @instrument.timed(instrument.LOWER)
+    def lowered(self, lowering: Lowering = Lowering.OPTIONAL) -> "Base":
+        return lower(self.ast, lowering, self.where)
+
+    def to_regex(self, lowering: Lowering = Lowering.OPTIONAL, captures: Optional[Captures] = None) -> str:
+        """Regex matching statements of the template as they are written
+
+        Matches what compile and match do, which match the shorter regexes of
+        statements prepared by identifiers.prepare instead
+        """
+        return identifiers.as_written(self._marked_regex(lowering, captures))
+
+    def to_regexes(self, lowering: Lowering = Lowering.OPTIONAL) -> List[str]:
+        """One regex per top level variant, see to_regex"""
+        return [identifiers.as_written(x) for x in self._marked_regexes(lowering)]
+
+    def _marked_regex(self, lowering: Lowering = Lowering.OPTIONAL, captures: Optional[Captures] = None) -> str:
+        """Regex matching prepared statements, see identifiers.prepare"""
+        # Nested where templates are always lowered with the default strategy
+        if captures is not None:
+            # Group names depend on the enclosing template, nothing to share
+            return self.lowered(lowering).to_regex(self.where or {}, captures)
+
+        key = (self.fingerprint, lowering)
+        with _REGEXES_LOCK:
+            regex = _REGEXES.get(key)
+            if regex is not None:
+                _STATS["hits"] += 1
+                _REGEXES.move_to_end(key)
+                return regex
+            _STATS["misses"] += 1
+
+        regex = self.lowered(lowering).to_regex(self.where or {})
+        with _REGEXES_LOCK:
+            _REGEXES[key] = regex
+            while len(_REGEXES) > LOWERING_MEMO_SIZE:
+                _REGEXES.popitem(last=False)
+        return regex
 
-    def to_regexes(self) -> List[str]:
+    @instrument.timed(instrument.REGEX)
+    def _marked_regexes(self, lowering: Lowering = Lowering.OPTIONAL) -> List[str]:
         # For efficiency. Splitting the top level
         # Choice is not strictly necessary
-        ast_simple = self.ast_simple
-        if isinstance(ast_simple, Choice):
-            # Strip the initial group
-            return [x.to_regex(self.where or {})[1:-1] for x in ast_simple.members]
-        return [ast_simple.to_regex(self.where or {})]
-
-    def is_match(self, sql: str):
-        return any([re.match("^" + regex + "$", sql) for regex in self.to_regexes()])
+        ast_lowered = self.lowered(lowering)
+        if isinstance(ast_lowered, Choice):
+            return [x.to_regex(self.where or {}) for x in ast_lowered.members]
+        return [ast_lowered.to_regex(self.where or {})]
+
+    def compile(self, lowering: Lowering = Lowering.OPTIONAL) -> CompiledTemplate:
+        """Lower and compile the template once, reusing the result on later calls"""
+        compiled = self._compiled.get(lowering)
+        if compiled is None:
+            regexes, prefilter = self.artifacts(lowering)
+            try:
+                patterns = _compile_patterns(regexes)
+            except re.error:
+                # Stored regexes this Python can not compile are a cache miss
+                regexes, prefilter = self._generate_artifacts(lowering)
+                patterns = _compile_patterns(regexes)
+            compiled = CompiledTemplate(self, lowering, patterns, prefilter)
+            if instrument.ACTIVE is not None:
+                instrument.ACTIVE.compiled(self, lowering.value, regexes)
+            self._compiled[lowering] = compiled
+        return compiled
+
+    def artifacts(self, lowering: Lowering = Lowering.OPTIONAL) -> Tuple[List[str], Prefilter]:
+        """Regexes and prefilter compile builds patterns from, read from the on-disk cache when enabled"""
+        key = "{}-{}".format(self.fingerprint, lowering.value)
+        cached = cache.load("compiled", key)
+        if cached is not None:
+            return cached["regexes"], Prefilter.from_dict(cached["prefilter"])
+        return self._generate_artifacts(lowering)
+
+    def _generate_artifacts(self, lowering: Lowering) -> Tuple[List[str], Prefilter]:
+        """Lower the template to regexes and build its prefilter, replacing any cached entry"""
+        regexes = self._marked_regexes(lowering)
+        prefilter = build_prefilter(self)
+        key = "{}-{}".format(self.fingerprint, lowering.value)
+        cache.store("compiled", key, {"regexes": regexes, "prefilter": prefilter.to_dict()})
+        return regexes, prefilter
+
+    def is_match(self, sql: str, engine: e.Engine = e.Engine.REGEX) -> bool:
+        if engine == e.Engine.TOKENS:
+            return e.is_match(self, sql)
+        return self.compile().is_match(sql)
+
+    def explain(self, sql: str) -> e.Explanation:
+        """Report how far *sql* matches and what was expected where it stopped
+
+        Computed in one pass of the token engine, whose memo also records
+        the furthest token any branch reached
+        """
+        return e.explain(self, sql)
+
+    def match(self, sql: str, lowering: Lowering = Lowering.OPTIONAL) -> Optional[TemplateMatch]:
+        """Match *sql* and return the values captured by each argument"""
+        capturing = self._capturing.get(lowering)
+        if capturing is None:
+            captures = Captures()
+            regex = self._marked_regex(lowering, captures)
+            capturing = (re.compile(r.START_OF_LINE + regex + r.END_OF_LINE), captures)
+            self._capturing[lowering] = capturing
+
+        pattern, captures = capturing
+        m = pattern.match(identifiers.mark_reserved(sql))
+        if m is None:
+            return None
+        return TemplateMatch(self, sql, captures.to_dict(m))
+
+
+@instrument.timed(instrument.COMPILE)
+def _compile_patterns(regexes: List[str]) -> Tuple[Pattern[str], ...]:
+    return tuple(re.compile(r.START_OF_LINE + regex + r.END_OF_LINE) for regex in regexes)
+
+
+def intern(template: Template) -> Template:
+    """Return the canonical instance of *template*, sharing compiled patterns across the catalog"""
+    return _INTERNED.setdefault(template.fingerprint, template)
+
+
+def lowering_stats() -> Dict[str, int]:
+    """Hits and misses of the shared template lowering memo"""
+    return {**_STATS, "size": len(_REGEXES)}
+
+
+def clear_lowering_memo() -> None:
+    with _REGEXES_LOCK:
+        _REGEXES.clear()
+        _STATS.update(hits=0, misses=0)
@@ -0,0 +1,436 @@
+"""PostgreSQL identifiers, reserved keywords and literals
+
+Regex sources for the spec regex generator and the SQL tokenizer, and
+recognize, which finds the identifier, keyword or literal at a position by
+dispatching on its first character instead of trying one large alternation.
+
+Tokens are separated by ASCII whitespace only, see SPACE. Unquoted
+identifiers start with a letter, including non ASCII letters, or an
+underscore and continue with letters, digits, underscores and dollar signs.
+Quoted identifiers escape a double quote by doubling it and may be written
+U&"..." with unicode escapes. A reserved keyword, compared ignoring ASCII
+case, is never an unquoted identifier.
+
+Token based engines exclude reserved keywords with is_reserved. Spelling the
+exclusion out in every name of a generated regex would multiply its size, so
+statements are instead passed through prepare, which prefixes each reserved
+keyword with MARK. Name regexes cannot start with MARK, and the regexes of
+literals that are reserved keywords expect it. as_written turns such a regex
+into one matching unprepared statements, spelling the exclusion out.
+"""
+
+import re
+import string
+from enum import Enum
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+# Keywords PostgreSQL 13 reserves from use as table, column, function and type names
+RESERVED_KEYWORDS: FrozenSet[str] = frozenset(
+    [
+        "ALL",
+        "ANALYSE",
+        "ANALYZE",
+        "AND",
+        "ANY",
+        "ARRAY",
+        "AS",
+        "ASC",
+        "ASYMMETRIC",
+        "BOTH",
+        "CASE",
+        "CAST",
+        "CHECK",
+        "COLLATE",
+        "COLUMN",
+        "CONSTRAINT",
+        "CREATE",
+        "CURRENT_CATALOG",
+        "CURRENT_DATE",
+        "CURRENT_ROLE",
+        "CURRENT_TIME",
+        "CURRENT_TIMESTAMP",
+        "CURRENT_USER",
+        "DEFAULT",
+        "DEFERRABLE",
+        "DESC",
+        "DISTINCT",
+        "DO",
+        "ELSE",
+        "END",
+        "EXCEPT",
+        "FALSE",
+        "FETCH",
+        "FOR",
+        "FOREIGN",
+        "FROM",
+        "GRANT",
+        "GROUP",
+        "HAVING",
+        "IN",
+        "INITIALLY",
+        "INTERSECT",
+        "INTO",
+        "LATERAL",
+        "LEADING",
+        "LIMIT",
+        "LOCALTIME",
+        "LOCALTIMESTAMP",
+        "NOT",
+        "NULL",
+        "OFFSET",
+        "ON",
+        "ONLY",
+        "OR",
+        "ORDER",
+        "PLACING",
+        "PRIMARY",
+        "REFERENCES",
+        "RETURNING",
+        "SELECT",
+        "SESSION_USER",
+        "SOME",
+        "SYMMETRIC",
+        "TABLE",
+        "THEN",
+        "TO",
+        "TRAILING",
+        "TRUE",
+        "UNION",
+        "UNIQUE",
+        "USER",
+        "USING",
+        "VARIADIC",
+        "WHEN",
+        "WHERE",
+        "WINDOW",
+        "WITH",
+    ]
+)
+
+_ASCII_UPPER = str.maketrans(string.ascii_lowercase, string.ascii_uppercase)
+
+
+def is_reserved(word: str) -> bool:
+    """Is *word* a reserved keyword, ignoring ASCII case"""
+    return word.translate(_ASCII_UPPER) in RESERVED_KEYWORDS
+
+
+def trie_regex(words: Iterable[str], ignore_case: bool = False) -> str:
+    """Regex matching any of *words*, with common prefixes factored out
+
+    Each alternative starts with a distinct character, so the regex engine
+    rejects all but one of them on their first character
+    """
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        # Marks the end of a word
+        node[""] = {}
+
+    def char_regex(char: str) -> str:
+        if ignore_case and char in string.ascii_letters and char.upper() != char.lower():
+            return "[" + char.upper() + char.lower() + "]"
+        return re.escape(char)
+
+    def emit(node: Dict[str, Any]) -> str:
+        alternatives = [char_regex(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not alternatives:
+            return ""
+        if len(alternatives) == 1 and "" not in node:
+            return alternatives[0]
+        return "(?:" + "|".join(alternatives) + ")" + ("?" if "" in node else "")
+
+    return emit(trie)
+
+
+#################
+# Regex sources #
+#################
+
+
+def ascii_class(allowed: str) -> str:
+    """Character class of every non ASCII character and the ASCII ones in *allowed*
+
+    Spelled as the complement of the other ASCII characters, as a class
+    ranging over all of unicode takes the regex compiler milliseconds to build
+    """
+    excluded = [chr(x) for x in range(128) if chr(x) not in allowed]
+    ranges: List[List[str]] = []
+    for char in excluded:
+        if ranges and ord(char) == ord(ranges[-1][1]) + 1:
+            ranges[-1][1] = char
+        else:
+            ranges.append([char, char])
+    return "[^" + "".join(_class_char(a) + ("-" + _class_char(b) if b != a else "") for a, b in ranges) + "]"
+
+
+def _class_char(char: str) -> str:
+    if char.isprintable() and not char.isspace() and char not in "\\[]^-&~|":
+        return char
+    return "\\" + char if char in "\\[]^-&~|" else "\\x{:02x}".format(ord(char))
+
+
+# PostgreSQL separates tokens with ASCII whitespace only. Other whitespace,
+# e.g. a no-break space, is a non ASCII character like any other
+SPACE_CHARS = " \t\n\r\f\v"
+SPACE = r"[ \t\n\r\f\v]"
+NON_SPACE = r"[^ \t\n\r\f\v]"
+
+# PostgreSQL takes every non ASCII character for a letter
+IDENTIFIER_START = ascii_class(string.ascii_letters + "_")
+IDENTIFIER_CHAR = ascii_class(string.ascii_letters + string.digits + "_$")
+
+# Any unquoted word, including reserved keywords
+WORD = IDENTIFIER_START + IDENTIFIER_CHAR + "*"
+
+# Matches where a reserved keyword starts, not where a longer word merely begins with one
+RESERVED_KEYWORD = "(?:" + trie_regex(RESERVED_KEYWORDS, ignore_case=True) + ")(?!" + IDENTIFIER_CHAR + ")"
+
+UNQUOTED_IDENTIFIER = "(?!" + RESERVED_KEYWORD + ")" + WORD
+
+# Not empty, "" is an escaped double quote. Unrolled, so runs of other characters are consumed in one step
+QUOTED_IDENTIFIER = r'(?:[Uu]&)?"(?:[^"]|"")[^"]*(?:""[^"]*)*"'
+
+# Quoted first, so the U of U&"..." is not taken for a whole identifier
+IDENTIFIER = "(?:" + QUOTED_IDENTIFIER + "|" + UNQUOTED_IDENTIFIER + ")"
+
+# Standard strings double quotes to escape them, E'...' strings also take backslash escapes
+STRING = r"(?:[Ee]'[^'\\]*(?:(?:''|\\[\s\S])[^'\\]*)*'|(?:[BbXxNn]|[Uu]&)?'[^']*(?:''[^']*)*')"
+
+NUMBER = r"(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)(?:[Ee][+-]?[0-9]+)?"
+
+# Name of a dollar quote tag, like an identifier but without dollar signs
+DOLLAR_TAG_NAME = IDENTIFIER_START + ascii_class(string.ascii_letters + string.digits + "_") + "*"
+
+# Opening or closing tag of a dollar quoted string, e.g. $$ or $body$
+DOLLAR_TAG = r"\$(?:" + DOLLAR_TAG_NAME + r")?\$"
+
+
+##############
+# Recognizer #
+##############
+
+
+class TokenKind(str, Enum):
+    IDENTIFIER = "IDENTIFIER"
+    QUOTED_IDENTIFIER = "QUOTED_IDENTIFIER"
+    KEYWORD = "KEYWORD"
+    STRING = "STRING"
+    NUMBER = "NUMBER"
+    DOLLAR_QUOTED = "DOLLAR_QUOTED"
+
+    def __str__(self) -> str:
+        return str.__str__(self)
+
+    def __repr__(self) -> str:
+        return str.__str__(self)
+
+
+_WORD = re.compile(WORD)
+_QUOTED_IDENTIFIER = re.compile(QUOTED_IDENTIFIER)
+_STRING = re.compile(STRING)
+_NUMBER = re.compile(NUMBER)
+_DOLLAR_TAG = re.compile(DOLLAR_TAG)
+
+_IDENTIFIER_CHAR = re.compile(IDENTIFIER_CHAR)
+
+_SPACES = re.compile(SPACE + "+")
+# Whitespace to str.split that is not whitespace to PostgreSQL
+_OTHER_SPACE = re.compile(r"[^\S \t\n\r\f\v]")
+
+_DIGITS = frozenset(string.digits)
+
+# Letters that may prefix a string or quoted identifier, e.g. E'...' or U&"..."
+_PREFIXES = frozenset("EeBbXxNnUu")
+
+
+def recognize(text: str, pos: int = 0) -> Optional[Tuple[TokenKind, int]]:
+    """Kind and end offset of the identifier, keyword or literal starting at *pos* of *text*
+
+    None when there is none, or a quoted identifier or literal is unterminated
+    """
+    char = text[pos : pos + 1]
+    if not char:
+        return None
+
+    if char == '"':
+        match = _QUOTED_IDENTIFIER.match(text, pos)
+        return (TokenKind.QUOTED_IDENTIFIER, match.end()) if match else None
+
+    if char == "'":
+        match = _STRING.match(text, pos)
+        return (TokenKind.STRING, match.end()) if match else None
+
+    if char == "$":
+        tag = _DOLLAR_TAG.match(text, pos)
+        if tag is None:
+            return None
+        end = text.find(tag.group(), tag.end())
+        return (TokenKind.DOLLAR_QUOTED, end + len(tag.group())) if end >= 0 else None
+
+    if char in _DIGITS or (char == "." and text[pos + 1 : pos + 2] in _DIGITS):
+        match = _NUMBER.match(text, pos)
+        return (TokenKind.NUMBER, match.end()) if match else None
+
+    if char in _PREFIXES:
+        match = _STRING.match(text, pos)
+        if match is not None:
+            return TokenKind.STRING, match.end()
+        match = _QUOTED_IDENTIFIER.match(text, pos)
+        if match is not None:
+            return TokenKind.QUOTED_IDENTIFIER, match.end()
+
+    match = _WORD.match(text, pos)
+    if match is None:
+        return None
+    kind = TokenKind.KEYWORD if is_reserved(match.group()) else TokenKind.IDENTIFIER
+    return kind, match.end()
+
+
+def is_space(char: str) -> bool:
+    """Is *char*, a single character or empty, whitespace separating tokens"""
+    return char != "" and char in SPACE_CHARS
+
+
+def split(text: str) -> List[str]:
+    """Runs of non whitespace characters of *text*, like str.split but only splitting on SPACE"""
+    if _OTHER_SPACE.search(text) is None:
+        # Common case, str.split is much faster than a regex
+        return text.split()
+    return [x for x in _SPACES.split(text) if x]
+
+
+def is_identifier(text: str) -> bool:
+    """Is all of *text* an unquoted identifier or a quoted one"""
+    recognized = recognize(text)
+    return (
+        recognized is not None
+        and recognized[0] in (TokenKind.IDENTIFIER, TokenKind.QUOTED_IDENTIFIER)
+        and recognized[1] == len(text)
+    )
+
+
+###########
+# Marking #
+###########
+
+# Never part of SQL text, PostgreSQL rejects NUL characters
+MARK = "\x00"
+# The character itself rather than an escape, which character classes also
+# spell, so it only appears in a generated regex where a mark is expected
+MARK_REGEX = MARK
+
+# Characters that may start a quoted identifier or literal
+_QUOTE = re.compile("[\"'$]")
+# Prefixes each quote may have
+_QUOTE_PREFIXES = {'"': ["U&", "u&"], "'": ["U&", "u&", *"EeBbXxNn"]}
+# Runs of word characters are taken whole, so a keyword is only marked when it is the whole word
+_WORD_CHARS = re.compile(IDENTIFIER_CHAR + "+")
+
+# Marked form of each whitespace separated chunk seen by prepare
+_CHUNKS: Dict[str, str] = {}
+_CHUNKS_MAXSIZE = 4096
+
+
+def _outside_quotes(sql: str, mark: Callable[[str], str]) -> str:
+    """*sql* with *mark* applied to the text between quoted parts, unterminated ones run to the end"""
+    if '"' not in sql and "'" not in sql and "$" not in sql:
+        return mark(sql)
+    parts = []
+    pos = 0
+    found = _QUOTE.search(sql)
+    while found is not None:
+        start = found.start()
+        if sql[start] == "$":
+            tag = None if start and _IDENTIFIER_CHAR.match(sql, start - 1) else _DOLLAR_TAG.match(sql, start)
+            if tag is None:
+                found = _QUOTE.search(sql, start + 1)
+                continue
+            end = sql.find(tag.group(), tag.end())
+            end = len(sql) if end < 0 else end + len(tag.group())
+        else:
+            # Include a prefix, e.g. of E'...' whose backslash escapes decide where it ends
+            for prefix in _QUOTE_PREFIXES[sql[start]]:
+                before = start - len(prefix)
+                if before >= pos and sql.startswith(prefix, before):
+                    if before == 0 or not _IDENTIFIER_CHAR.match(sql, before - 1):
+                        start = before
+                        break
+            recognized = recognize(sql, start)
+            end = recognized[1] if recognized is not None else len(sql)
+        parts.append(mark(sql[pos:start]))
+        parts.append(sql[start:end])
+        pos = end
+        found = _QUOTE.search(sql, pos)
+    parts.append(mark(sql[pos:]))
+    return "".join(parts)
+
+
+def _mark(match: "re.Match[str]") -> str:
+    text = match.group()
+    return MARK + text if is_reserved(text) else text
+
+
+def _mark_words(text: str) -> str:
+    return _WORD_CHARS.sub(_mark, text)
+
+
+def _mark_chunk(chunk: str) -> str:
+    if chunk.isidentifier():
+        # All word characters, the common case
+        marked = MARK + chunk if is_reserved(chunk) else chunk
+    else:
+        marked = _mark_words(chunk)
+    if len(_CHUNKS) >= _CHUNKS_MAXSIZE:
+        _CHUNKS.clear()
+    _CHUNKS[chunk] = marked
+    return marked
+
+
+def _mark_chunks(text: str) -> str:
+    """Mark the words of *text*, collapsing whitespace between its chunks"""
+    chunks = split(text)
+    if not chunks:
+        return text
+    memo = _CHUNKS
+    marked = " ".join([memo.get(x) or _mark_chunk(x) for x in chunks])
+    if is_space(text[0]):
+        marked = text[: len(text) - len(text.lstrip(SPACE_CHARS))] + marked
+    if is_space(text[-1]):
+        marked += text[len(text.rstrip(SPACE_CHARS)) :]
+    return marked
+
+
+def mark_reserved(sql: str) -> str:
+    """*sql* with MARK before each reserved keyword outside quotes"""
+    return _outside_quotes(sql, _mark_words)
+
+
+@lru_cache(maxsize=64)
+def prepare(sql: str) -> str:
+    """*sql* as generated regexes match it, with reserved keywords marked
+
+    Whitespace between words outside quotes, which no template can tell apart,
+    is collapsed. Unquoted text is split into chunks with split and each marked
+    once per process, which is much faster than scanning it with a regex.
+    Cached, as a statement is usually matched against several templates in a
+    row.
+    """
+    return _outside_quotes(sql, _mark_chunks)
+
+
+def unmark(text: str) -> str:
+    """*text*, a statement or a generated regex, without marks"""
+    return text.replace(MARK, "")
+
+
+def as_written(regex: str) -> str:
+    """*regex*, generated to match prepared statements, matching statements as they are written
+
+    Marks are removed and every unquoted name excludes reserved keywords with
+    a lookahead instead, so both regexes match the same statements
+    """
+    return unmark(regex).replace(WORD, UNQUOTED_IDENTIFIER)
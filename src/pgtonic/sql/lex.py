@@ -0,0 +1,60 @@
+import re
+from enum import Enum
+from typing import Dict, List, NamedTuple
+
+from pgtonic.sql import identifiers
+
+
+class Kind(str, Enum):
+    WORD = "WORD"
+    QUOTED = "QUOTED"
+    PUNCTUATION = "PUNCTUATION"
+    WHITESPACE = "WHITESPACE"
+
+    def __str__(self) -> str:
+        return str.__str__(self)
+
+    def __repr__(self) -> str:
+        return str.__str__(self)
+
+
+class SqlToken(NamedTuple):
+    kind: Kind
+    text: str
+    # Offsets of the token in the statement
+    start: int
+    end: int
+
+
+# Tokens are tried in order, the first to match wins
+KIND_MAP: Dict[Kind, str] = {
+    Kind.WHITESPACE: identifiers.SPACE + "+",
+    # Before WORD, so the U of U&"..." is not a word
+    Kind.QUOTED: identifiers.QUOTED_IDENTIFIER,
+    Kind.WORD: identifiers.WORD,
+    Kind.PUNCTUATION: identifiers.NON_SPACE,
+}
+
+SCANNER = re.compile("|".join(f"(?P<{kind.value}>{pattern})" for kind, pattern in KIND_MAP.items()))
+
+_KINDS = {kind.value: kind for kind in KIND_MAP}
+
+
+def tokenize(sql: str) -> List[SqlToken]:
+    """Split a SQL statement into words, quoted identifiers and punctuation, dropping whitespace"""
+    tokens = []
+    for m in SCANNER.finditer(sql):
+        kind = _KINDS[m.lastgroup]  # type: ignore
+        if kind != Kind.WHITESPACE:
+            tokens.append(SqlToken(kind, m.group(), m.start(), m.end()))
+    return tokens
+
+
+def is_identifier(token: SqlToken) -> bool:
+    """Can *token* be a name, reserved keywords can only be one when quoted"""
+    return token.kind == Kind.QUOTED or (token.kind == Kind.WORD and not identifiers.is_reserved(token.text))
+
+
+def has_gap(tokens: List[SqlToken], ix: int) -> bool:
+    """Is there whitespace between tokens[ix - 1] and tokens[ix]"""
+    return 0 < ix < len(tokens) and tokens[ix].start > tokens[ix - 1].end
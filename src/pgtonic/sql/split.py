@@ -0,0 +1,257 @@
+import re
+from dataclasses import dataclass
+from enum import Enum
+from typing import IO, Iterable, Iterator, List, Tuple
+
+from pgtonic.spec import regex as r
+from pgtonic.sql import identifiers
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Characters that may change the lexical state outside of quotes and comments
+_SPECIAL = re.compile("[" + re.escape(r.SEMICOLON + "'\"$-/") + "]")
+_BLOCK_COMMENT = re.compile(r"/\*|\*/")
+_ESCAPE_STRING = re.compile(r"[\\']")
+_DOLLAR_TAG = re.compile(identifiers.DOLLAR_TAG)
+# Could become a dollar quote tag once more input arrives
+_PARTIAL_DOLLAR_TAG = re.compile(r"\$(?:" + identifiers.DOLLAR_TAG_NAME + r")?\Z")
+
+
+class State(str, Enum):
+    NORMAL = "NORMAL"
+    SINGLE_QUOTE = "SINGLE_QUOTE"
+    ESCAPE_STRING = "ESCAPE_STRING"
+    DOUBLE_QUOTE = "DOUBLE_QUOTE"
+    LINE_COMMENT = "LINE_COMMENT"
+    BLOCK_COMMENT = "BLOCK_COMMENT"
+    DOLLAR_QUOTE = "DOLLAR_QUOTE"
+
+    def __str__(self) -> str:
+        return str.__str__(self)
+
+    def __repr__(self) -> str:
+        return str.__str__(self)
+
+
+@dataclass(frozen=True)
+class Statement:
+    # Statement text without the terminating semicolon. Comments are
+    # replaced by a single space and surrounding whitespace is stripped
+    text: str
+    # Offsets into the input of the statement's source, including the semicolon
+    start: int
+    end: int
+    # 1-based line on which the statement text starts
+    line: int
+
+
+class StatementSplitter:
+    """Incrementally split SQL on semicolons
+
+    Semicolons inside quoted identifiers, string literals, dollar quoted
+    strings and comments do not terminate a statement. Only the statement
+    currently being read is held in memory.
+    """
+
+    def __init__(self, offset: int = 0, line: int = 1) -> None:
+        """*offset* and *line* locate the start of the input, when it is not the start of a file"""
+        self._buf = ""
+        # Offset of _buf[0] in the input
+        self._offset = offset
+        # Start of the current statement in _buf
+        self._start = 0
+        # Position in _buf to resume scanning from
+        self._pos = 0
+        # Line number of _buf[_start]
+        self._line = line
+        self._state = State.NORMAL
+        self._comment_start = 0
+        self._comment_depth = 0
+        self._dollar_tag = ""
+        # Comment spans of the current statement in _buf
+        self._comments: List[Tuple[int, int]] = []
+
+    def feed(self, text: str) -> List[Statement]:
+        """Consume *text* and return the statements it completes"""
+        if self._start > 0:
+            self._buf = self._buf[self._start :]
+            self._offset += self._start
+            self._pos -= self._start
+            self._comment_start -= self._start
+            self._comments = [(a - self._start, b - self._start) for a, b in self._comments]
+            self._start = 0
+        self._buf += text
+        return self._scan(final=False)
+
+    def close(self) -> List[Statement]:
+        """Signal end of input and return the final unterminated statement, if any"""
+        statements = self._scan(final=True)
+        if self._state in (State.LINE_COMMENT, State.BLOCK_COMMENT):
+            self._comments.append((self._comment_start, len(self._buf)))
+        statements.extend(self._emit(len(self._buf), len(self._buf)))
+        self._state = State.NORMAL
+        return statements
+
+    def _emit(self, stop: int, resume: int) -> List[Statement]:
+        """Close the statement ending at *stop* and start the next one at *resume*"""
+        buf, start = self._buf, self._start
+        pieces = []
+        first = None
+        cursor = start
+        for comment_start, comment_end in self._comments + [(stop, stop)]:
+            piece = buf[cursor:comment_start]
+            if first is None and piece.strip(identifiers.SPACE_CHARS):
+                first = cursor + len(piece) - len(piece.lstrip(identifiers.SPACE_CHARS))
+            pieces.append(piece)
+            cursor = comment_end
+        text = " ".join(pieces).strip(identifiers.SPACE_CHARS)
+
+        statements = []
+        if text:
+            assert first is not None
+            line = self._line + buf.count("\n", start, first)
+            statements.append(Statement(text, self._offset + start, self._offset + resume, line))
+
+        self._line += buf.count("\n", start, resume)
+        self._start = resume
+        self._comments = []
+        return statements
+
+    def _scan(self, final: bool) -> List[Statement]:
+        statements: List[Statement] = []
+        buf = self._buf
+        size = len(buf)
+        pos = self._pos
+
+        while pos < size:
+            state = self._state
+
+            if state == State.NORMAL:
+                match = _SPECIAL.search(buf, pos)
+                if match is None:
+                    pos = size
+                    break
+                ix = match.start()
+                char = buf[ix]
+                if char == r.SEMICOLON:
+                    statements.extend(self._emit(ix, ix + 1))
+                    pos = ix + 1
+                elif char == "'":
+                    escaped = ix > 0 and buf[ix - 1] in "Ee" and (ix < 2 or not _is_word_char(buf[ix - 2]))
+                    self._state = State.ESCAPE_STRING if escaped else State.SINGLE_QUOTE
+                    pos = ix + 1
+                elif char == '"':
+                    self._state = State.DOUBLE_QUOTE
+                    pos = ix + 1
+                elif char in "-/":
+                    if ix + 1 == size and not final:
+                        # Need the next character to tell if a comment starts
+                        pos = ix
+                        break
+                    if buf[ix : ix + 2] == "--":
+                        self._state = State.LINE_COMMENT
+                        self._comment_start = ix
+                        pos = ix + 2
+                    elif buf[ix : ix + 2] == "/*":
+                        self._state = State.BLOCK_COMMENT
+                        self._comment_start = ix
+                        self._comment_depth = 1
+                        pos = ix + 2
+                    else:
+                        pos = ix + 1
+                else:
+                    # Dollar sign, a quote tag unless it continues an identifier or parameter
+                    if ix > 0 and _is_word_char(buf[ix - 1]):
+                        pos = ix + 1
+                        continue
+                    tag = _DOLLAR_TAG.match(buf, ix)
+                    if tag is not None:
+                        self._state = State.DOLLAR_QUOTE
+                        self._dollar_tag = tag.group()
+                        pos = tag.end()
+                    elif not final and _PARTIAL_DOLLAR_TAG.match(buf, ix):
+                        pos = ix
+                        break
+                    else:
+                        pos = ix + 1
+
+            elif state in (State.SINGLE_QUOTE, State.DOUBLE_QUOTE):
+                quote = "'" if state == State.SINGLE_QUOTE else '"'
+                ix = buf.find(quote, pos)
+                if ix == -1:
+                    pos = size
+                    break
+                if ix + 1 == size and not final:
+                    # Need the next character to tell if the quote is escaped
+                    pos = ix
+                    break
+                if buf[ix + 1 : ix + 2] == quote:
+                    pos = ix + 2
+                else:
+                    self._state = State.NORMAL
+                    pos = ix + 1
+
+            elif state == State.ESCAPE_STRING:
+                match = _ESCAPE_STRING.search(buf, pos)
+                if match is None:
+                    pos = size
+                    break
+                ix = match.start()
+                if ix + 1 == size and not final:
+                    pos = ix
+                    break
+                if buf[ix] == "\\" or buf[ix + 1 : ix + 2] == "'":
+                    pos = ix + 2
+                else:
+                    self._state = State.NORMAL
+                    pos = ix + 1
+
+            elif state == State.LINE_COMMENT:
+                ix = buf.find("\n", pos)
+                if ix == -1:
+                    pos = size
+                    break
+                self._comments.append((self._comment_start, ix))
+                self._state = State.NORMAL
+                pos = ix
+
+            elif state == State.BLOCK_COMMENT:
+                match = _BLOCK_COMMENT.search(buf, pos)
+                if match is None:
+                    # The last character may begin a comment delimiter
+                    pos = max(pos, size - 1)
+                    break
+                self._comment_depth += 1 if match.group() == "/*" else -1
+                pos = match.end()
+                if self._comment_depth == 0:
+                    self._comments.append((self._comment_start, pos))
+                    self._state = State.NORMAL
+
+            else:
+                ix = buf.find(self._dollar_tag, pos)
+                if ix == -1:
+                    # The tail may begin the closing tag
+                    pos = max(pos, size - len(self._dollar_tag) + 1)
+                    break
+                self._state = State.NORMAL
+                pos = ix + len(self._dollar_tag)
+
+        self._pos = pos
+        return statements
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char in "_$"
+
+
+def split_statements(chunks: Iterable[str]) -> Iterator[Statement]:
+    """Lazily split a stream of SQL text chunks into statements"""
+    splitter = StatementSplitter()
+    for chunk in chunks:
+        yield from splitter.feed(chunk)
+    yield from splitter.close()
+
+
+def read_chunks(stream: IO[str], size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    """Read *stream* in chunks of *size* characters"""
+    return iter(lambda: stream.read(size), "")
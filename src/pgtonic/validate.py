@@ -0,0 +1,42 @@
+from dataclasses import dataclass
+from typing import IO, TYPE_CHECKING, Iterable, Iterator, Optional, Union
+
+from pgtonic.pg13.registry import REGISTRY
+from pgtonic.spec.registry import Registry
+from pgtonic.spec.template import Template
+from pgtonic.sql.split import (
+    DEFAULT_CHUNK_SIZE,
+    Statement,
+    read_chunks,
+    split_statements,
+)
+
+if TYPE_CHECKING:
+    from pgtonic.result_cache import ResultCache
+
+
+@dataclass(frozen=True)
+class Result:
+    statement: Statement
+    # The first template the statement matched
+    template: Optional[Template]
+
+    @property
+    def is_match(self) -> bool:
+        return self.template is not None
+
+
+def validate(chunks: Iterable[str], registry: Union[Registry, "ResultCache"] = REGISTRY) -> Iterator[Result]:
+    """Lazily split and match a stream of SQL text chunks
+
+    *registry* may be a ResultCache in front of a registry
+    """
+    for statement in split_statements(chunks):
+        yield Result(statement, registry.find(statement.text))
+
+
+def validate_file(
+    stream: IO[str], registry: Union[Registry, "ResultCache"] = REGISTRY, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[Result]:
+    """Lazily split and match the statements in a SQL file"""
+    return validate(read_chunks(stream, chunk_size), registry)
@@ -1,23 +1,37 @@
 import pytest
 
 from pgtonic.pg13.create_trigger import TEMPLATES
+from pgtonic.spec.engine import Engine
+from pgtonic.spec.parse.ast_passes import Lowering
 
+CASES = [
+    ("CREATE TRIGGER my_trig AFTER INSERT ON api.account EXECUTE FUNCTION oli.func ()", True),
+    ("CREATE TRIGGER my_trig AFTER INSERT ON api.account EXECUTE FUNCTION oli.func ( param1 )", True),
+    ("CREATE TRIGGER my_trig AFTER INSERT ON api.account EXECUTE FUNCTION oli.func( param1 )", True),
+    ("CREATE CONSTRAINT TRIGGER my_trig AFTER INSERT ON api.account EXECUTE FUNCTION oli.func( param1)", True),
+    ("CREATE TRIGGER my_trig AFTER INSERT ON api.account EXECUTE FUNCTION oli.func(param1 )", True),
+    ("CREATE TRIGGER my_trig AFTER INSERT ON api.account EXECUTE FUNCTION oli.func(param1,param2 )", True),
+    ("CREATE TRIGGER my_trig AFTER INSERT ON api.account EXECUTE FUNCTION oli.func(param1, param2 )", True),
+    (
+        "CREATE TRIGGER my_trig BEFORE INSERT OR DELETE OR UPDATE ON public.book EXECUTE PROCEDURE somefunc( param1 )",
+        True,
+    ),
+    (
+        "CREATE TRIGGER my_trig AFTER UPDATE ON book REFERENCING OLD TABLE AS old NEW TABLE new "
+        "FOR EACH STATEMENT EXECUTE FUNCTION func()",
+        True,
+    ),
+    ("CREATE TRIGGER my_trig AFTER UPDATE ON book REFERENCING OLD TABLE old x EXECUTE FUNCTION func()", False),
+    ("CREATE TRIGGER my_trig AFTER INSERTORDELETE ON book EXECUTE FUNCTION func()", False),
+]
 
-@pytest.mark.parametrize(
-    "sql,is_match",
-    [
-        ("CREATE TRIGGER my_trig AFTER INSERT ON api.account EXECUTE FUNCTION oli.func ()", True),
-        ("CREATE TRIGGER my_trig AFTER INSERT ON api.account EXECUTE FUNCTION oli.func ( param1 )", True),
-        ("CREATE TRIGGER my_trig AFTER INSERT ON api.account EXECUTE FUNCTION oli.func( param1 )", True),
-        ("CREATE CONSTRAINT TRIGGER my_trig AFTER INSERT ON api.account EXECUTE FUNCTION oli.func( param1)", True),
-        ("CREATE TRIGGER my_trig AFTER INSERT ON api.account EXECUTE FUNCTION oli.func(param1 )", True),
-        ("CREATE TRIGGER my_trig AFTER INSERT ON api.account EXECUTE FUNCTION oli.func(param1,param2 )", True),
-        ("CREATE TRIGGER my_trig AFTER INSERT ON api.account EXECUTE FUNCTION oli.func(param1, param2 )", True),
-        (
-            "CREATE TRIGGER my_trig BEFORE INSERT OR DELETE OR UPDATE ON public.book EXECUTE PROCEDURE somefunc( param1 )",
-            True,
-        ),
-    ],
-)
-def test_pg13_grant(sql: str, is_match: bool) -> None:
-    assert any([x.is_match(sql) for x in TEMPLATES]) == is_match
+
+@pytest.mark.parametrize("lowering", list(Lowering))
+@pytest.mark.parametrize("sql,is_match", CASES)
+def test_pg13_create_trigger(sql: str, is_match: bool, lowering: Lowering) -> None:
+    assert any([x.compile(lowering).is_match(sql) for x in TEMPLATES]) == is_match
+
+
+@pytest.mark.parametrize("sql,is_match", CASES)
+def test_pg13_create_trigger_tokens(sql: str, is_match: bool) -> None:
+    assert any([x.is_match(sql, Engine.TOKENS) for x in TEMPLATES]) == is_match
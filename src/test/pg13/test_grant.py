@@ -1,32 +1,75 @@
 import pytest
 
 from pgtonic.pg13.grant import TEMPLATES
+from pgtonic.spec.engine import Engine
+from pgtonic.spec.parse.ast_passes import Lowering
+from pgtonic.spec.template import Template
 
+CASES = [
+    ("GRANT UPDATE ON TABLE public.account TO oliver", True),
+    ("GRANT UPDATE ON TABLE public.account TO GROUP oliver", True),
+    ("GRANT UPDATE ON TABLE public.account TO CURRENT_USER", True),
+    ("GRANT UPDATE ON TABLE public.account TO oliver", True),
+    ("GRANT SELECT ON TABLE public.account, book TO oliver", True),
+    ("GRANT SELECT ON TABLE public.account, book, author TO oliver, anon", True),
+    ("GRANT SELECT ON ALL TABLES IN SCHEMA api, public TO oliver, anon", True),
+    ("GRANT SELECT ON ALL TABLES IN SCHEMA api TO oliver, anon WITH GRANT OPTION", True),
+    ("GRANT ALL ON ALL TABLES IN SCHEMA api, other TO oliver, anon", True),
+    ("GRANT REFERENCES ON public.account TO oliver WITH GRANT OPTION", True),
+    ("GRANT TRIGGER ON public.account TO oliver, anon WITH GRANT OPTION", True),
+    ("GRANT UPDATE ON TABLE public.account TO oliver WITH", False),
+    ("GRANT UPDATE ON TABLE account TABLE other TO oliver WITH", False),
+    ("GRANT UPDATE ON TABLE TO oliver WITH", False),
+    ("GRANT UPDATE ON TABLE account TO", False),
+    ("GRANT UPDATE ON TABLE account TO ", False),
+    ("GRANT UPDATEON TABLE account TO oliver", False),
+    ("GRANT UPDATE ON accountTO oliver", False),
+    ("GRANT UPDATE ALL ON account TO oliver", False),
+    ("GRANT UPDATE ALL ON account TO oliver", False),
+]
 
+
+@pytest.mark.parametrize("lowering", list(Lowering))
+@pytest.mark.parametrize("sql,is_match", CASES)
+def test_pg13_grant(sql: str, is_match: bool, lowering: Lowering) -> None:
+    assert any([x.compile(lowering).is_match(sql) for x in TEMPLATES]) == is_match
+
+
+@pytest.mark.parametrize("sql,is_match", CASES)
+def test_pg13_grant_original(sql: str, is_match: bool) -> None:
+    # The corrected spec only names the privilege list
+    (template,) = TEMPLATES
+    assert Template(template.original, where=template.where).is_match(sql) == is_match
+
+
+@pytest.mark.parametrize("sql,is_match", CASES)
+def test_pg13_grant_tokens(sql: str, is_match: bool) -> None:
+    assert any([x.is_match(sql, Engine.TOKENS) for x in TEMPLATES]) == is_match
+
+
+@pytest.mark.parametrize("lowering", list(Lowering))
 @pytest.mark.parametrize(
-    "sql,is_match",
+    "sql,groups",
     [
-        ("GRANT UPDATE ON TABLE public.account TO oliver", True),
-        ("GRANT UPDATE ON TABLE public.account TO GROUP oliver", True),
-        ("GRANT UPDATE ON TABLE public.account TO CURRENT_USER", True),
-        ("GRANT UPDATE ON TABLE public.account TO oliver", True),
-        ("GRANT SELECT ON TABLE public.account, book TO oliver", True),
-        ("GRANT SELECT ON TABLE public.account, book, author TO oliver, anon", True),
-        ("GRANT SELECT ON ALL TABLES IN SCHEMA api, public TO oliver, anon", True),
-        ("GRANT SELECT ON ALL TABLES IN SCHEMA api TO oliver, anon WITH GRANT OPTION", True),
-        ("GRANT ALL ON ALL TABLES IN SCHEMA api, other TO oliver, anon", True),
-        ("GRANT REFERENCES ON public.account TO oliver WITH GRANT OPTION", True),
-        ("GRANT TRIGGER ON public.account TO oliver, anon WITH GRANT OPTION", True),
-        ("GRANT UPDATE ON TABLE public.account TO oliver WITH", False),
-        ("GRANT UPDATE ON TABLE account TABLE other TO oliver WITH", False),
-        ("GRANT UPDATE ON TABLE TO oliver WITH", False),
-        ("GRANT UPDATE ON TABLE account TO", False),
-        ("GRANT UPDATE ON TABLE account TO ", False),
-        ("GRANT UPDATEON TABLE account TO oliver", False),
-        ("GRANT UPDATE ON accountTO oliver", False),
-        ("GRANT UPDATE ALL ON account TO oliver", False),
-        ("GRANT UPDATE ALL ON account TO oliver", False),
+        (
+            "GRANT SELECT, UPDATE ON TABLE public.account, book TO oliver, GROUP anon WITH GRANT OPTION",
+            {
+                "privilege": ["SELECT", "UPDATE"],
+                "table_name": ["public.account", "book"],
+                "role_specification": ["oliver", "GROUP anon"],
+            },
+        ),
+        (
+            "GRANT ALL ON ALL TABLES IN SCHEMA api,other TO CURRENT_USER",
+            {"schema_name": ["api", "other"], "role_specification": ["CURRENT_USER"]},
+        ),
     ],
 )
-def test_pg13_grant(sql: str, is_match: bool) -> None:
-    assert any([x.is_match(sql) for x in TEMPLATES]) == is_match
+def test_pg13_grant_match(sql: str, groups, lowering: Lowering) -> None:
+    match = TEMPLATES[0].match(sql, lowering)
+    assert match is not None
+    assert match.groups == groups
+
+
+def test_pg13_grant_match_fails() -> None:
+    assert TEMPLATES[0].match("GRANT UPDATE ON TABLE account TO") is None
@@ -0,0 +1,93 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from test_create_trigger import CASES as CREATE_TRIGGER_CASES
+from test_grant import CASES as GRANT_CASES
+
+from pgtonic.pg13 import create_trigger, grant
+from pgtonic.pg13.registry import REGISTRY
+
+
+@pytest.mark.parametrize(
+    "sql,templates",
+    [
+        ("GRANT SELECT ON account TO oliver", grant.TEMPLATES),
+        ("grant select on account to oliver", grant.TEMPLATES),
+        ("CREATE TRIGGER my_trig AFTER INSERT", create_trigger.TEMPLATES),
+        ("CREATE CONSTRAINT TRIGGER my_trig AFTER INSERT", create_trigger.TEMPLATES),
+        ("CREATE TABLE account (id int)", []),
+        ("SELECT 1", []),
+        ("", []),
+    ],
+)
+def test_candidates(sql: str, templates) -> None:
+    assert REGISTRY.candidates(sql) == templates
+
+
+@pytest.mark.parametrize(
+    "sql,template",
+    [
+        ("GRANT TRIGGER ON public.account TO oliver, anon WITH GRANT OPTION", grant.TEMPLATES[0]),
+        (
+            "CREATE TRIGGER my_trig AFTER INSERT ON api.account EXECUTE FUNCTION oli.func ()",
+            create_trigger.TEMPLATES[0],
+        ),
+        ("GRANT UPDATE ON TABLE account TO", None),
+        ("CREATE TRIGGER my_trig", None),
+    ],
+)
+def test_find(sql: str, template) -> None:
+    assert REGISTRY.find(sql) is template
+
+
+def test_registry_contains_catalog() -> None:
+    assert len(REGISTRY) == len(grant.TEMPLATES) + len(create_trigger.TEMPLATES)
+
+
+@pytest.mark.parametrize("sql,is_match", [*GRANT_CASES, *CREATE_TRIGGER_CASES])
+def test_find_all(sql: str, is_match: bool) -> None:
+    assert bool(REGISTRY.find_all(sql)) == is_match
+    assert REGISTRY.find_all(sql) == [x for x in REGISTRY if x.is_match(sql)]
+
+
+def test_catalog_is_lazy() -> None:
+    code = (
+        "import sys; from pgtonic.pg13.registry import REGISTRY; "
+        "assert 'pgtonic.pg13.grant' not in sys.modules; "
+        "REGISTRY.find('GRANT SELECT ON account TO oliver'); "
+        "assert 'pgtonic.pg13.grant' in sys.modules; "
+        "assert 'pgtonic.pg13.create_trigger' not in sys.modules"
+    )
+    subprocess.run(
+        [sys.executable, "-c", code], check=True, env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    )
+
+
+def test_catalog_attribute_access() -> None:
+    import pgtonic.pg13
+
+    assert pgtonic.pg13.grant.TEMPLATES == grant.TEMPLATES
+    with pytest.raises(AttributeError):
+        pgtonic.pg13.missing
+
+
+@pytest.mark.parametrize(
+    "sql,template,message",
+    [
+        ("GRANT SELECT ON account TO oliver", grant.TEMPLATES[0], "Matches"),
+        ("GRANT SELECT ON account TO", grant.TEMPLATES[0], "Expected CURRENT_USER or GROUP or "),
+        (
+            "CREATE TRIGGER t AFTER INSERT ON account EXECUTE func()",
+            create_trigger.TEMPLATES[0],
+            "Expected FUNCTION or PROCEDURE at line 1, column 50, found 'func'",
+        ),
+        # No template starts with DROP
+        ("DROP TABLE account", None, "Expected CREATE or GRANT at line 1, column 1, found 'DROP'"),
+    ],
+)
+def test_explain(sql: str, template, message: str) -> None:
+    explanation = REGISTRY.explain(sql)
+    assert explanation.template is template
+    assert str(explanation).startswith(message)
@@ -0,0 +1,44 @@
+import re
+
+import pytest
+
+from pgtonic.pg13.registry import REGISTRY
+from pgtonic.spec import regex as r
+from pgtonic.spec.analyze import (
+    NESTED_REPEAT,
+    NULLABLE_REPEAT,
+    OPTIONAL_OVERLAP,
+    find_ambiguities,
+)
+from pgtonic.spec.template import Template
+
+
+@pytest.mark.parametrize("template", list(REGISTRY))
+def test_pg13_unambiguous(template: Template) -> None:
+    assert find_ambiguities(template) == []
+
+
+@pytest.mark.parametrize(
+    "template,codes",
+    [
+        (Template("A { [ B ] } [, ...]"), [NULLABLE_REPEAT]),
+        (Template("A x [, ...]", where={"x": Template("NAME [, ...]")}), [NESTED_REPEAT]),
+        (Template("A { [ NAME ] NAME } [, ...]"), [OPTIONAL_OVERLAP]),
+        (Template("A [ NAME ] NAME"), []),
+        (Template("A { [ B ] NAME } [, ...]"), []),
+    ],
+)
+def test_find_ambiguities(template: Template, codes) -> None:
+    assert [x.code for x in find_ambiguities(template)] == codes
+
+
+def test_whitespace_repeat_items_cannot_backtrack() -> None:
+    # Separating items with a pattern that could also match inside an item used
+    # to backtrack exponentially in the number of items on near misses, timed by
+    # benchmarks/bench_adversarial.py. Items are atomic names without whitespace
+    template = Template("A name [ ... ] B", where={"name": Template("{ NAME }")})
+    assert find_ambiguities(template) == []
+    assert re.search(r.WHITESPACE, r.NAME) is None and re.fullmatch(r.NAME, "a b") is None
+    if r.ATOMIC_GROUPS:
+        assert r.NAME.startswith("(?>") and r.NAME in template._marked_regex()
+    assert not template.is_match("A " + " ".join(["abcdefgh"] * 50) + " !")
@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from pgtonic.spec.automaton import Dfa, build_dfa, symbols
+from pgtonic.spec.template import Template
+
+
+@pytest.mark.parametrize(
+    "spec,sql,is_match",
+    [
+        ("SELECT NAME", "SELECT account", True),
+        ("SELECT NAME", "SELECT public.account", True),
+        ("SELECT NAME", 'SELECT "Account"', True),
+        ("SELECT NAME", "SELECT public . account", False),
+        ("SELECT NAME", "SELECTaccount", False),
+        ("SELECT NAME", " SELECT account", False),
+        ("SELECT NAME", "SELECT account\n", True),
+        ("SELECT NAME", "SELECT account ", False),
+        ("SELECT [ ALL ] NAME", "SELECT account", True),
+        ("SELECT [ ALL ] NAME", "SELECT ALL account", True),
+        ("SELECT [ ALL ] NAME", "SELECTALL account", False),
+        ("[ ALL ] SELECT", "SELECT", True),
+        ("[ ALL ] SELECT", "ALL SELECT", True),
+        ("SELECT NAME [, ...]", "SELECT a,b , c", True),
+        ("SELECT NAME [, ...]", "SELECT a,", False),
+        ("SELECT NAME [ OR ... ]", "SELECT a OR b", True),
+        ("SELECT NAME [ OR ... ]", "SELECT a ORb", False),
+        ("SELECT UNQUALIFIED_NAME [ ... ]", "SELECT a b c", True),
+        ("EXECUTE NAME ( [ NAME ] )", "EXECUTE a()", True),
+        ("EXECUTE NAME ( [ NAME ] )", "EXECUTE a ( b )", True),
+        ("EXECUTE NAME ( [ NAME ] )", "EXECUTE a (b c)", False),
+        ("SELECT { ALL | ANY }", "SELECT ANY", True),
+        ("SELECT { ALL | ANY }", "SELECT SOME", False),
+        ("SELECT *", "SELECT *", True),
+        ("SELECT NAME", "SELECT table", False),
+        ("SELECT NAME", 'SELECT "table"', True),
+        ("SELECT NAME", "SELECT tables", True),
+        ("SELECT NAME", "SELECT ñandú", True),
+        ("SELECT NAME", 'SELECT U&"a"', True),
+        ("SELECT NAME", 'SELECT "a""b"', True),
+        ("SELECT { NAME | ALL }", "SELECT ALL", True),
+        ("SELECT { NAME | ALL }", "SELECT all", False),
+    ],
+)
+def test_automaton(spec: str, sql: str, is_match: bool) -> None:
+    template = Template(spec)
+    assert template.is_match(sql) == is_match
+    assert (build_dfa([template]).match(sql) == (0,)) == is_match
+
+
+def test_automaton_merges_templates() -> None:
+    templates = [Template("SELECT NAME"), Template("SELECT CASCADE"), Template("DROP NAME"), Template("SELECT ALL")]
+    dfa = build_dfa(templates)
+    assert dfa.match("SELECT CASCADE") == (0, 1)
+    assert dfa.match("SELECT other") == (0,)
+    assert dfa.match("DROP CASCADE") == (2,)
+    assert dfa.match("DROP") == ()
+    # Reserved keywords are never names
+    assert dfa.match("SELECT ALL") == (3,)
+    assert dfa.match("DROP ALL") == ()
+    assert dfa.match("DROP table") == ()
+
+
+def test_automaton_is_minimal() -> None:
+    # Both branches continue identically, so share their states
+    dfa = build_dfa([Template("SELECT { ALL | ANY } NAME")])
+    # start, SELECT, gap, ALL or ANY, gap, name, dot, qualified name
+    assert len(dfa.transitions) == 8
+
+
+def test_automaton_serializes() -> None:
+    dfa = build_dfa([Template("SELECT NAME [, ...]"), Template("DROP NAME")])
+    loaded = Dfa.from_dict(json.loads(json.dumps(dfa.to_dict())))
+    assert loaded == dfa
+    assert loaded.match("DROP a") == (1,)
+
+
+def test_symbols() -> None:
+    assert symbols(" SELECT") is None
+    assert [text for _, text in symbols("SELECT a.b ,c")] == ["SELECT", "<GAP>", "a", ".", "b", "<GAP>", ",", "c"]
@@ -0,0 +1,84 @@
+from pathlib import Path
+
+import pytest
+
+from pgtonic.spec import cache
+from pgtonic.spec import regex as r
+from pgtonic.spec.registry import Registry
+from pgtonic.spec.template import Template
+
+
+@pytest.fixture
+def cache_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setenv(cache.CACHE_DIR_ENV, str(tmp_path))
+    return tmp_path
+
+
+def test_cache_disabled(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.delenv(cache.CACHE_DIR_ENV, raising=False)
+    assert cache.cache_dir() is None
+    cache.store("regexes", "key", ["a"])
+    assert cache.load("regexes", "key") is None
+
+
+def test_cache_round_trip(cache_dir: Path) -> None:
+    cache.store("regexes", "key", ["a", "b"])
+    assert cache.load("regexes", "key") == ["a", "b"]
+    assert cache.load("regexes", "other") is None
+
+
+def test_compile_reads_cache(cache_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    assert Template("SELECT NAME").is_match("SELECT account")
+
+    # A fresh process starts from new Template instances and must not lower again
+    def fail(*args, **kwargs):
+        raise AssertionError("template was lowered")
+
+    monkeypatch.setattr(Template, "lowered", fail)
+    assert Template("SELECT NAME").is_match("SELECT account")
+    with pytest.raises(AssertionError):
+        Template("DROP NAME").is_match("DROP account")
+
+
+def test_cache_dir_per_generator(cache_dir: Path) -> None:
+    assert cache.cache_dir().name.endswith(r.GENERATOR)
+
+
+def test_generator_covers_sources(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    assert Path(r.__file__) in r._GENERATOR_SOURCES
+    assert Path(r.identifiers.__file__) in r._GENERATOR_SOURCES
+    assert r._digest() == r.GENERATOR
+
+    # e.g. a change to how types.py lowers a node
+    source = tmp_path / "spec" / "parse" / "types.py"
+    source.parent.mkdir(parents=True)
+    source.write_text("x = 1")
+    monkeypatch.setattr(r, "_PACKAGE", tmp_path)
+    monkeypatch.setattr(r, "_GENERATOR_SOURCES", [source])
+    before = r._digest()
+    source.write_text("x = 2")
+    assert r._digest() != before
+
+
+def test_uncompilable_entry_is_a_miss(cache_dir: Path) -> None:
+    # e.g. atomic groups cached by a newer Python
+    key = "{}-OPTIONAL".format(Template("SELECT NAME").fingerprint)
+    cache.store("compiled", key, {"regexes": ["(?>"], "prefilter": {"leading": [], "literals": [], "min_length": 0}})
+    assert Template("SELECT NAME").is_match("SELECT account")
+    assert cache.load("compiled", key)["regexes"] != ["(?>"]
+
+
+def test_fingerprint() -> None:
+    where = {"arg": Template("A")}
+    assert Template("SELECT arg", where=where).fingerprint == Template("SELECT arg", where=where).fingerprint
+    assert (
+        Template("SELECT arg", where=where).fingerprint
+        != Template("SELECT arg", where={"arg": Template("B")}).fingerprint
+    )
+    assert Template("SELECT", corrected="DROP").fingerprint == Template("DROP").fingerprint
+
+
+def test_automaton_reads_cache(cache_dir: Path) -> None:
+    built = Registry([Template("SELECT NAME"), Template("DROP NAME")]).automaton()
+    assert list(cache_dir.rglob("automata/*.json"))
+    assert Registry([Template("SELECT NAME"), Template("DROP NAME")]).automaton() == built
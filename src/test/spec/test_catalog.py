@@ -0,0 +1,142 @@
+import pickle
+from pathlib import Path
+
+import pytest
+
+from pgtonic.catalog import main
+from pgtonic.parallel import match_many
+from pgtonic.pg13 import create_trigger, grant
+from pgtonic.spec import catalog as c
+from pgtonic.spec.registry import Registry
+from pgtonic.spec.template import Template
+
+TEMPLATES = [*grant.TEMPLATES, *create_trigger.TEMPLATES]
+
+STATEMENTS = [
+    "GRANT SELECT ON account TO oliver",
+    "GRANT SELECT ON account TO",
+    "CREATE TRIGGER my_trig AFTER INSERT ON api.account EXECUTE FUNCTION oli.func ()",
+    "DROP TABLE account",
+]
+
+
+@pytest.fixture
+def catalog_path(tmp_path: Path) -> Path:
+    path = tmp_path / "pg13.catalog"
+    c.write(str(path), TEMPLATES)
+    return path
+
+
+def test_round_trip() -> None:
+    catalog = c.Catalog(c.dump(TEMPLATES))
+    assert len(catalog) == len(TEMPLATES)
+    for loaded, template in zip(catalog, TEMPLATES):
+        assert loaded.original == template.original
+        assert loaded.corrected == template.corrected
+        assert loaded.fingerprint == template.fingerprint
+        assert set(loaded.where or {}) == set(template.where or {})
+        # Decoded nodes are the hash-consed nodes the parser produces
+        assert loaded.ast is template.ast
+        assert loaded.artifacts() == template.artifacts()
+        assert loaded == template and template == loaded
+
+
+def test_shared_where_templates() -> None:
+    arg = Template("A")
+    catalog = c.Catalog(c.dump([Template("SELECT arg", where={"arg": arg}), Template("DROP arg", where={"arg": arg})]))
+    first, second = catalog
+    assert first.where["arg"] is second.where["arg"]
+
+
+def test_does_not_parse(monkeypatch: pytest.MonkeyPatch) -> None:
+    data = c.dump([Template("SELECT NAME [ CASCADE ]")])
+
+    def fail(*args, **kwargs):
+        raise AssertionError("spec was parsed")
+
+    monkeypatch.setattr("pgtonic.spec.template.parse", fail)
+    monkeypatch.setattr(Template, "lowered", fail)
+    (template,) = c.Catalog(data)
+    assert template.is_match("SELECT account CASCADE")
+    assert not template.is_match("DROP account")
+
+
+@pytest.mark.parametrize("sql", STATEMENTS)
+def test_registry(catalog_path: Path, sql: str) -> None:
+    with c.Catalog.open(str(catalog_path)) as catalog:
+        registry = catalog.registry()
+        expected = [TEMPLATES.index(x) for x in Registry(TEMPLATES).find_all(sql)]
+        assert [catalog.templates.index(x) for x in registry.find_all(sql)] == expected
+        found = registry.find(sql)
+        assert (found.fingerprint if found else None) == next(
+            (x.fingerprint for x in TEMPLATES if x.is_match(sql)), None
+        )
+
+
+def test_without_automaton() -> None:
+    catalog = c.Catalog(c.dump(TEMPLATES, automaton=False))
+    assert catalog.automaton() is None
+    assert catalog.registry().find_all(STATEMENTS[0]) == [catalog.templates[0]]
+
+
+def test_equal_to_plain_templates() -> None:
+    (template,) = c.Catalog(c.dump(grant.TEMPLATES))
+    assert template == grant.TEMPLATES[0]
+    assert template != Template(grant.TEMPLATES[0].original)
+    assert template in grant.TEMPLATES
+    (template,) = c.Catalog(c.dump([Template("SELECT NAME")]))
+    assert {template, Template("SELECT NAME")} == {Template("SELECT NAME")}
+
+
+def test_closed(catalog_path: Path) -> None:
+    catalog = c.Catalog.open(str(catalog_path))
+    first = catalog.templates[0]
+    assert first.is_match(STATEMENTS[0])
+    catalog.close()
+    catalog.close()
+    # Compiled before closing
+    assert first.is_match(STATEMENTS[0])
+    for decode in (lambda: first.ast, lambda: catalog.templates, lambda: catalog.automaton(), lambda: len(catalog)):
+        with pytest.raises(ValueError, match="catalog is closed"):
+            decode()
+
+
+def test_pickle() -> None:
+    (template,) = c.Catalog(c.dump(grant.TEMPLATES))
+    loaded = pickle.loads(pickle.dumps(template))
+    assert type(loaded) is Template
+    assert loaded.fingerprint == template.fingerprint
+
+
+@pytest.mark.parametrize(
+    "data,message",
+    [
+        (b"", "Not a pgtonic catalog"),
+        (b"x" * 100, "Not a pgtonic catalog"),
+        (c.dump([]).replace(c.MAGIC + b"\x04", c.MAGIC + b"\x05"), "Unsupported catalog format version 5"),
+    ],
+)
+def test_invalid(data: bytes, message: str) -> None:
+    with pytest.raises(ValueError, match=message):
+        c.Catalog(data)
+
+
+def test_other_generator(monkeypatch: pytest.MonkeyPatch) -> None:
+    data = c.dump(grant.TEMPLATES)
+    monkeypatch.setattr(c.r, "GENERATOR", "other")
+    with pytest.raises(ValueError, match="another regex generator"):
+        c.Catalog(data)
+
+
+def test_match_many(catalog_path: Path) -> None:
+    results = match_many(STATEMENTS, TEMPLATES, workers=2, chunk_size=1, catalog=str(catalog_path))
+    assert results == [0, None, 1, None]
+
+
+def test_main(tmp_path: Path, capsys) -> None:
+    path = str(tmp_path / "pg13.catalog")
+    assert main(["build", path]) == 0
+    assert main(["info", path]) == 0
+    out = capsys.readouterr().out
+    assert "2 templates" in out
+    assert "  GRANT { privilege [, ...]" in out
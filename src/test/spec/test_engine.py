@@ -0,0 +1,133 @@
+import pytest
+
+from pgtonic.spec.engine import Engine, TokenMatcher
+from pgtonic.spec.parse.ast_passes import Lowering
+from pgtonic.spec.registry import Registry
+from pgtonic.spec.template import Template
+
+
+@pytest.mark.parametrize(
+    "spec,sql,is_match",
+    [
+        ("[ A ] [ B ] C", "C", True),
+        ("[ A ] [ B ] C", "A B C", True),
+        ("[ A ] [ B ] C", "B A C", False),
+        ("[ A ] [ B ] C", " C", False),
+        ("C [ A ] [ B ]", "C ", False),
+        ("C [ A ] [ B ]", "C B\n", True),
+        ("[ A ] ( NAME )", "A(x)", True),
+        ("[ A ] [ ( NAME ) ] B", "A(x) B", True),
+        ("[ A ] [ ( NAME ) ] B", "A(x)B", False),
+        ("A NAME", "A s.t", True),
+        ("A NAME", "A s .t", False),
+        ("A NAME", 'A "s"."t"', True),
+        ("A QUALIFIED_NAME", "A t", False),
+        ("A UNQUALIFIED_NAME [, ...]", "A a,b , c", True),
+        ("A UNQUALIFIED_NAME [, ...]", "A a,b ,", False),
+        ("A UNQUALIFIED_NAME [ OR ... ]", "A a OR b", True),
+        ("A UNQUALIFIED_NAME [ OR ... ]", "A a OR", False),
+        ("A UNQUALIFIED_NAME [ ... ]", "A a b c", True),
+        ("A ( * )", "A (*)", True),
+        ("A NAME", "A table", False),
+        ("A NAME", "A s.table", False),
+        ("A NAME", 'A "table"', True),
+        ("A NAME", "A a$b", True),
+        ("A NAME", 'A U&"a"', True),
+        ("A { NAME | CURRENT_USER }", "A CURRENT_USER", True),
+        ("A UNQUALIFIED_NAME [ OR ... ]", "A a OR or", False),
+    ],
+)
+def test_tokens_engine(spec: str, sql: str, is_match: bool) -> None:
+    template = Template(spec)
+    assert template.is_match(sql, Engine.TOKENS) == is_match
+    assert template.is_match(sql, Engine.REGEX) == is_match
+
+
+@pytest.mark.parametrize(
+    "spec,sql,is_match",
+    [
+        ("{ A | [ C ] } B", "B", True),
+        ("{ A | [ C ] } B", " B", False),
+        ("{ A | [ C ] } B", "C B", True),
+        ("{ A | [ C ] } B", "CB", False),
+        ("X { A | [ C ] } B", "X B", True),
+        ("X { A | [ C ] } B", "X A B", True),
+        ("X { A | [ C ] }", "X ", False),
+        ("X { A | [ C ] }", "X", True),
+        ("{ [ A ] [ C ] } B", "B", True),
+        ("{ [ A ] [ C ] } B", "A C B", True),
+        ("{ [ A ] | [ C ] } ( NAME )", "(x)", True),
+        ("{ [ A ] | [ C ] } ( NAME )", "C(x)", True),
+        ("X { [ A ] | [ C ] } ( NAME )", "X (x)", True),
+        ("X { [ A ] | [ C ] } ( NAME )", "X  (x)", True),
+    ],
+)
+def test_engines_agree_on_nullable_members(spec: str, sql: str, is_match: bool) -> None:
+    # Members matching the empty string are optional, with no whitespace left behind
+    template = Template(spec)
+    assert template.is_match(sql, Engine.TOKENS) == is_match
+    for lowering in Lowering:
+        assert template.compile(lowering).is_match(sql) == is_match
+    assert (Registry([template]).find_all(sql) == [template]) == is_match
+
+
+@pytest.mark.parametrize(
+    "sql,is_match",
+    [
+        ("GRANT SELECT ON a TO y", True),
+        ("GRANT\xa0SELECT ON a TO y", False),
+        ("GRANT SELECT ON a\u2003TO y", False),
+        ("\xa0GRANT SELECT ON a TO y", False),
+        ("GRANT SELECT ON a TO y\xa0", True),
+        ("GRANT SELECT ON a\xa0b TO y", True),
+    ],
+)
+def test_engines_agree_on_unicode_whitespace(sql: str, is_match: bool) -> None:
+    # Only ASCII whitespace separates tokens, other whitespace is part of a word like in PostgreSQL
+    template = Template("GRANT SELECT ON NAME TO NAME")
+    assert template.is_match(sql, Engine.TOKENS) == is_match
+    for lowering in Lowering:
+        assert template.compile(lowering).is_match(sql) == is_match
+    assert (Registry([template]).find_all(sql) == [template]) == is_match
+
+
+def test_tokens_engine_arguments() -> None:
+    template = Template("A x [, ...] B", where={"x": Template("{ NAME | ( y ) }", where={"y": Template("{ C | D }")})})
+    assert template.is_match("A s.t, (C), (D) B", Engine.TOKENS)
+    assert not template.is_match("A s.t, (E) B", Engine.TOKENS)
+
+
+def test_tokens_engine_memoizes_positions() -> None:
+    # 2^20 combinations of optional clauses, each evaluated once per position
+    words = [f"A{chr(ord('A') + ix)}" for ix in range(20)]
+    spec = "X " + " ".join(f"[ {word} ]" for word in words) + " Y"
+    sql = "X " + " ".join(words[::2]) + " Y"
+    matcher = TokenMatcher(sql)
+    assert matcher.is_match(Template(spec))
+    assert len(matcher._memo) < 20 * len(matcher.tokens) * 2
+
+
+@pytest.mark.parametrize(
+    "spec,sql,position,expected,found",
+    [
+        ("A NAME B", "A x B", 5, (), None),
+        ("A NAME B", "A x C", 4, (".", "B"), "C"),
+        ("A UNQUALIFIED_NAME B", "A x", 3, ("B",), None),
+        ("A UNQUALIFIED_NAME", "A x y", 4, ("end of statement",), "y"),
+        ("A NAME", "A x ", 3, ("end of statement",), " "),
+        ("A NAME", " A x", 0, ("A",), " "),
+        ("A { B | C } [ D ]", "A E", 2, ("B", "C"), "E"),
+        ("A ( UNQUALIFIED_NAME [, ...] )", "A (x y)", 5, (")", ","), "y"),
+        ("A QUALIFIED_NAME", "A x y", 4, (".",), "y"),
+        ("A B", "A(", 1, ("whitespace",), "("),
+    ],
+)
+def test_explain(spec: str, sql: str, position: int, expected, found) -> None:
+    explanation = Template(spec).explain(sql)
+    assert explanation.is_match == (not expected)
+    assert (explanation.position, explanation.expected, explanation.found) == (position, expected, found)
+
+
+def test_explain_message() -> None:
+    explanation = Template("A UNQUALIFIED_NAME B").explain("A x\nC")
+    assert str(explanation) == "Expected B at line 2, column 1, found 'C'"
@@ -22,3 +22,25 @@ def test_token___str__() -> None:
 
 def test_token___repr__() -> None:
     assert repr(Token.LITERAL) == "LITERAL"
+
+
+def test_lex_fails_position() -> None:
+    with pytest.raises(LexFailureException) as exc_info:
+        lex("GRANT\n  ON 123")
+    assert exc_info.value.line == 2
+    assert exc_info.value.column == 6
+    assert "line 2, column 6" in str(exc_info.value)
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("CREATE [ CONSTRAINT ]", [Token.LITERAL, Token.L_BRACKET, Token.LITERAL, Token.R_BRACKET]),
+        ("table_name [, ...]", [Token.ARG, Token.DELIMITED_COMMA]),
+        ("event [ OR ... ]", [Token.ARG, Token.DELIMITED_OR]),
+        ("{ NAME | UNQUALIFIED_NAME }", [Token.L_BRACE, Token.NAME, Token.PIPE, Token.UNQUALIFIED_NAME, Token.R_BRACE]),
+        ("( * )", [Token.L_PAREN, Token.STAR, Token.R_PAREN]),
+    ],
+)
+def test_lex_tokens(text: str, expected) -> None:
+    assert [x.token for x in lex(text) if x.token != Token.WHITESPACE] == expected
@@ -1,8 +1,152 @@
+import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import FrozenInstanceError
+
 import pytest
 
+from pgtonic.exceptions import ParseFailureException
 from pgtonic.pg13.grant import TEMPLATES
+from pgtonic.spec.parse.ast_passes import (
+    PASS_CACHE_SIZE,
+    Lowering,
+    _factor_closed_choices,
+    factor_choices,
+    leading_literals,
+    maybe_to_choice,
+)
+from pgtonic.spec.parse.parse import parse
+from pgtonic.spec.parse.types import Argument, Base, Group, Literal, Maybe
+from pgtonic.spec.template import Template
 
 
 @pytest.mark.parametrize("template", TEMPLATES)
 def test_parse_grant(template) -> None:
     assert template.ast
+
+
+@pytest.mark.parametrize(
+    "spec,prefixes",
+    [
+        ("GRANT { SELECT | ALL } ON NAME", {("GRANT", "SELECT", "ON"), ("GRANT", "ALL", "ON")}),
+        ("CREATE [ CONSTRAINT ] TRIGGER name", {("CREATE", "TRIGGER"), ("CREATE", "CONSTRAINT", "TRIGGER")}),
+        ("NAME TO", {()}),
+        ("A B C D E F", {("A", "B", "C", "D")}),
+        ("A { B [, ...] } C", {("A", "B")}),
+    ],
+)
+def test_leading_literals(spec: str, prefixes) -> None:
+    assert leading_literals(Template(spec).ast) == prefixes
+
+
+@pytest.mark.parametrize(
+    "spec,message",
+    [
+        ("GRANT [ ALL", "Unclosed L_BRACKET at line 1, column 7"),
+        ("GRANT { ALL ]", "Unexpected R_BRACKET at line 1, column 13"),
+        ("\n  [, ...] GRANT", "Nothing to repeat at line 2, column 3"),
+        ("GRANT [ ]", "Empty optional at line 1, column 7"),
+        ("GRANT ALL )", "Unexpected R_PAREN at line 1, column 11"),
+    ],
+)
+def test_parse_fails(spec: str, message: str) -> None:
+    with pytest.raises(ParseFailureException) as exc_info:
+        parse(spec)
+    assert str(exc_info.value) == message
+
+
+def test_nodes_are_hash_consed() -> None:
+    ast = parse("GRANT { ALL | SELECT } ON NAME")
+    assert parse("REVOKE { ALL | SELECT } ON NAME").members[1] is ast.members[1]
+    assert Group((Literal("A"), Maybe(Literal("B")))) is Group([Literal("A"), Maybe(Literal("B"))])
+    assert Literal("A") is not Argument("A")
+    assert len({Literal("A"), Literal("A")}) == 1
+    with pytest.raises(FrozenInstanceError):
+        ast.members = ()
+
+
+def test_nodes_are_hash_consed_across_threads() -> None:
+    barrier = threading.Barrier(8)
+
+    def build(_: int) -> Base:
+        barrier.wait()
+        return Group((Literal("THREADED"), Maybe(Literal("CONSTRUCTION"))))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        nodes = list(pool.map(build, range(8)))
+    assert all(x is nodes[0] for x in nodes)
+
+
+def test_live_nodes_are_not_reinitialized(monkeypatch: pytest.MonkeyPatch) -> None:
+    node = Group([Literal("LIVE"), Literal("NODE")])
+    assert node.members == (Literal("LIVE"), Literal("NODE"))
+
+    # Another thread may be reading the live node's fields
+    def fail(*args, **kwargs):
+        raise AssertionError("live node was initialized again")
+
+    monkeypatch.setattr(Group, "__init__", fail)
+    assert Group((Literal("LIVE"), Literal("NODE"))) is node
+
+
+def test_pass_caches_are_bounded() -> None:
+    assert maybe_to_choice.cache_info().maxsize == _factor_closed_choices.cache_info().maxsize == PASS_CACHE_SIZE
+
+
+def test_expanded_variants_share_subtrees() -> None:
+    expanded = maybe_to_choice(parse("[ A ] [ B ] C ( NAME )"))
+    assert len(expanded.members) == 4
+    assert len({id(x.members[-1]) for x in expanded.members}) == 1
+
+
+def test_regex_is_cached_for_closed_subtrees() -> None:
+    node = parse("A [ B ] arg")
+    assert node.members[1].closed and not node.closed
+    regex = node.members[1].to_regex({})
+    assert node.members[1].to_regex({}) is regex
+
+
+def test_nodes_pickle() -> None:
+    node = parse("A [ B ] { C | D } ( NAME [, ...] )")
+    assert pickle.loads(pickle.dumps(node)) is node
+
+
+@pytest.mark.parametrize(
+    "spec,factored",
+    [
+        ("{ A B C | A B D | E }", "{ A B { C | D } | E }"),
+        ("{ A C | B C }", "{ { A | B } C }"),
+        ("{ A | A B }", "{ A [ B ] }"),
+        ("{ A ( NAME ) | A B }", "{ A ( NAME ) | A B }"),
+        ("{ A [ B ] | A C }", "{ A [ B ] | A C }"),
+    ],
+)
+def test_factor_choices(spec: str, factored: str) -> None:
+    assert factor_choices(parse(spec), {}) == factor_choices(parse(factored), {})
+
+
+@pytest.mark.parametrize(
+    "spec,sql,is_match",
+    [
+        ("{ A B C | A B D | E }", "A B D", True),
+        ("{ A B C | A B D | E }", "A B", False),
+        ("{ A | A B }", "A", True),
+        ("{ A | A B }", "A B", True),
+        ("{ A ( NAME ) | A B }", "A(x)", True),
+        ("{ A [ B ] | A C }", "A", True),
+        ("{ [ B ] C | A C }", "C", True),
+    ],
+)
+def test_factored_lowering(spec: str, sql: str, is_match: bool) -> None:
+    template = Template(spec)
+    assert template.compile(Lowering.FACTORED).is_match(sql) == is_match
+    assert template.compile(Lowering.EXPAND).is_match(sql) == is_match
+
+
+def test_factoring_keeps_nullable_arguments_apart() -> None:
+    template = Template("{ A arg | A B }", where={"arg": Template("[ X ]")})
+    assert factor_choices(template.ast, template.where) is template.ast
+    for lowering in Lowering:
+        assert template.compile(lowering).is_match("A")
+        assert template.compile(lowering).is_match("A X")
+        assert template.compile(lowering).is_match("A B")
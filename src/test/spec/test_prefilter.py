@@ -0,0 +1,70 @@
+import pytest
+
+from pgtonic.pg13.registry import REGISTRY
+from pgtonic.spec.prefilter import Prefilter, build_prefilter
+from pgtonic.spec.template import Template
+
+
+@pytest.mark.parametrize(
+    "spec,prefilter",
+    [
+        ("GRANT NAME TO NAME", Prefilter(("GRANT",), ("TO",), 12)),
+        ("{ GRANT | REVOKE } NAME", Prefilter(("GRANT", "REVOKE"), (), 7)),
+        ("[ GRANT ] NAME", Prefilter((), (), 1)),
+        ("A ( QUALIFIED_NAME [, ...] )", Prefilter(("A",), ("(", ")"), 6)),
+        ("A { B C | B D } arg", Prefilter(("A",), ("B", "X"), 7)),
+    ],
+)
+def test_build_prefilter(spec: str, prefilter: Prefilter) -> None:
+    assert build_prefilter(Template(spec, where={"arg": Template("{ X | Y X }")})) == prefilter
+
+
+@pytest.mark.parametrize(
+    "sql,may_match",
+    [
+        ("GRANT a TO b", True),
+        ("GRANT a TO", False),
+        ("REVOKE a TO b", False),
+        ("GRANT a FROM b", False),
+    ],
+)
+def test_may_match(sql: str, may_match: bool) -> None:
+    assert build_prefilter(Template("GRANT NAME TO NAME")).may_match(sql) == may_match
+
+
+@pytest.mark.parametrize(
+    "spec",
+    [
+        "{ A | [ C ] } B",
+        "{ [ A ] [ C ] } B",
+        "[ A ] { [ C ] | D } ( NAME )",
+        "X { A | [ C ] } B",
+        "arg B",
+        "{ arg | C } B",
+    ],
+)
+@pytest.mark.parametrize("sql", ["B", " B", "A B", "C B", "D(x)", "(x)", "A (x)", "X B", "X  B", "B ", "AB"])
+def test_prefilter_only_rejects_what_the_regex_rejects(spec: str, sql: str) -> None:
+    compiled = Template(spec, where={"arg": Template("[ X ]")}).compile()
+    if compiled._match(sql):
+        assert compiled.prefilter.may_match(sql)
+
+
+def test_prefilter_round_trip() -> None:
+    prefilter = build_prefilter(Template("GRANT NAME TO NAME"))
+    assert Prefilter.from_dict(prefilter.to_dict()) == prefilter
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "GRANT SELECT ON ALL TABLES IN SCHEMA api TO oliver, anon WITH GRANT OPTION",
+        "GRANT REFERENCES ON public.account TO oliver WITH GRANT OPTION",
+        "CREATE TRIGGER t AFTER INSERT ON api.account EXECUTE FUNCTION f()",
+        "CREATE CONSTRAINT TRIGGER t AFTER INSERT OR UPDATE ON a FROM b DEFERRABLE FOR EACH ROW EXECUTE FUNCTION f(x)",
+    ],
+)
+def test_prefilter_admits_matches(sql: str) -> None:
+    template = REGISTRY.find(sql)
+    assert template is not None
+    assert template.compile().prefilter.may_match(sql)
@@ -19,7 +19,7 @@ from pgtonic.spec.regex import ENTITY_NAME, NAME, SCHEMA_NAME
         ('"%ab_$^&c"', True),
         ("8aaa", False),
         ("aa a", False),
-        ("aa$a", False),
+        ("aa$a", True),
         ('"a"a"', False),
     ],
 )
@@ -41,7 +41,7 @@ def test_schema_name(schema_name: str, is_match: bool) -> None:
         ('"%ab_$^&c"', True),
         ("8aaa", False),
         ("aa a", False),
-        ("aa$a", False),
+        ("aa$a", True),
         ('"a"a"', False),
     ],
 )
@@ -64,9 +64,17 @@ def test_entity_name(entity_name: str, is_match: bool) -> None:
         ('"%ab_$^&c"', True),
         ("8aaa", False),
         ("aa a", False),
-        ("aa$a", False),
+        ("aa$a", True),
         ('"a"a"', False),
         ('a"a', False),
+        ("a^b", False),
+        ("[a", False),
+        ('""', False),
+        ('"a""b"', True),
+        ('U&"d\\0061t"', True),
+        ("ñandú", True),
+        ("tables", True),
+        ("user_id", True),
         # Name may be schema qualified
         ("public.account", True),
         ("public.ac_ount", True),
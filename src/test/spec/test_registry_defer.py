@@ -0,0 +1,71 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from pgtonic.spec.registry import Registry
+from pgtonic.spec.template import Template
+
+
+def test_defer_loads_on_first_keyword() -> None:
+    loaded: List[str] = []
+
+    def loader(spec: str):
+        def load() -> List[Template]:
+            loaded.append(spec)
+            return [Template(spec)]
+
+        return load
+
+    registry = Registry([Template("DROP NAME")])
+    registry.defer("select", loader("SELECT NAME"))
+    registry.defer("GRANT", loader("GRANT NAME"))
+
+    assert registry.find("DROP account") is not None
+    assert loaded == []
+    assert registry.find("SELECT account") == Template("SELECT NAME")
+    assert loaded == ["SELECT NAME"]
+    assert registry.find("SELECT account") is not None
+    assert loaded == ["SELECT NAME"]
+
+    assert len(registry) == 3
+    assert loaded == ["SELECT NAME", "GRANT NAME"]
+
+
+def test_defer_loads_once_across_threads() -> None:
+    loaded: List[str] = []
+    barrier = threading.Barrier(16)
+
+    def load() -> List[Template]:
+        loaded.append("GRANT")
+        # Give the other threads time to look the keyword up mid load
+        threading.Event().wait(0.01)
+        return [Template("GRANT SELECT ON TABLE NAME TO NAME")]
+
+    registry = Registry()
+    registry.defer("GRANT", load)
+
+    def find(_: int) -> object:
+        barrier.wait()
+        return registry.find("GRANT SELECT ON TABLE x TO anon")
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(find, range(16)))
+    assert all(x is not None for x in results)
+    assert loaded == ["GRANT"]
+
+
+def test_explain_unknown_keyword_loads_nothing() -> None:
+    loaded: List[str] = []
+
+    def load() -> List[Template]:
+        loaded.append("GRANT")
+        return [Template("GRANT NAME")]
+
+    registry = Registry([Template("DROP NAME")])
+    registry.defer("GRANT", load)
+
+    explanation = registry.explain("  SELECT 1")
+    assert explanation is not None and explanation.template is None
+    assert str(explanation) == "Expected DROP or GRANT at line 1, column 3, found 'SELECT'"
+    assert loaded == []
+    assert Registry().explain("SELECT 1") is None
@@ -0,0 +1,170 @@
+import re
+
+import pytest
+
+from pgtonic.pg13 import create_trigger
+from pgtonic.pg13.grant import TEMPLATES
+from pgtonic.spec import template as template_module
+from pgtonic.spec.parse.ast_passes import Lowering
+from pgtonic.spec.template import Template, clear_lowering_memo, intern, lowering_stats
+
+
+def test_compile_is_cached() -> None:
+    template = Template("{ NAME }")
+    assert template.compile() is template.compile()
+
+
+def test_compile_one_pattern_per_variant() -> None:
+    template = TEMPLATES[0]
+    assert len(template.compile().patterns) == len(template.to_regexes())
+
+
+def test_compiled_is_match() -> None:
+    compiled = TEMPLATES[0].compile()
+    assert compiled.is_match("GRANT SELECT ON public.account TO oliver")
+    assert not compiled.is_match("GRANT SELECT ON public.account TO")
+
+
+def test_compile_does_not_affect_equality() -> None:
+    template = Template("{ NAME }")
+    other = Template("{ NAME }")
+    template.compile()
+    assert template == other
+
+
+@pytest.mark.parametrize("lowering", list(Lowering))
+@pytest.mark.parametrize(
+    "spec,sql,is_match",
+    [
+        ("[ A ] [ B ] C", "C", True),
+        ("[ A ] [ B ] C", "A C", True),
+        ("[ A ] [ B ] C", "B C", True),
+        ("[ A ] [ B ] C", "A B C", True),
+        ("[ A ] [ B ] C", "B A C", False),
+        ("[ A ] [ B ] C", " C", False),
+        ("C [ A ] [ B ]", "C B", True),
+        ("C [ A ] [ B ]", "C ", False),
+        ("X { [ A ] [ B ] }", "X A B", True),
+        ("X { [ A ] [ B ] }", "X B", True),
+        ("X { [ A ] [ B ] }", "X B A", False),
+        ("[ A ] ( NAME )", "A(x)", True),
+        ("[ A ] ( NAME )", "A (x)", True),
+        ("[ A ] ( NAME )", "(x)", True),
+        ("[ A ] [ ( NAME ) ] B", "A(x) B", True),
+        ("[ A ] [ ( NAME ) ] B", "(x) B", True),
+        ("[ A ] [ ( NAME ) ] B", "A B", True),
+        ("[ A ] [ ( NAME ) ] B", "B", True),
+        ("[ A ] [ ( NAME ) ] B", "AB", False),
+        ("[ A ] [ ( NAME ) ] [ C ] B", "A(x) C B", True),
+        ("[ A ] [ ( NAME ) ] [ C ] B", "(x)C B", False),
+        ("[ A ] [ ( NAME ) ] [ C ] B", "C B", True),
+        ("[ A ] [ ( NAME ) ] [ C ] B", " B", False),
+    ],
+)
+def test_lowering_optional_whitespace(spec: str, sql: str, is_match: bool, lowering: Lowering) -> None:
+    assert Template(spec).compile(lowering).is_match(sql) == is_match
+
+
+def test_optional_lowering_is_linear() -> None:
+    template = create_trigger.TEMPLATES[0]
+    assert len(template.to_regexes(Lowering.OPTIONAL)) == 1
+    assert len(template.to_regex(Lowering.OPTIONAL)) < len(template.to_regex(Lowering.EXPAND)) / 10
+
+
+def test_optional_lowering_matches_rest_once() -> None:
+    # Leading optional members followed by different separators alternate, the rest is not repeated per branch
+    regex = Template("[ A ] [ ( NAME ) ] [ C ] B TAIL")._marked_regex()
+    assert regex.count("TAIL") == regex.count("B") == 1
+
+
+@pytest.mark.parametrize(
+    "sql,groups",
+    [
+        ("A x", {"first": ["x"]}),
+        ("A x, y B z", {"first": ["x", "y"], "second": ["z"]}),
+        ("A x B y.z, w", {"first": ["x"], "second": ["y.z", "w"]}),
+    ],
+)
+def test_match_groups(sql: str, groups) -> None:
+    template = Template(
+        "A first [, ...] [ B second [, ...] ]",
+        where={"first": Template("{ UNQUALIFIED_NAME }"), "second": Template("{ NAME }")},
+    )
+    match = template.match(sql)
+    assert match is not None
+    assert match.groups == groups
+    assert match["missing"] == []
+
+
+def test_match_reserved_keyword() -> None:
+    template = Template("GRANT role [, ...]", where={"role": Template("{ NAME | CURRENT_USER }")})
+    match = template.match('GRANT CURRENT_USER, "user", u')
+    assert match is not None
+    assert match["role"] == ["CURRENT_USER", '"user"', "u"]
+    assert template.match("GRANT user") is None
+
+
+@pytest.mark.parametrize(
+    "spec,sql,is_match",
+    [
+        ("A NAME", "A table", False),
+        ("A NAME", "A TABLE", False),
+        ("A NAME", "A s.table", False),
+        ("A NAME", 'A "table"', True),
+        ("A NAME", "A tables", True),
+        ("A TO", "A TO", True),
+        ("A TO", "A to", False),
+        ("A PUBLIC", "A PUBLIC", True),
+    ],
+)
+def test_reserved_keywords(spec: str, sql: str, is_match: bool) -> None:
+    # Reserved keywords are only names when quoted
+    assert Template(spec).is_match(sql) == is_match
+
+
+def test_to_regex_matches_statements_as_written() -> None:
+    template = Template("GRANT NAME TO NAME")
+    assert re.match(template.to_regex(), "GRANT x TO y")
+    assert all(re.match(x, "GRANT x TO y") for x in template.to_regexes())
+    # Reserved keywords are names only when quoted, as for compile and match
+    for sql in ["GRANT table TO y", "GRANT x TO Select", 'GRANT "table" TO y', "GRANT tables TO y"]:
+        assert bool(re.fullmatch(template.to_regex(), sql)) == template.is_match(sql)
+        assert any(re.fullmatch(x, sql) for x in template.to_regexes()) == template.is_match(sql)
+    assert not re.match(template.to_regex(), "GRANT table TO y")
+
+
+def test_lowering_memo_shares_subtemplates() -> None:
+    clear_lowering_memo()
+    shared = Template("{ UNQUALIFIED_NAME | PUBLIC }")
+    first = Template("GRANT role [, ...] TO role", where={"role": shared})
+    second = Template("REVOKE role FROM role", where={"role": Template("{ UNQUALIFIED_NAME | PUBLIC }")})
+
+    first.to_regex()
+    assert lowering_stats() == {"hits": 1, "misses": 2, "size": 2}
+    second.to_regex()
+    assert lowering_stats() == {"hits": 3, "misses": 3, "size": 3}
+
+    # Captures give arguments template specific group names and bypass the memo
+    assert first.match("GRANT a, b TO PUBLIC") is not None
+    assert lowering_stats()["misses"] == 3
+
+
+def test_lowering_memo_is_bounded(monkeypatch) -> None:
+    clear_lowering_memo()
+    monkeypatch.setattr(template_module, "LOWERING_MEMO_SIZE", 2)
+    first = Template("SELECT NAME")
+    first.to_regex()
+    Template("DROP NAME").to_regex()
+    first.to_regex()
+    Template("CREATE NAME").to_regex()
+    assert lowering_stats() == {"hits": 1, "misses": 3, "size": 2}
+    # The least recently used entry was evicted
+    first.to_regex()
+    Template("DROP NAME").to_regex()
+    assert lowering_stats() == {"hits": 2, "misses": 4, "size": 2}
+
+
+def test_intern() -> None:
+    template = intern(Template("SELECT NAME"))
+    assert intern(Template("SELECT NAME")) is template
+    assert intern(Template("SELECT NAME [, ...]")) is not template
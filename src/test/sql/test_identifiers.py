@@ -0,0 +1,112 @@
+import re
+
+import pytest
+
+from pgtonic.sql.identifiers import (
+    IDENTIFIER,
+    MARK,
+    RESERVED_KEYWORDS,
+    TokenKind,
+    is_identifier,
+    is_reserved,
+    mark_reserved,
+    prepare,
+    recognize,
+    trie_regex,
+)
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("account", (TokenKind.IDENTIFIER, 7)),
+        ("a$b c", (TokenKind.IDENTIFIER, 3)),
+        ("ñandú.x", (TokenKind.IDENTIFIER, 5)),
+        ("_x1", (TokenKind.IDENTIFIER, 3)),
+        ("table", (TokenKind.KEYWORD, 5)),
+        ("Table_1", (TokenKind.IDENTIFIER, 7)),
+        ('"a""b" x', (TokenKind.QUOTED_IDENTIFIER, 6)),
+        ('U&"d\\0061t"', (TokenKind.QUOTED_IDENTIFIER, 11)),
+        ('"a', None),
+        ('""', None),
+        ("'it''s'", (TokenKind.STRING, 7)),
+        ("E'it\\'s'", (TokenKind.STRING, 8)),
+        ("X'1F'", (TokenKind.STRING, 5)),
+        ("Ex", (TokenKind.IDENTIFIER, 2)),
+        ("'a", None),
+        ("1.5e-3x", (TokenKind.NUMBER, 6)),
+        (".5", (TokenKind.NUMBER, 2)),
+        ("$$a$b$$ x", (TokenKind.DOLLAR_QUOTED, 7)),
+        ("$body$ $$ $body$", (TokenKind.DOLLAR_QUOTED, 16)),
+        ("$body$ x", None),
+        ("1a", (TokenKind.NUMBER, 1)),
+        ("(", None),
+        ("", None),
+    ],
+)
+def test_recognize(text: str, expected) -> None:
+    assert recognize(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [("account", True), ('"table"', True), ("table", False), ("a b", False), ("1a", False), ("'a'", False)],
+)
+def test_is_identifier(text: str, expected: bool) -> None:
+    assert is_identifier(text) == expected
+    assert (re.fullmatch(IDENTIFIER, text) is not None) == expected
+
+
+def test_is_reserved() -> None:
+    assert is_reserved("TABLE") and is_reserved("table") and is_reserved("Current_User")
+    assert not is_reserved("tables") and not is_reserved("PUBLIC")
+    # Only ASCII letters are case folded, like PostgreSQL
+    assert not is_reserved("TABLE".replace("A", "\N{LATIN CAPITAL LETTER A WITH GRAVE}"))
+
+
+@pytest.mark.parametrize(
+    "sql,marked",
+    [
+        ("GRANT SELECT ON t TO u", "#GRANT #SELECT #ON t #TO u"),
+        ("GRANT x ON tables TO a$to", "#GRANT x #ON tables #TO a$to"),
+        ("GRANT x ON \"table\" TO 'to'", "#GRANT x #ON \"table\" #TO 'to'"),
+        ("select $to$ to $to$ to", "#select $to$ to $to$ #to"),
+        ("x$to$ to", "x$to$ #to"),
+        ('x "to', 'x "to'),
+        ("to E'to\\' to' to", "#to E'to\\' to' #to"),
+        ('to E"to" U&"to"', '#to E"to" U&"to"'),
+        ("$1 to", "$1 #to"),
+    ],
+)
+def test_mark_reserved(sql: str, marked: str) -> None:
+    assert mark_reserved(sql).replace(MARK, "#") == marked
+    assert prepare(sql) == mark_reserved(sql)
+
+
+@pytest.mark.parametrize(
+    "sql,prepared",
+    [
+        ("GRANT  x\tTO\n\ny", "#GRANT x #TO y"),
+        (" to  to\n", " #to #to\n"),
+        ("to  'a  to'  to", "#to  'a  to'  #to"),
+        ("to  x  'a'", "#to x  'a'"),
+        ("to\xa0to  to\u2003", "to\xa0to to\u2003"),
+    ],
+)
+def test_prepare(sql: str, prepared: str) -> None:
+    # Only whitespace between words outside quotes is collapsed
+    assert prepare(sql).replace(MARK, "#") == prepared
+
+
+def test_trie_regex() -> None:
+    regex = re.compile(trie_regex(["TO", "TABLE", "TABLES", "T"], ignore_case=True))
+    assert [regex.fullmatch(x) is not None for x in ["to", "Table", "TABLES", "t", "TA", "TOO"]] == [
+        True,
+        True,
+        True,
+        True,
+        False,
+        False,
+    ]
+    keywords = re.compile(trie_regex(RESERVED_KEYWORDS))
+    assert all(keywords.fullmatch(x) for x in RESERVED_KEYWORDS)
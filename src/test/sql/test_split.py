@@ -0,0 +1,58 @@
+from typing import List
+
+import pytest
+
+from pgtonic.sql.split import Statement, split_statements
+
+SQL = """-- leading comment; with a semicolon
+GRANT SELECT ON "a;b" TO oliver;
+CREATE FUNCTION f() RETURNS text AS $body$ SELECT 'x;y'; $body$ LANGUAGE sql;
+/* block /* nested; */ still comment; */ SELECT 'it''s; fine', E'esc\\'; aped';
+SELECT $$;$$, a$b FROM t -- trailing; comment
+;
+;
+SELECT 1"""
+
+EXPECTED = [
+    'GRANT SELECT ON "a;b" TO oliver',
+    "CREATE FUNCTION f() RETURNS text AS $body$ SELECT 'x;y'; $body$ LANGUAGE sql",
+    "SELECT 'it''s; fine', E'esc\\'; aped'",
+    "SELECT $$;$$, a$b FROM t",
+    "SELECT 1",
+]
+
+
+def texts(statements: List[Statement]) -> List[str]:
+    return [x.text for x in statements]
+
+
+def test_split() -> None:
+    assert texts(list(split_statements([SQL]))) == EXPECTED
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7])
+def test_split_chunk_boundaries(chunk_size: int) -> None:
+    chunks = [SQL[ix : ix + chunk_size] for ix in range(0, len(SQL), chunk_size)]
+    assert list(split_statements(chunks)) == list(split_statements([SQL]))
+
+
+def test_split_positions() -> None:
+    statements = list(split_statements([SQL]))
+    assert [x.line for x in statements] == [2, 3, 4, 5, 8]
+    for statement in statements[:-1]:
+        assert SQL[statement.end - 1] == ";"
+    assert statements[-1].end == len(SQL)
+
+
+@pytest.mark.parametrize(
+    "sql,expected",
+    [
+        ("", []),
+        (" ; -- nothing\n;", []),
+        ("SELECT 1 /* unterminated ;", ["SELECT 1"]),
+        ("SELECT 'unterminated ;", ["SELECT 'unterminated ;"]),
+        ("SELECT 1 -- comment at eof", ["SELECT 1"]),
+    ],
+)
+def test_split_edge_cases(sql: str, expected: List[str]) -> None:
+    assert texts(list(split_statements([sql]))) == expected
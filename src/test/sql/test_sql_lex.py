@@ -0,0 +1,18 @@
+from pgtonic.sql.lex import Kind, SqlToken, has_gap, tokenize
+
+
+def test_tokenize() -> None:
+    assert tokenize('GRANT x ON "a b".c(') == [
+        SqlToken(Kind.WORD, "GRANT", 0, 5),
+        SqlToken(Kind.WORD, "x", 6, 7),
+        SqlToken(Kind.WORD, "ON", 8, 10),
+        SqlToken(Kind.QUOTED, '"a b"', 11, 16),
+        SqlToken(Kind.PUNCTUATION, ".", 16, 17),
+        SqlToken(Kind.WORD, "c", 17, 18),
+        SqlToken(Kind.PUNCTUATION, "(", 18, 19),
+    ]
+
+
+def test_has_gap() -> None:
+    tokens = tokenize("a b.c")
+    assert [has_gap(tokens, ix) for ix in range(len(tokens) + 1)] == [False, True, False, False, False]
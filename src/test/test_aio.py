@@ -0,0 +1,110 @@
+import asyncio
+import time
+from typing import AsyncIterator, List
+
+import pytest
+
+from pgtonic import aio
+from pgtonic.aio import Validator
+from pgtonic.pg13 import create_trigger, grant
+from pgtonic.spec.registry import Registry
+from pgtonic.spec.template import Template
+
+SQL = """
+GRANT SELECT ON account TO oliver;
+DROP TABLE account;
+CREATE TRIGGER my_trig AFTER INSERT ON account EXECUTE FUNCTION func();
+"""
+
+
+def test_validate() -> None:
+    async def run() -> List[object]:
+        return await asyncio.gather(aio.validate("GRANT SELECT ON account TO oliver"), aio.validate("DROP TABLE x"))
+
+    assert asyncio.run(run()) == [grant.TEMPLATES[0], None]
+
+
+def test_validate_stream() -> None:
+    async def chunks() -> AsyncIterator[str]:
+        for ix in range(0, len(SQL), 16):
+            yield SQL[ix : ix + 16]
+
+    async def run() -> List[object]:
+        return [x.template async for x in aio.validate_stream(chunks())]
+
+    assert asyncio.run(run()) == [grant.TEMPLATES[0], None, create_trigger.TEMPLATES[0]]
+
+
+def test_batches_concurrent_statements() -> None:
+    async def run() -> aio.Metrics:
+        async with Validator(batch_size=16) as validator:
+            results = await asyncio.gather(*[validator.validate("GRANT SELECT ON a TO b") for _ in range(40)])
+            assert all(x is grant.TEMPLATES[0] for x in results)
+            return validator.metrics()
+
+    metrics = asyncio.run(run())
+    assert metrics.submitted == metrics.completed == 40
+    assert metrics.batches == 3
+    assert metrics.queue_depth == metrics.in_flight == 0
+    assert 0 < metrics.latency_p50 <= metrics.latency_p99 <= metrics.latency_max
+
+
+class SlowRegistry(Registry):
+    def find(self, sql: str):
+        time.sleep(0.05)
+        return super().find(sql)
+
+
+def test_timeout() -> None:
+    async def run() -> aio.Metrics:
+        async with Validator(SlowRegistry([Template("SELECT NAME")]), timeout=0.001) as validator:
+            with pytest.raises(asyncio.TimeoutError):
+                await validator.validate("SELECT a")
+            return validator.metrics()
+
+    assert asyncio.run(run()).timed_out == 1
+
+
+def test_validate_stream_cancels_pending_statements() -> None:
+    async def run() -> List[object]:
+        registry = SlowRegistry([Template("SELECT NAME")])
+        async with Validator(registry, batch_size=1, batch_delay=0, max_pending=4) as validator:
+            stream = validator.validate_stream(["SELECT a;"] * 8)
+            async for _ in stream:
+                break
+            await stream.aclose()
+            return [x for x in asyncio.all_tasks() if x.get_coro().__qualname__ == "Validator.validate"]
+
+    assert asyncio.run(run()) == []
+
+
+def test_close_cancels_unbatched_statements() -> None:
+    async def run() -> List[object]:
+        validator = Validator(SlowRegistry([Template("SELECT NAME")]), batch_size=1, batch_delay=0)
+        results = asyncio.gather(*[validator.validate("SELECT a") for _ in range(3)], return_exceptions=True)
+        await asyncio.sleep(0.01)
+        await validator.close()
+        return await asyncio.wait_for(results, 1)
+
+    first, *rest = asyncio.run(run())
+    assert first == Template("SELECT NAME")
+    assert rest and all(isinstance(x, asyncio.CancelledError) for x in rest)
+
+
+def test_workers_share_deferred_registry() -> None:
+    loaded: List[str] = []
+
+    def load() -> List[Template]:
+        loaded.append("GRANT")
+        time.sleep(0.01)
+        return list(grant.TEMPLATES)
+
+    registry = Registry()
+    registry.defer("GRANT", load)
+
+    async def run() -> List[object]:
+        async with Validator(registry, workers=8, batch_size=1, batch_delay=0) as validator:
+            return await asyncio.gather(*[validator.validate("GRANT SELECT ON a TO b") for _ in range(32)])
+
+    assert all(x is grant.TEMPLATES[0] for x in asyncio.run(run()))
+    assert loaded == ["GRANT"]
@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+from pgtonic.document import Document
+from pgtonic.pg13 import grant
+
+SQL = """GRANT SELECT ON account TO oliver;
+-- Not covered; by a template
+DROP TABLE account;
+SELECT 'a;b', $$c;d$$ FROM "e;f";
+/* block; comment */ GRANT ALL ON account TO public;
+CREATE TRIGGER my_trig AFTER INSERT ON account EXECUTE FUNCTION func();
+"""
+
+
+def fresh(doc: Document) -> Document:
+    return Document(doc.text, registry=doc.registry)
+
+
+@pytest.mark.parametrize(
+    "start,end,text",
+    [
+        # Inside a statement
+        (6, 12, "UPDATE"),
+        # Split a statement in two
+        (21, 21, ";"),
+        # Join two statements
+        (33, 34, ""),
+        # Unterminated quote and comment swallow the rest of the text
+        (0, 0, "'"),
+        (34, 34, "/*"),
+        (100, 100, "$$"),
+        # Start and end of the text
+        (0, 0, "DROP TABLE x;\n"),
+        (len(SQL), len(SQL), "GRANT SELECT ON t TO r"),
+        (len(SQL) - 1, len(SQL), ""),
+        # Everything
+        (0, len(SQL), "GRANT SELECT ON t TO r;"),
+        (0, len(SQL), ""),
+    ],
+)
+def test_edit(start: int, end: int, text: str) -> None:
+    doc = Document(SQL)
+    doc.edit(start, end, text)
+    assert doc.text == SQL[:start] + text + SQL[end:]
+    assert doc.results == fresh(doc).results
+
+
+def test_edit_returns_resplit_statements() -> None:
+    doc = Document(SQL)
+    results = doc.edit(6, 12, "UPDATE")
+    assert [x.statement.text for x in results] == ["GRANT UPDATE ON account TO oliver"]
+    assert results[0].template is grant.TEMPLATES[0]
+    assert doc.results[1:] == Document(SQL).results[1:]
+
+
+def test_random_edits() -> None:
+    rnd = random.Random(0)
+    doc = Document(SQL * 5)
+    for _ in range(300):
+        start = rnd.randrange(len(doc.text) + 1)
+        end = min(len(doc.text), start + rnd.randrange(4))
+        doc.edit(start, end, rnd.choice(["", "x", " ", "\n", ";", "'", '"', "$$", "--", "/*", "*/", "GRANT"]))
+        # Resolve some positions before all pending shifts are applied
+        offset = rnd.randrange(len(doc.text) + 1)
+        expected = fresh(doc)
+        assert doc.result_at(offset) == expected.result_at(offset)
+        if rnd.random() < 0.2:
+            assert doc.results == expected.results
+    assert doc.results == fresh(doc).results
+
+
+def test_result_at() -> None:
+    doc = Document(SQL)
+    assert doc.result_at(0).statement.text == "GRANT SELECT ON account TO oliver"
+    assert doc.result_at(33).statement.text == "GRANT SELECT ON account TO oliver"
+    assert doc.result_at(34).statement.text == "DROP TABLE account"
+    assert doc.result_at(len(SQL)) is None
+
+
+def test_invalid_edit() -> None:
+    with pytest.raises(ValueError):
+        Document(SQL).edit(5, 4, "")
+    with pytest.raises(ValueError):
+        Document(SQL).edit(0, len(SQL) + 1, "")
@@ -0,0 +1,39 @@
+from pgtonic import instrument
+from pgtonic.spec.parse.ast_passes import Lowering
+from pgtonic.spec.template import Template
+
+
+def test_recording() -> None:
+    template = Template("GRANT NAME TO { NAME | PUBLIC }")
+    with instrument.recording() as recorder:
+        template.compile(Lowering.EXPAND)
+        assert template.compile(Lowering.EXPAND).is_match("GRANT a TO b")
+        assert not template.compile(Lowering.EXPAND).is_match("GRANT a TO")
+
+    stats = recorder.to_dict()
+    assert {"lex", "parse", "lower", "regex", "compile", "match"} <= set(stats["phases"])
+    assert stats["phases"]["match"]["count"] == 2
+    assert stats["templates"]["GRANT NAME TO { NAME | PUBLIC }"] == {
+        "calls": 2,
+        "matches": 1,
+        "variants": {"EXPAND": 1},
+        # Size of the compiled regexes, which expect marked keywords
+        "regex_size": {"EXPAND": len(template._marked_regexes(Lowering.EXPAND)[0])},
+    }
+
+
+def test_disabled() -> None:
+    with instrument.recording() as recorder:
+        pass
+    assert instrument.ACTIVE is None
+    Template("SELECT NAME").is_match("SELECT a")
+    assert recorder.to_dict() == {"phases": {}, "templates": {}}
+
+
+def test_prometheus() -> None:
+    recorder = instrument.Recorder()
+    recorder.phase("match", 0.5)
+    recorder.match(Template('SELECT "a"'), True)
+    text = recorder.to_prometheus()
+    assert 'pgtonic_phase_seconds_sum{phase="match"} 0.5\n' in text
+    assert 'pgtonic_matches_total{template="SELECT \\"a\\""} 1\n' in text
@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+
+import pytest
+
+from pgtonic.parallel import _bounded_map, match_many
+from pgtonic.pg13 import create_trigger, grant
+
+TEMPLATES = [*grant.TEMPLATES, *create_trigger.TEMPLATES]
+
+STATEMENTS = [
+    "GRANT SELECT ON account TO oliver",
+    "DROP TABLE account",
+    "CREATE TRIGGER my_trig AFTER INSERT ON api.account EXECUTE FUNCTION oli.func ()",
+    "GRANT SELECT ON account TO",
+] * 5
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_match_many(workers: int) -> None:
+    results = match_many(STATEMENTS, TEMPLATES, workers=workers, chunk_size=3)
+    assert results == [0, None, 1, None] * 5
+
+
+def test_match_many_empty() -> None:
+    assert match_many([], TEMPLATES, workers=2) == []
+
+
+def test_bounded_map_reads_input_lazily() -> None:
+    consumed = []
+
+    def items() -> Iterator[int]:
+        for ix in range(100):
+            consumed.append(ix)
+            yield ix
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        results = _bounded_map(pool, lambda x: x * 2, items(), window=4)
+        assert next(results) == 0
+        assert len(consumed) <= 5
+        assert list(results) == [x * 2 for x in range(1, 100)]
@@ -0,0 +1,106 @@
+import pytest
+
+from pgtonic.pg13.registry import REGISTRY
+from pgtonic.result_cache import ResultCache, literal_words
+from pgtonic.spec.registry import Registry
+from pgtonic.spec.template import Template
+from pgtonic.validate import validate
+
+STATEMENTS = [
+    "GRANT SELECT ON account TO oliver",
+    "GRANT  SELECT\nON tenant_1.account TO anon",
+    "GRANT SELECT ON TABLE account TO anon",
+    "GRANT SELECT ON account TO PUBLIC",
+    "GRANT SELECT ON account TO public",
+    "GRANT SELECT ON account TO GROUP",
+    "grant SELECT ON account TO oliver",
+    " GRANT SELECT ON account TO oliver",
+    "GRANT SELECT ON account TO oliver ",
+    'GRANT SELECT ON "My  Table" TO oliver',
+    'GRANT SELECT ON "My Table" TO oliver',
+    'GRANT SELECT ON "" TO oliver',
+    'GRANT SELECT ON "a""b" TO oliver',
+    'GRANT SELECT ON U&"a" TO oliver',
+    "GRANT SELECT ON table TO oliver",
+    "GRANT SELECT ON ñandú TO oliver",
+    "GRANT SELECT ON a$b TO oliver",
+    "GRANT SELECT ON 1a TO oliver",
+    "GRANT SELECT ON account TO",
+    "CREATE TRIGGER my_trig AFTER INSERT ON api.account EXECUTE FUNCTION oli.func ()",
+    "CREATE TRIGGER other AFTER INSERT ON account EXECUTE FUNCTION func ( )",
+    "CREATE TRIGGER other AFTER INSERT ON account EXECUTE FUNCTION func('a  b')",
+    "DROP TABLE account",
+]
+
+
+@pytest.mark.parametrize("abstract_identifiers", [False, True])
+def test_same_results_as_registry(abstract_identifiers: bool) -> None:
+    cache = ResultCache(abstract_identifiers=abstract_identifiers)
+    # Twice, the second time from the cache
+    for sql in STATEMENTS * 2:
+        assert cache.find(sql) is REGISTRY.find(sql), sql
+    assert cache.stats().hits >= len(STATEMENTS)
+
+
+@pytest.mark.parametrize(
+    "sql,key,abstracted",
+    [
+        ("GRANT  SELECT\n\tON x TO y", "GRANT SELECT ON x TO y", "GRANT SELECT ON _ TO _"),
+        ("GRANT SELECT ON s.t TO PUBLIC", "GRANT SELECT ON s.t TO PUBLIC", "GRANT SELECT ON _._ TO PUBLIC"),
+        ('GRANT SELECT ON "a  b" TO y', 'GRANT SELECT ON "a  b" TO y', 'GRANT SELECT ON "a  b" TO _'),
+        ("foo 'a  b'  ", "foo 'a  b' ", "_ 'a  b' "),
+        (" GRANT", " GRANT", " GRANT"),
+        ("grant a$b 1c", "grant a$b 1c", "grant _ 1c"),
+        ("GRANT ñandú TO table", "GRANT ñandú TO table", "GRANT _ TO table"),
+        ('foo U&"a" X&"a"', 'foo U&"a" X&"a"', '_ U&"a" _&"a"'),
+        ("GRANT\xa0 SELECT", "GRANT\xa0 SELECT", "_ SELECT"),
+        ("GRANT\xa0'a  b'  x", "GRANT\xa0'a  b' x", "_'a  b' _"),
+    ],
+)
+def test_key(sql: str, key: str, abstracted: str) -> None:
+    assert ResultCache().key(sql) == key
+    assert ResultCache(abstract_identifiers=True).key(sql) == abstracted
+
+
+def test_abstracted_statements_share_an_entry() -> None:
+    cache = ResultCache(abstract_identifiers=True)
+    for ix in range(100):
+        assert cache.is_match(f"GRANT SELECT ON tenant_{ix}.account TO anon")
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.size) == (99, 1, 1)
+    assert stats.hit_rate == 0.99
+
+
+def test_eviction() -> None:
+    cache = ResultCache(maxsize=2)
+    cache.find("DROP a")
+    cache.find("DROP b")
+    cache.find("DROP a")
+    cache.find("DROP c")
+    assert "DROP a" in cache and "DROP c" in cache and "DROP b" not in cache
+    assert cache.stats().evictions == 1
+    assert len(cache) == 2
+
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.stats().hit_rate == 0.0
+
+
+def test_placeholder_is_not_a_literal() -> None:
+    registry = Registry([Template("DROP _ NAME")])
+    cache = ResultCache(registry, abstract_identifiers=True)
+    assert cache.key("DROP _ x") == "DROP _ __"
+    assert cache.find("DROP x y") is None
+    assert cache.find("DROP _ y") is not None
+
+
+def test_literal_words() -> None:
+    template = Template("GRANT arg ( NAME ) [, ...]", where={"arg": Template("{ ALL | SOME_THING }")})
+    assert literal_words([template]) == {"GRANT", "ALL", "SOME_THING"}
+
+
+def test_validate() -> None:
+    cache = ResultCache()
+    results = list(validate(["GRANT SELECT ON a TO b; GRANT SELECT ON a TO b; DROP x;"], cache))
+    assert [x.is_match for x in results] == [True, True, False]
+    assert cache.stats().hits == 1
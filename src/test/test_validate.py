@@ -0,0 +1,25 @@
+import io
+
+from pgtonic.__main__ import main
+from pgtonic.pg13 import grant
+from pgtonic.validate import validate_file
+
+SQL = """
+GRANT SELECT ON account TO oliver;
+-- Not covered by a template
+DROP TABLE account;
+CREATE TRIGGER my_trig AFTER INSERT ON account EXECUTE FUNCTION func();
+"""
+
+
+def test_validate_file() -> None:
+    results = list(validate_file(io.StringIO(SQL), chunk_size=16))
+    assert [x.is_match for x in results] == [True, False, True]
+    assert results[0].template is grant.TEMPLATES[0]
+
+
+def test_main(tmp_path, capsys) -> None:
+    path = tmp_path / "migration.sql"
+    path.write_text(SQL)
+    assert main(["--quiet", str(path)]) == 1
+    assert capsys.readouterr().out == f"{path}:4: no match: DROP TABLE account\n"